@@ -0,0 +1,38 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Impostazioni di questo computer. Il codice dei programmi è nel pacchetto fatture, comune
+# alle versioni Windows e macOS; qui ci sono solo i percorsi e le scelte di questa installazione.
+# Si può cambiare qualunque impostazione dei moduli, ad esempio:
+#   compilatore.configura(NUM_PROCESSI=1, COMPRESSIONE="ghostscript_batch")
+#   invio.configura(NUM_SESSIONI_SMTP=1, MAIL_AL_GIORNO=2000, MITTENTE="fatture@esempio.it")
+#   pipeline.ARCHIVIA_PDF = False
+
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CARTELLA_PROGRAMMI = os.path.dirname(os.path.abspath(__file__))
+
+# Il pacchetto fatture si trova due cartelle più su (non serve se è installato con pip)
+sys.path.insert(0, os.path.abspath(os.path.join(CARTELLA_PROGRAMMI, "..", "..")))
+
+from fatture import benchmark, compilatore, invio, pipeline, servizio
+
+compilatore.configura(
+    PDF_TEMPLATE=r"../fattura_base.pdf",
+    OUTPUT_DIR=r"../Fatture",
+    EXCEL_FILE=r"../dati_fattura.xlsx",
+    FONT_DIR=r"../fonts",
+    GHOSTSCRIPT="/usr/local/bin/gs"
+)
+
+invio.configura(
+    BASE_DIR=r"/Users/francesca/Desktop/Programma",
+    EXCEL_FILE=os.path.join(r"/Users/francesca/Desktop/Programma", "dati_fattura.xlsx"),
+    OGGETTO_MAIL="Fatturazione",
+    CORPO_HTML="""<!DOCTYPE html><html lang="it"><head><meta charset="UTF-8"><title>Anteprima Email</title></head><body style="margin:0;padding:0;font-family:Arial,sans-serif;font-size:12pt;color:#333;line-height:1.2;">Gentile {nome_cliente},<br><br>in allegato la sua fattura.<br>Cordiali saluti,<br><br>Il team di XXX.<br><br>---<br><br><p style="font-size:10px;color:#666;line-height:1.5;margin:0;padding:0;">Le informazioni, i dati e le notizie contenute nella presente comunicazione e i relativi allegati sono di natura privata e come tali possono essere riservate e sono, comunque, destinate esclusivamente ai destinatari indicati in epigrafe.<br>La diffusione, distribuzione e/o la copiatura del documento trasmesso da parte di qualsiasi soggetto diverso dal destinatario è proibita, sia ai sensi dell’art. 616 c.p., sia ai sensi del Regolamento (UE) 2016/679 e del Decreto legislativo 10 agosto 2018, n. 101. Se avete ricevuto questo messaggio per errore, vi preghiamo di distruggerlo e di darcene immediata comunicazione anche inviando un messaggio di ritorno all’indirizzo e-mail del mittente.<br><br><em>Pensa all'ambiente, stampa questa mail solo se necessario.<br><br><br></em></p></body></html>"""
+)
+
+benchmark.configura(BENCHMARK_DIR=os.path.join(CARTELLA_PROGRAMMI, "..", "Benchmark"))
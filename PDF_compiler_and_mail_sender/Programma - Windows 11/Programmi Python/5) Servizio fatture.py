@@ -0,0 +1,7 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Servizio fatture: il programma è nel pacchetto fatture, i percorsi di questo computer in impostazioni.py
+from impostazioni import servizio
+
+if __name__ == "__main__":
+    servizio.main()
@@ -0,0 +1,30 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Impostazioni di questo computer. Il codice dei programmi è nel pacchetto fatture, comune
+# alle versioni Windows e macOS; qui ci sono solo i percorsi e le scelte di questa installazione.
+# Si può cambiare qualunque impostazione dei moduli, ad esempio:
+#   compilatore.configura(NUM_PROCESSI=1, COMPRESSIONE="ghostscript_batch")
+#   invio.configura(NUM_SESSIONI_SMTP=1, MAIL_AL_GIORNO=2000, MITTENTE="fatture@esempio.it")
+#   pipeline.ARCHIVIA_PDF = False
+
+import os
+import sys
+
+CARTELLA_PROGRAMMI = os.path.dirname(os.path.abspath(__file__))
+
+# Il pacchetto fatture si trova due cartelle più su (non serve se è installato con pip)
+sys.path.insert(0, os.path.abspath(os.path.join(CARTELLA_PROGRAMMI, "..", "..")))
+
+from fatture import benchmark, compilatore, invio, pipeline, servizio
+
+compilatore.configura(
+    PDF_TEMPLATE=r"C:\Users\matte\Desktop\Programma\fattura_base.pdf",
+    OUTPUT_DIR=r"C:\Users\matte\Desktop\Programma\Fatture",
+    EXCEL_FILE=r"C:\Users\matte\Desktop\Programma\dati_fattura.xlsm",
+    FONT_DIR=r"C:\Users\matte\Desktop\Programma\fonts"
+)
+
+# Excel, Fatture, coda e limiti di invio nella cartella sopra a quella dei programmi
+invio.configura(BASE_DIR=os.path.abspath(os.path.join(CARTELLA_PROGRAMMI, "..")))
+
+benchmark.configura(BENCHMARK_DIR=os.path.join(CARTELLA_PROGRAMMI, "..", "Benchmark"))
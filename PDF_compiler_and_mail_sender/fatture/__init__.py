@@ -0,0 +1,14 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Codice comune del PDF Compiler e del Mail Sender, per Windows e macOS:
+#   excel       -> lettura di dati_fattura (in streaming, con la copia in cache)
+#   deposito    -> cartelle, sottocartelle e archivi dei PDF, con l'indice delle fatture
+#   validazione -> controllo preliminare di tutte le righe (codice fiscale, importi, email...)
+#   compilatore -> generazione e compressione dei PDF
+#   invio       -> invio delle mail con la coda SQLite e i limiti di Gmail
+#   lavori      -> generazione di un intervallo divisa in blocchi tra più processi e computer
+#   pipeline    -> generazione e invio in un'unica catena
+#   servizio    -> servizio sempre attivo che genera le singole fatture su richiesta HTTP
+#   benchmark   -> misure su dati sintetici
+#   cli         -> riga di comando (fatture generate / send / progress / serve)
+# I moduli non vengono importati qui, così "fatture --help" parte subito.
@@ -0,0 +1,8 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# python -m fatture ... equivale al comando fatture
+import sys
+
+from .cli import main
+
+sys.exit(main())
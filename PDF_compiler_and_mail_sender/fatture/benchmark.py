@@ -0,0 +1,351 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import socketserver
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from . import compilatore, excel, invio, validazione
+
+# Cartella del benchmark: file Excel sintetici, PDF, coda di invio e risultati.
+# La cartella Fatture, la coda di invio e i limiti veri non vengono toccati.
+BENCHMARK_DIR = os.path.abspath("Benchmark")
+
+# Numero di righe dei file Excel sintetici da misurare
+DIMENSIONI_BENCHMARK = [100, 10000, 100000]
+
+# Fatture generate, compresse, salvate e inviate per ogni dimensione (None = tutte).
+# Caricamento e preparazione usano sempre tutte le righe; per le altre fasi conta il
+# tempo per fattura, e 100000 PDF su un solo processo richiederebbero ore.
+MAX_FATTURE_PDF = 1000
+
+# Misura anche il picco di memoria di ogni fase. tracemalloc rallenta le fasi scritte in
+# Python (caricamento, preparazione) e non vede la memoria usata da PyMuPDF.
+MISURA_MEMORIA = True
+
+# Peggioramento del tempo per fattura, rispetto al riferimento, oltre il quale una fase viene segnalata
+SOGLIA_REGRESSIONE = 0.20
+
+# Seme dei dati casuali: a parità di dimensione il file Excel sintetico è sempre lo stesso
+SEME_DATI = 1
+
+RISULTATI_FILE = os.path.join(BENCHMARK_DIR, "benchmark_ultimo.json")
+RIFERIMENTO_FILE = os.path.join(BENCHMARK_DIR, "benchmark_riferimento.json")
+
+NOMI = ["mario", "luca", "giulia", "francesca", "marco", "anna", "paolo", "chiara", "giuseppe", "sara", "niccolò", "elena"]
+COGNOMI = ["rossi", "bianchi", "russo", "ferrari", "esposito", "romano", "colombo", "ricci", "marino", "greco", "de luca", "d'angelo"]
+DESCRIZIONI = [
+    "Consulenza",
+    "Lezioni private (pacchetto da 10 ore)",
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit. ",
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit. In urna elit, laoreet mattis egestas nec, elementum ut justo. Fusce suscipit at nulla a tempus. Etiam sollicitudin interdum posuere. Mauris rutrum, arcu eget vestibulum rhoncus, mi lor"
+]
+
+MESI_CF = "ABCDEHLMPRST"
+
+# Impostazioni che si possono cambiare con configura()
+IMPOSTAZIONI = (
+    "BENCHMARK_DIR", "DIMENSIONI_BENCHMARK", "MAX_FATTURE_PDF", "MISURA_MEMORIA", "SOGLIA_REGRESSIONE",
+    "SEME_DATI", "RISULTATI_FILE", "RIFERIMENTO_FILE"
+)
+
+# Cambia le impostazioni del modulo, es. configura(BENCHMARK_DIR=..., MAX_FATTURE_PDF=100).
+# I file dei risultati seguono BENCHMARK_DIR, se non indicati a parte.
+def configura(**valori):
+    for nome in valori:
+        if nome not in IMPOSTAZIONI:
+            raise ValueError(f"Impostazione sconosciuta: {nome}")
+
+    if "BENCHMARK_DIR" in valori:
+        valori["BENCHMARK_DIR"] = os.path.abspath(valori["BENCHMARK_DIR"])
+        valori.setdefault("RISULTATI_FILE", os.path.join(valori["BENCHMARK_DIR"], "benchmark_ultimo.json"))
+        valori.setdefault("RIFERIMENTO_FILE", os.path.join(valori["BENCHMARK_DIR"], "benchmark_riferimento.json"))
+    globals().update(valori)
+
+# Codice fiscale casuale ma formalmente corretto, con il carattere di controllo giusto
+def codice_fiscale_casuale(casuale):
+    lettere = "".join(casuale.choice("BCDFGLMNPRSTVZ") for _ in range(6))
+    giorno = casuale.randint(1, 28) + casuale.choice((0, 40))
+    codice = f"{lettere}{casuale.randint(0, 99):02d}{casuale.choice(MESI_CF)}{giorno:02d}{casuale.choice('ABCDEFGHLM')}{casuale.randint(1, 999):03d}"
+    return codice + validazione.carattere_controllo_cf(codice)
+
+def percorso_excel_sintetico(righe):
+    return os.path.join(BENCHMARK_DIR, f"dati_fattura_{righe}.xlsx")
+
+# Crea un file Excel con la stessa struttura di dati_fattura (titolo, riga vuota,
+# intestazione alla riga 3) e righe casuali. Un file già creato viene riusato.
+def genera_excel_sintetico(righe):
+    import openpyxl
+
+    percorso = percorso_excel_sintetico(righe)
+    if os.path.exists(percorso):
+        return percorso
+
+    casuale = random.Random(SEME_DATI)
+    data_iniziale = datetime(2025, 1, 1)
+    wb = openpyxl.Workbook(write_only=True)
+    foglio = wb.create_sheet("Fatture")
+    foglio.append(["FATTURE"])
+    foglio.append([None])
+    foglio.append(["NOME COGNOME", "CODICE FISCALE", "DESCRIZIONE", "QNT", "PREZZO", "IVA", "MARCA DA BOLLO", "DATA", "NUMERO FATTURA", "MAIL", "VERIFICA CODICE FISCALE"])
+    for numero in range(1, righe + 1):
+        foglio.append([
+            f"{casuale.choice(NOMI)} {casuale.choice(COGNOMI)} ",
+            codice_fiscale_casuale(casuale),
+            casuale.choice(DESCRIZIONI),
+            casuale.randint(1, 5),
+            round(casuale.uniform(10, 500), 2),
+            casuale.choice((0, 4, 10, 22)),
+            casuale.choice((0, 2)),
+            data_iniziale + timedelta(days=numero * 365 // righe),
+            numero,
+            f"cliente{numero}@example.com",
+            "Valido"
+        ])
+
+    temp_output = percorso + ".tmp"
+    wb.save(temp_output)
+    os.replace(temp_output, percorso)
+    return percorso
+
+# Server SMTP minimo al posto di Gmail: accetta le mail e le scarta, contando quelle ricevute
+class GestoreSMTP(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b"220 benchmark\r\n")
+        for riga in iter(self.rfile.readline, b""):
+            comando = riga[:4].upper()
+            if comando == b"DATA":
+                self.wfile.write(b"354 Fine con <CRLF>.<CRLF>\r\n")
+                for riga in iter(self.rfile.readline, b""):
+                    if riga == b".\r\n":
+                        break
+                with self.server.lock:
+                    self.server.ricevute += 1
+            elif comando == b"QUIT":
+                self.wfile.write(b"221 OK\r\n")
+                return
+            self.wfile.write(b"250 OK\r\n")
+
+class ServerSMTPProva(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), GestoreSMTP)
+        self.lock = threading.Lock()
+        self.ricevute = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def indirizzo(self):
+        return f"127.0.0.1:{self.server_address[1]}"
+
+    def chiudi(self):
+        self.shutdown()
+        self.server_close()
+
+# Picco di memoria dell'intero processo in MB, dall'avvio (None se il sistema non lo fornisce)
+def picco_memoria_processo():
+    try:
+        import resource
+    except ImportError:
+        return None
+    picco = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo restituisce in KB, macOS in byte
+    return picco / (1024 * 1024) if sys.platform == "darwin" else picco / 1024
+
+# Tempi e picchi di memoria delle fasi del benchmark. Una fase può essere misurata più
+# volte (ad esempio una volta per fattura): tempi e fatture si sommano, il picco è il
+# massimo. Il picco è la memoria Python allocata in più durante la fase.
+class Misure:
+    def __init__(self):
+        self.fasi = {}
+
+    @contextlib.contextmanager
+    def fase(self, nome, fatture=1):
+        if MISURA_MEMORIA:
+            tracemalloc.reset_peak()
+            memoria_iniziale = tracemalloc.get_traced_memory()[0]
+        inizio = time.perf_counter()
+        yield
+        secondi = time.perf_counter() - inizio
+
+        voce = self.fasi.setdefault(nome, {"fatture": 0, "secondi": 0.0, "fatture_al_secondo": None, "picco_memoria_mb": None})
+        voce["fatture"] += fatture
+        voce["secondi"] += secondi
+        if voce["secondi"] > 0:
+            voce["fatture_al_secondo"] = voce["fatture"] / voce["secondi"]
+        if MISURA_MEMORIA:
+            picco_mb = (tracemalloc.get_traced_memory()[1] - memoria_iniziale) / (1024 * 1024)
+            voce["picco_memoria_mb"] = max(voce["picco_memoria_mb"] or 0, picco_mb)
+
+# Invia le mail al server di prova con lo stesso percorso del Mail Sender (sessioni,
+# FabbricaMessaggi, coda SQLite), ma senza limiti di invio.
+# Restituisce il numero di mail arrivate al server.
+def invia_documenti(fatture, contenuti):
+    outbox = os.path.join(BENCHMARK_DIR, "outbox_benchmark.sqlite")
+    stato_limiti = os.path.join(BENCHMARK_DIR, "limiti_benchmark.json")
+    for percorso in (outbox, stato_limiti):
+        if os.path.exists(percorso):
+            os.remove(percorso)
+
+    server = ServerSMTPProva()
+    invio.configura(SERVER_PROVA_SMTP=server.indirizzo)
+    coda_invii = invio.CodaInvii(outbox)
+    try:
+        invii, _ = coda_invii.accoda([dict(
+            numero_fattura=int(dati["numero_fattura"]),
+            destinatario=f"cliente{dati['numero_fattura']}@example.com",
+            nome_cliente=invio.formatta_nome(invio.normalizza_stringa(dati["nome_cognome"])),
+            allegato_path=dati["output_pdf_path"]
+        ) for dati in fatture])
+        for mail, contenuto in zip(invii, contenuti):
+            mail["pdf"] = contenuto
+
+        sessioni = invio.PoolSessioniSMTP("benchmark@example.com", None)
+        limitatore = invio.LimitatoreInvii(mail_al_minuto=10 ** 9, mail_al_giorno=10 ** 9, stato_file=stato_limiti)
+        try:
+            fabbrica = invio.FabbricaMessaggi(sessioni.utente)
+            asyncio.run(invio.invia_con_limiti(sessioni, fabbrica, invii, limitatore, coda_invii))
+        finally:
+            sessioni.chiudi()
+    finally:
+        coda_invii.chiudi()
+        server.chiudi()
+    return server.ricevute
+
+# Misura tutte le fasi su un file Excel sintetico con il numero di righe indicato.
+# Le fatture vengono generate, compresse e salvate una alla volta, come nel PDF Compiler.
+# Le stampe dei programmi durante le misure vengono soppresse.
+def esegui_benchmark(righe):
+    inizio = time.perf_counter()
+    excel_file = genera_excel_sintetico(righe)
+    print(f"File Excel sintetico: {excel_file} ({time.perf_counter() - inizio:.1f} s)")
+
+    # Prima lettura dall'Excel (la cache viene eliminata), poi dalla copia in cache
+    for percorso in excel.percorsi_cache_excel(excel_file):
+        if os.path.exists(percorso):
+            os.remove(percorso)
+
+    compilatore.configura(OUTPUT_DIR=os.path.join(BENCHMARK_DIR, "Fatture"))
+    os.makedirs(compilatore.OUTPUT_DIR, exist_ok=True)
+    motore = compilatore.MotorePDF(compilatore.PDF_TEMPLATE)
+
+    misure = Misure()
+    if MISURA_MEMORIA:
+        tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with misure.fase("caricamento_excel", righe):
+                df = excel.carica_dati_excel(excel_file)
+            with misure.fase("caricamento_cache", righe):
+                df = excel.carica_dati_excel(excel_file)
+            with misure.fase("validazione", righe):
+                validazione.verifica_fatture(df)
+            with misure.fase("preparazione", righe):
+                fatture = compilatore.prepara_fatture(df)
+
+            fatture = [dati for dati in fatture if dati["valida"]][:MAX_FATTURE_PDF]
+            contenuti = []
+            for dati in fatture:
+                with misure.fase("generazione"):
+                    documento = motore.compila(dati, compilatore.PROFILO_COMPRESSIONE)
+                with misure.fase("compressione"):
+                    contenuto = documento.tobytes(**motore.prepara_salvataggio(documento, compilatore.PROFILO_COMPRESSIONE))
+                    documento.close()
+                with misure.fase("salvataggio"):
+                    compilatore.scrivi_pdf(dati["output_pdf_path"], contenuto)
+                contenuti.append(contenuto)
+
+            with misure.fase("invio", len(fatture)):
+                ricevute = invia_documenti(fatture, contenuti)
+    finally:
+        if MISURA_MEMORIA:
+            tracemalloc.stop()
+
+    if ricevute != len(fatture):
+        print(f"Attenzione: il server di prova ha ricevuto {ricevute} mail su {len(fatture)}.")
+
+    risultati = dict(misure.fasi)
+    risultati["dimensione_media_pdf_kb"] = sum(map(len, contenuti)) / len(contenuti) / 1024 if contenuti else None
+    risultati["picco_memoria_processo_mb"] = picco_memoria_processo()
+    return risultati
+
+def stampa_risultati(righe, risultati, riferimento):
+    print(f"\nRisultati con {righe} righe:")
+    print(f"{'fase':<20}{'fatture':>9}{'secondi':>11}{'fatture/s':>12}{'picco MB':>10}  rispetto al riferimento")
+    for fase, misure in risultati.items():
+        if not isinstance(misure, dict):
+            continue
+        picco = f"{misure['picco_memoria_mb']:.1f}" if misure["picco_memoria_mb"] is not None else "-"
+        velocita = f"{misure['fatture_al_secondo']:.0f}" if misure["fatture_al_secondo"] is not None else "-"
+        confronto = ""
+        precedente = riferimento.get(fase)
+        if precedente and precedente["fatture"] and misure["fatture"] and precedente["secondi"] > 0:
+            variazione = (misure["secondi"] / misure["fatture"]) / (precedente["secondi"] / precedente["fatture"]) - 1
+            confronto = f"{variazione:+.0%}" + ("  <-- PIÙ LENTO" if variazione > SOGLIA_REGRESSIONE else "")
+        print(f"{fase:<20}{misure['fatture']:>9}{misure['secondi']:>11.3f}{velocita:>12}{picco:>10}  {confronto}")
+
+    if risultati["dimensione_media_pdf_kb"] is not None:
+        print(f"Dimensione media di un PDF: {risultati['dimensione_media_pdf_kb']:.1f} KB")
+    if risultati["picco_memoria_processo_mb"] is not None:
+        print(f"Picco di memoria del processo (dall'avvio): {risultati['picco_memoria_processo_mb']:.0f} MB")
+
+def carica_json(percorso):
+    try:
+        with open(percorso, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def salva_json(percorso, contenuto):
+    temp_output = percorso + ".tmp"
+    with open(temp_output, "w", encoding="utf-8") as f:
+        json.dump(contenuto, f, ensure_ascii=False, indent=1)
+    os.replace(temp_output, percorso)
+
+def main():
+    risposta = input(f"Numero di righe da misurare (invio per {' '.join(map(str, DIMENSIONI_BENCHMARK))}): ").strip()
+    try:
+        dimensioni = [int(valore) for valore in risposta.split()] if risposta else DIMENSIONI_BENCHMARK
+    except ValueError:
+        print("Errore: inserisci solo numeri interi.")
+        return
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+
+    riferimento = carica_json(RIFERIMENTO_FILE)
+    risultati = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "compressione": compilatore.PROFILO_COMPRESSIONE,
+        "template": compilatore.MODALITA_TEMPLATE,
+        "dimensioni": {}
+    }
+    for righe in dimensioni:
+        risultati["dimensioni"][str(righe)] = esegui_benchmark(righe)
+        precedente = riferimento["dimensioni"].get(str(righe), {}) if riferimento else {}
+        stampa_risultati(righe, risultati["dimensioni"][str(righe)], precedente)
+
+    salva_json(RISULTATI_FILE, risultati)
+    print(f"\nRisultati salvati in {RISULTATI_FILE}")
+
+    if riferimento is None:
+        salva_json(RIFERIMENTO_FILE, risultati)
+        print(f"Nessun riferimento precedente: questi risultati diventano il riferimento ({RIFERIMENTO_FILE}).")
+    elif input("Usare questi risultati come nuovo riferimento? (Y/N): ").strip().upper() == "Y":
+        # Le dimensioni non misurate in questa esecuzione restano quelle del riferimento precedente
+        riferimento["dimensioni"].update(risultati["dimensioni"])
+        riferimento.update({chiave: valore for chiave, valore in risultati.items() if chiave != "dimensioni"})
+        salva_json(RIFERIMENTO_FILE, riferimento)
+        print("Riferimento aggiornato.")
+
+    print("Processo completato.")
@@ -0,0 +1,285 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Riga di comando senza domande, adatta a cron e alle operazioni pianificate:
+#   fatture generate --from 120 --to 180 --workers 4
+#   fatture send --from 120 --to 180
+#   fatture send --resume
+#   fatture generate --from 1 --to 50000 --job   (su ogni computer che divide il lavoro)
+#   fatture progress
+#   fatture serve --port 8765
+# Qui vengono importati solo argparse e os: i moduli dei programmi (e con loro pandas,
+# PyMuPDF, reportlab e yagmail) vengono caricati dopo aver letto gli argomenti, e solo se servono.
+# Codici di uscita: 0 = tutto fatto, 1 = fatture non generate o mail non inviate,
+# 2 = errore negli argomenti o righe di dati_fattura da correggere (non viene fatto nulla).
+
+import argparse
+import os
+
+COMPRESSIONI = ("interna", "ghostscript", "ghostscript_batch")
+
+def crea_parser():
+    parser = argparse.ArgumentParser(prog="fatture", description="Genera i PDF delle fatture da dati_fattura e li invia per email.")
+    comandi = parser.add_subparsers(dest="comando", required=True, metavar="{generate,send,progress,serve}")
+
+    genera = comandi.add_parser("generate", aliases=["genera"], help="genera i PDF delle fatture")
+    aggiungi_intervallo(genera)
+    genera.add_argument("--modified", action="store_true", help="solo le fatture nuove, con i dati cambiati o con il PDF mancante")
+    genera.add_argument("--single-file", action="store_true", help="un unico PDF con tutte le fatture, una per pagina")
+    genera.add_argument("--dry-run", action="store_true", help="mostra le fatture che verrebbero generate, senza generarle")
+    genera.add_argument("--workers", type=int, metavar="N", help="processi di generazione (predefinito: uno per CPU)")
+    genera.add_argument("--compression", choices=COMPRESSIONI, help="modalità di compressione dei PDF (predefinita: interna)")
+    genera.add_argument("--excel", metavar="FILE", help="file Excel con i dati delle fatture (predefinito: dati_fattura.xlsm)")
+    genera.add_argument("--template", metavar="FILE", help="PDF della fattura vuota (predefinito: fattura_base.pdf)")
+    genera.add_argument("--template-mode", choices=("xobject", "copia"), help="come riprodurre il template in ogni fattura (predefinito: xobject)")
+    genera.add_argument("--fonts", metavar="CARTELLA", help="cartella dei font (predefinita: fonts)")
+    genera.add_argument("--layout", metavar="FILE", help="layout dei campi (predefinito: quello del pacchetto)")
+    genera.add_argument("--output", metavar="CARTELLA", help="cartella dei PDF generati (predefinita: Fatture)")
+    genera.add_argument("--shard", choices=("anno", "mese", "numeri"), help="divide i PDF in sottocartelle per anno, mese o blocchi di numeri")
+    genera.add_argument("--per-folder", type=int, metavar="N", help="fatture per sottocartella con --shard numeri (predefinito: 1000)")
+    genera.add_argument("--archive", choices=("zip", "tar"), help="scrive i PDF in un nuovo archivio invece che in file singoli")
+    genera.add_argument("--ghostscript", metavar="ESEGUIBILE", help="eseguibile di Ghostscript")
+    genera.add_argument("--profile", action="store_true", help="registra un profilo cProfile della generazione (in un solo processo)")
+    genera.add_argument("--job", action="store_true", help="divide l'intervallo in blocchi con gli altri processi e computer che eseguono lo stesso comando sulla stessa cartella di output")
+    genera.add_argument("--chunk-size", type=int, metavar="N", help="numeri fattura per blocco con --job (predefinito: 500)")
+    genera.add_argument("--lease", type=int, metavar="SECONDI", help="durata della concessione di un blocco con --job (predefinita: 120)")
+    genera.set_defaults(esegui=comando_genera)
+
+    invia = comandi.add_parser("send", aliases=["invia"], help="invia per email i PDF già generati")
+    aggiungi_intervallo(invia)
+    invia.add_argument("--resume", action="store_true", help="invia solo le mail rimaste nella coda di invio, senza leggere l'Excel")
+    invia.add_argument("--dry-run", action="store_true", help="mostra le mail che verrebbero inviate, senza collegarsi al server")
+    invia.add_argument("--base-dir", metavar="CARTELLA", help="cartella con Excel, Fatture, coda e limiti di invio (predefinita: quella corrente)")
+    invia.add_argument("--excel", metavar="FILE", help="file Excel con i dati delle fatture (predefinito: dati_fattura.xlsm nella cartella base)")
+    invia.add_argument("--invoices-dir", metavar="CARTELLA", help="cartella dei PDF da allegare (predefinita: Fatture nella cartella base)")
+    invia.add_argument("--sessions", type=int, metavar="N", help="sessioni SMTP aperte insieme")
+    invia.add_argument("--sender", metavar="EMAIL", help="indirizzo del mittente")
+    invia.add_argument("--test-server", metavar="HOST:PORTA", help="server SMTP di prova, senza TLS né login")
+    invia.set_defaults(esegui=comando_invia)
+
+    avanzamento = comandi.add_parser("progress", aliases=["avanzamento"], help="mostra l'avanzamento dei lavori divisi con --job")
+    aggiungi_intervallo(avanzamento)
+    avanzamento.add_argument("--output", metavar="CARTELLA", help="cartella dei PDF generati (predefinita: Fatture)")
+    avanzamento.set_defaults(esegui=comando_avanzamento)
+
+    servi = comandi.add_parser("serve", aliases=["servizio"], help="resta attivo e genera le singole fatture su richiesta HTTP, con template, font e dati già in memoria")
+    servi.add_argument("--host", metavar="INDIRIZZO", help="indirizzo di ascolto (predefinito: 127.0.0.1, solo questo computer)")
+    servi.add_argument("--port", type=int, metavar="PORTA", help="porta di ascolto (predefinita: 8765)")
+    servi.add_argument("--excel", metavar="FILE", help="file Excel con i dati delle fatture, riletto quando cambia (predefinito: dati_fattura.xlsm)")
+    servi.add_argument("--template", metavar="FILE", help="PDF della fattura vuota (predefinito: fattura_base.pdf)")
+    servi.add_argument("--fonts", metavar="CARTELLA", help="cartella dei font (predefinita: fonts)")
+    servi.add_argument("--layout", metavar="FILE", help="layout dei campi (predefinito: quello del pacchetto)")
+    servi.add_argument("--output", metavar="CARTELLA", help="cartella dove salvare le fatture richieste con ?salva=1 (predefinita: Fatture)")
+    servi.set_defaults(esegui=comando_servizio, da=None, a=None)
+    return parser
+
+def aggiungi_intervallo(parser):
+    parser.add_argument("--from", dest="da", type=int, metavar="N", help="primo numero fattura dell'intervallo")
+    parser.add_argument("--to", dest="a", type=int, metavar="N", help="ultimo numero fattura dell'intervallo")
+
+# Controlla gli argomenti prima di caricare qualunque modulo pesante
+def verifica_argomenti(parser, args):
+    if (args.da is None) != (args.a is None):
+        parser.error("--from e --to vanno indicati insieme")
+    if args.da is not None and args.da > args.a:
+        parser.error("il primo numero fattura dell'intervallo è maggiore dell'ultimo")
+    if args.esegui is comando_genera:
+        if args.workers is not None and args.workers < 1:
+            parser.error("--workers deve essere almeno 1")
+        if args.per_folder is not None and args.per_folder < 1:
+            parser.error("--per-folder deve essere almeno 1")
+        if args.archive and args.single_file:
+            parser.error("--archive non si usa con --single-file")
+        if args.job:
+            if args.da is None:
+                parser.error("--job richiede l'intervallo con --from e --to")
+            for opzione, usata in (("--single-file", args.single_file), ("--dry-run", args.dry_run), ("--profile", args.profile)):
+                if usata:
+                    parser.error(f"--job non si usa con {opzione}")
+        elif args.chunk_size is not None or args.lease is not None:
+            parser.error("--chunk-size e --lease si usano solo con --job")
+        if args.chunk_size is not None and args.chunk_size < 1:
+            parser.error("--chunk-size deve essere almeno 1")
+        if args.lease is not None and args.lease < 3:
+            parser.error("--lease deve essere almeno 3 secondi")
+    elif args.esegui is comando_servizio:
+        if args.port is not None and not 0 < args.port < 65536:
+            parser.error("--port deve essere tra 1 e 65535")
+    elif args.esegui is comando_invia:
+        if args.resume and args.da is not None:
+            parser.error("--resume non si usa con --from e --to")
+        if not args.resume and args.da is None:
+            parser.error("indicare l'intervallo con --from e --to, oppure --resume")
+        if args.sessions is not None and args.sessions < 1:
+            parser.error("--sessions deve essere almeno 1")
+
+# Solo gli argomenti indicati sulla riga di comando, con il nome delle impostazioni del modulo
+def impostazioni_da_argomenti(args, nomi):
+    return {impostazione: getattr(args, argomento) for argomento, impostazione in nomi.items() if getattr(args, argomento) is not None}
+
+def comando_genera(args):
+    from . import compilatore, excel
+    from .metriche import Metriche
+    from .validazione import dati_corretti
+
+    compilatore.configura(**impostazioni_da_argomenti(args, {
+        "excel": "EXCEL_FILE", "template": "PDF_TEMPLATE", "fonts": "FONT_DIR", "layout": "LAYOUT_FILE",
+        "output": "OUTPUT_DIR", "ghostscript": "GHOSTSCRIPT", "workers": "NUM_PROCESSI", "compression": "COMPRESSIONE",
+        "shard": "SUDDIVISIONE", "per_folder": "FATTURE_PER_CARTELLA", "archive": "ARCHIVIO", "template_mode": "MODALITA_TEMPLATE"
+    }))
+    if not os.path.exists(compilatore.EXCEL_FILE):
+        print(f"Errore: il file {compilatore.EXCEL_FILE} non esiste.")
+        return 2
+
+    metriche = Metriche()
+    with metriche.fase("caricamento_excel"):
+        df = excel.carica_dati_excel(compilatore.EXCEL_FILE, args.da, args.a)
+    if args.da is not None and df.empty:
+        print("Nessuna fattura trovata nell'intervallo specificato.")
+        return 2
+
+    # Con una sola riga da correggere non viene generato nulla (nemmeno in simulazione)
+    if not dati_corretti(df, "generata", metriche):
+        return 2
+
+    if args.job:
+        from . import lavori
+        non_generate = lavori.esegui_lavoratore(df, args.da, args.a, args.modified, metriche, args.chunk_size, args.lease)
+        print("Processo completato.")
+        return 1 if non_generate else 0
+
+    # La simulazione di tutte le fatture non ha bisogno del manifest (né del template per le impronte)
+    if args.dry_run and not args.modified:
+        fatture = compilatore.prepara_fatture(df)
+    else:
+        fatture, manifest, impronte = compilatore.seleziona_fatture(df, args.modified, metriche)
+    if args.dry_run:
+        if fatture:
+            if args.single_file:
+                formato = "in un unico PDF"
+            elif compilatore.ARCHIVIO:
+                formato = f"in un archivio {compilatore.ARCHIVIO}"
+            else:
+                formato = "un PDF per fattura"
+            print(f"Simulazione: {len(fatture)} fatture da generare, dalla n. {fatture[0]['numero_fattura']} ({fatture[0]['nome_cognome'].strip()}) "
+                  f"alla n. {fatture[-1]['numero_fattura']} ({fatture[-1]['nome_cognome'].strip()}), {formato} in {compilatore.OUTPUT_DIR}. Nessun PDF generato.")
+        else:
+            print("Simulazione: nessuna fattura da generare.")
+        return 0
+
+    non_generate = compilatore.genera(fatture, manifest, impronte, metriche, unico=args.single_file, profila=args.profile)
+    print("Processo completato.")
+    return 1 if non_generate else 0
+
+def comando_invia(args):
+    from . import invio
+    from .validazione import dati_corretti
+
+    # La password può stare in un file .env accanto al programma (python-dotenv è facoltativo)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    invio.configura(**impostazioni_da_argomenti(args, {
+        "base_dir": "BASE_DIR", "excel": "EXCEL_FILE", "invoices_dir": "FATTURE_DIR",
+        "sessions": "NUM_SESSIONI_SMTP", "sender": "MITTENTE", "test_server": "SERVER_PROVA_SMTP"
+    }))
+
+    if args.resume:
+        if args.dry_run:
+            in_coda = sorted(numero for numero, stato in invio.stati_coda_invii().items() if stato != "inviata")
+            if in_coda:
+                print(f"Simulazione: {len(in_coda)} mail da riprendere (fatture n. {', '.join(map(str, in_coda))}). Nessuna mail inviata.")
+            else:
+                print("Nessuna mail in coda.")
+            return 0
+
+        coda_invii = invio.CodaInvii()
+        try:
+            numeri = [mail["numero_fattura"] for mail in coda_invii.invii()]
+            invio.riprendi_invii(coda_invii, conferma=False)
+            return esito_invii(coda_invii, numeri)
+        finally:
+            coda_invii.chiudi()
+
+    if not os.path.exists(invio.EXCEL_FILE):
+        print(f"Errore: il file {invio.EXCEL_FILE} non esiste.")
+        return 2
+
+    df = invio.dati_intervallo(args.da, args.a)
+    if df is None:
+        print("Errore: intervallo di fatture non valido. Controlla i numeri inseriti e riprova.")
+        return 2
+    if not dati_corretti(df, "inviata"):
+        return 2
+    righe = invio.righe_invio(df)
+
+    # Gli allegati vengono cercati per numero fattura nell'indice delle fatture
+    # (la cartella viene letta, una sola volta, solo per quelli che mancano)
+    pdf_fatture = invio.indice_pdf_fatture(invio.FATTURE_DIR, [numero for numero, _, _ in righe])
+
+    if args.dry_run:
+        stati = invio.stati_coda_invii()
+        senza_pdf = [numero for numero, _, _ in righe if numero not in pdf_fatture]
+        gia_inviate = [numero for numero, _, _ in righe if stati.get(numero) == "inviata"]
+        da_inviare = len(righe) - len(set(senza_pdf) | set(gia_inviate))
+        print(f"Simulazione: {len(righe)} fatture nell'intervallo, {da_inviare} mail da inviare da {invio.MITTENTE}.")
+        if gia_inviate:
+            print(f"Già inviate in passato: {len(gia_inviate)} (non verrebbero ripetute).")
+        if senza_pdf:
+            print(f"PDF non trovato in {invio.FATTURE_DIR} per le fatture n. {', '.join(map(str, senza_pdf))}.")
+        print("Nessuna mail inviata.")
+        return 0
+
+    invii = invio.componi_invii(righe, pdf_fatture)
+    coda_invii = invio.CodaInvii()
+    try:
+        collegato = invio.accoda_e_spedisci(coda_invii, invii) if invii else True
+        esito = esito_invii(coda_invii, [mail["numero_fattura"] for mail in invii])
+    finally:
+        coda_invii.chiudi()
+
+    if collegato:
+        print("Invio completato.")
+    return 1 if esito or len(invii) < len(righe) else 0
+
+# Avanzamento dei lavori divisi tra più lavoratori (tutti, o quello dell'intervallo indicato)
+def comando_avanzamento(args):
+    from . import compilatore, lavori
+
+    compilatore.configura(**impostazioni_da_argomenti(args, {"output": "OUTPUT_DIR"}))
+    intervalli = lavori.lavori_registrati()
+    if args.da is not None:
+        intervalli = [intervallo for intervallo in intervalli if intervallo == (args.da, args.a)]
+    if not intervalli:
+        print("Nessun lavoro registrato.")
+        return 0
+    for numero_iniziale, numero_finale in intervalli:
+        lavoro = lavori.LavoroCondiviso(numero_iniziale, numero_finale)
+        try:
+            lavori.stampa_avanzamento(lavoro)
+        finally:
+            lavoro.chiudi()
+    return 0
+
+# Servizio di generazione sempre attivo (vedi servizio.py), fino a Ctrl+C
+def comando_servizio(args):
+    from . import compilatore, servizio
+
+    compilatore.configura(**impostazioni_da_argomenti(args, {
+        "excel": "EXCEL_FILE", "template": "PDF_TEMPLATE", "fonts": "FONT_DIR", "layout": "LAYOUT_FILE", "output": "OUTPUT_DIR"
+    }))
+    servizio.configura(**impostazioni_da_argomenti(args, {"host": "INDIRIZZO", "port": "PORTA"}))
+    return servizio.main()
+
+# 0 se tutte le mail indicate risultano inviate, altrimenti 1 (fallite, rimandate per il
+# limite giornaliero o non partite per un errore di connessione)
+def esito_invii(coda_invii, numeri):
+    return 1 if any(mail["stato"] != "inviata" for mail in coda_invii.invii(numeri)) else 0
+
+def main(argv=None):
+    parser = crea_parser()
+    args = parser.parse_args(argv)
+    verifica_argomenti(parser, args)
+    return args.esegui(args)
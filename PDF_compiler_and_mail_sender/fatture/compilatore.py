@@ -0,0 +1,1074 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Generazione dei PDF delle fatture. pandas, numpy, PyMuPDF e reportlab vengono importati
+# solo quando servono davvero (preparazione dei dati, rendering, misura dei testi), così
+# chi usa il modulo per una verifica o una simulazione non ne paga il caricamento.
+
+import os
+import subprocess
+import sys
+import hashlib
+import json
+import string
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from . import deposito
+from .excel import carica_dati_excel, percorsi_cache_excel
+from .metriche import Metriche
+from .validazione import dati_corretti
+
+# Percorsi predefiniti, relativi alla cartella da cui si avvia il programma; ogni computer
+# li imposta con configura() (vedi impostazioni.py nelle cartelle dei programmi)
+PDF_TEMPLATE = "fattura_base.pdf"
+OUTPUT_DIR = "Fatture"
+EXCEL_FILE = "dati_fattura.xlsm"
+FONT_DIR = "fonts"
+
+# Posizione, allineamento e font dei campi della fattura (condiviso dalle versioni Windows e macOS)
+LAYOUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layout_fattura.json")
+
+# Eseguibile di Ghostscript (None = gswin64c su Windows, gs sugli altri sistemi)
+GHOSTSCRIPT = None
+
+# Manifest della generazione incrementale: per ogni numero fattura l'impronta dei dati
+# usati e il PDF prodotto, così la scelta "M" rigenera solo le fatture cambiate
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, "manifest_fatture.json")
+
+# Metriche di ogni esecuzione (tempo reale, tempo di CPU e byte scritti per fase e per
+# fattura), aggiunte in fondo al file con una riga JSON per misura
+METRICHE_FILE = os.path.join(OUTPUT_DIR, "metriche_fatture.jsonl")
+
+# Profilo cProfile del ciclo di generazione, scritto quando il programma è avviato con --profile
+PROFILO_FILE = os.path.join(OUTPUT_DIR, "profilo_generazione.prof")
+
+# Blocchi dei lavori divisi tra più processi o computer (vedi lavori.py)
+LAVORI_FILE = os.path.join(OUTPUT_DIR, "lavori_fatture.sqlite")
+
+# Organizzazione dei PDF nella cartella di output (vedi deposito.py):
+# None     -> tutti i PDF direttamente nella cartella (comportamento originale)
+# "anno"   -> una sottocartella per anno della fattura, es. Fatture/2025
+# "mese"   -> una sottocartella per mese, es. Fatture/2025-03
+# "numeri" -> una sottocartella ogni FATTURE_PER_CARTELLA numeri, es. Fatture/001000-001999
+SUDDIVISIONE = None
+FATTURE_PER_CARTELLA = 1000
+
+# Con "zip" o "tar" i PDF non vengono salvati come file singoli ma scritti, appena pronti,
+# in un nuovo archivio per ogni esecuzione (con la compressione interna, in memoria).
+# None = un file per fattura.
+ARCHIVIO = None
+
+# Numero di processi usati per generare e comprimere i PDF (1 = un PDF alla volta)
+NUM_PROCESSI = os.cpu_count() or 1
+
+# Modalità di compressione dei PDF generati:
+# "interna"           -> compressione con PyMuPDF prima del salvataggio, senza processi esterni
+# "ghostscript"       -> un processo Ghostscript per ogni file (comportamento originale)
+# "ghostscript_batch" -> un solo processo Ghostscript per un intero gruppo di file
+COMPRESSIONE = "interna"
+PROFILO_COMPRESSIONE = "ebook"  # Vedi PROFILI_COMPRESSIONE
+
+# Come viene riprodotto il template in ogni fattura:
+# "xobject" -> la pagina di fattura_base.pdf viene preparata una sola volta come Form XObject
+#              (con le immagini già ricampionate dal profilo di compressione) e ogni fattura
+#              la richiama, aggiungendo solo il testo dei campi
+# "copia"   -> ogni fattura parte da una copia completa di fattura_base.pdf, compressa ogni
+#              volta per intero (comportamento originale; da usare se il template ha link o
+#              campi compilabili, che un XObject non riporta)
+MODALITA_TEMPLATE = "xobject"
+
+# Profili di compressione interna, ricalcati sui -dPDFSETTINGS di Ghostscript
+# (dpi = risoluzione delle immagini, soglia = oltre quale dpi ricampionare, qualita_jpeg = 0-100)
+PROFILI_COMPRESSIONE = {
+    "screen": {"dpi": 72, "soglia": 108, "qualita_jpeg": 40},
+    "ebook": {"dpi": 150, "soglia": 225, "qualita_jpeg": 75},
+    "printer": {"dpi": 300, "soglia": 450, "qualita_jpeg": 90}
+}
+
+# Valore di -dPDFSETTINGS passato a Ghostscript per ogni profilo di compressione
+PDFSETTINGS_GHOSTSCRIPT = {"screen": "/screen", "ebook": "/ebook", "printer": "/printer"}
+
+font_files = {
+    "TTNormsPro-Light": "TTNormsPro-Light.ttf",
+    "TTNormsPro-Regular": "TTNormsPro-Regular.ttf",
+    "TTNormsPro-Bold": "TTNormsPro-Bold.ttf",
+    "TTNormsPro-BoldItalic": "TTNormsPro-BoldItalic.ttf",
+    "TTNormsPro-Italic": "TTNormsPro-Italic.ttf"
+}
+
+# Impostazioni che si possono cambiare con configura()
+IMPOSTAZIONI = (
+    "PDF_TEMPLATE", "OUTPUT_DIR", "EXCEL_FILE", "FONT_DIR", "LAYOUT_FILE", "GHOSTSCRIPT",
+    "MANIFEST_FILE", "METRICHE_FILE", "PROFILO_FILE", "LAVORI_FILE", "SUDDIVISIONE", "FATTURE_PER_CARTELLA", "ARCHIVIO",
+    "NUM_PROCESSI", "COMPRESSIONE", "PROFILO_COMPRESSIONE", "MODALITA_TEMPLATE"
+)
+
+# Cartella dei font già registrati in reportlab (None = nessuno)
+font_registrati = None
+
+# Cambia le impostazioni del modulo, es. configura(OUTPUT_DIR=..., NUM_PROCESSI=1).
+# Manifest, metriche, profilo e lavori seguono la cartella di output, se non indicati a parte.
+def configura(**valori):
+    global font_registrati
+    for nome in valori:
+        if nome not in IMPOSTAZIONI:
+            raise ValueError(f"Impostazione sconosciuta: {nome}")
+
+    if "OUTPUT_DIR" in valori:
+        valori.setdefault("MANIFEST_FILE", os.path.join(valori["OUTPUT_DIR"], "manifest_fatture.json"))
+        valori.setdefault("METRICHE_FILE", os.path.join(valori["OUTPUT_DIR"], "metriche_fatture.jsonl"))
+        valori.setdefault("PROFILO_FILE", os.path.join(valori["OUTPUT_DIR"], "profilo_generazione.prof"))
+        valori.setdefault("LAVORI_FILE", os.path.join(valori["OUTPUT_DIR"], "lavori_fatture.sqlite"))
+    globals().update(valori)
+
+    # Con altri font o un altro layout le misure e i motori già pronti non valgono più
+    if "FONT_DIR" in valori or "LAYOUT_FILE" in valori or "PDF_TEMPLATE" in valori:
+        font_registrati = None
+        tabella_larghezze.cache_clear()
+        dividi_in_righe.cache_clear()
+        motori_pdf.clear()
+
+# Le impostazioni correnti, da passare ai processi di generazione (che su Windows e macOS
+# ripartono da zero e non vedono le modifiche fatte con configura nel processo principale)
+def impostazioni():
+    return {nome: globals()[nome] for nome in IMPOSTAZIONI}
+
+# Registra i font in reportlab, che serve solo a misurare i testi: avviene alla prima
+# misura invece che all'avvio
+def registra_font():
+    global font_registrati
+    if font_registrati == FONT_DIR:
+        return
+
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    for font_name, font_file in font_files.items():
+        pdfmetrics.registerFont(TTFont(font_name, os.path.join(FONT_DIR, font_file)))
+    font_registrati = FONT_DIR
+
+# Tabella delle larghezze dei caratteri (in punti) per un font e una dimensione,
+# costruita una sola volta dalle metriche del font registrato in reportlab.
+# Restituisce la tabella e la larghezza dei caratteri che non vi compaiono.
+@lru_cache(maxsize=None)
+def tabella_larghezze(fontname, fontsize):
+    from reportlab.pdfbase import pdfmetrics
+
+    registra_font()
+    face = pdfmetrics.getFont(fontname).face
+    scala = 0.001 * fontsize
+    tabella = {chr(codice): larghezza * scala for codice, larghezza in face.charWidths.items()}
+    return tabella, face.defaultWidth * scala
+
+# Stesso risultato di stringWidth, sommando le larghezze già calcolate dei singoli caratteri
+def calcola_larghezza_testo(text, fontname, fontsize):
+    tabella, larghezza_default = tabella_larghezze(fontname, fontsize)
+    return sum(tabella.get(carattere, larghezza_default) for carattere in text)
+
+# Divide un testo in righe che stanno nella larghezza indicata. Ogni parola viene misurata
+# una sola volta e le righe già calcolate vengono riutilizzate per le descrizioni ripetute.
+@lru_cache(maxsize=1024)
+def dividi_in_righe(testo, fontname, fontsize, larghezza_box):
+    larghezza_spazio = calcola_larghezza_testo(" ", fontname, fontsize)
+
+    righe = []
+    parole_riga = []
+    larghezza_riga = 0
+    for parola in testo.split():
+        larghezza_parola = calcola_larghezza_testo(parola, fontname, fontsize) + larghezza_spazio
+        if larghezza_riga + larghezza_parola <= larghezza_box:
+            parole_riga.append(parola)
+            larghezza_riga += larghezza_parola
+        else:
+            righe.append(" ".join(parole_riga))
+            parole_riga = [parola]
+            larghezza_riga = larghezza_parola
+
+    if parole_riga:
+        righe.append(" ".join(parole_riga))
+    return tuple(righe)
+
+# Legge la specifica del layout e la compila in un piano di rendering: coordinate già
+# convertite in punti e parti fisse dei testi (es. "Numero: ") già misurate, così per
+# ogni fattura restano da inserire i valori e da misurare solo il testo variabile.
+# I campi allineati a sinistra vengono ripuliti dagli spazi iniziali e finali.
+def compila_layout(layout_file=None):
+    with open(layout_file or LAYOUT_FILE, encoding="utf-8") as f:
+        specifica = json.load(f)
+
+    if specifica.get("unita", "mm") == "mm":
+        in_punti = lambda valore: valore * 72 / 25.4
+    else:
+        in_punti = lambda valore: valore
+
+    piano = []
+    for campo in specifica["campi"]:
+        font_name = campo["font"]
+        if font_name not in font_files:
+            raise ValueError(f"Il campo {campo['nome']} del layout usa il font {font_name}, che non è tra i font disponibili")
+        font_size = campo.get("font_size", specifica["font_size"])
+
+        # Il testo viene diviso in parti fisse e nomi dei dati da inserire: [(testo fisso, None), (None, nome dato), ...]
+        parti = []
+        for letterale, nome_dato, _, _ in string.Formatter().parse(campo["testo"]):
+            if letterale:
+                parti.append((letterale, None))
+            if nome_dato is not None:
+                parti.append((None, nome_dato))
+
+        voce = {
+            "nome": campo["nome"],
+            "allineamento": campo["allineamento"],
+            "font": font_name,
+            "font_size": font_size,
+            "parti": parti,
+            "larghezza_fissa": sum(calcola_larghezza_testo(letterale, font_name, font_size) for letterale, nome_dato in parti if nome_dato is None)
+        }
+
+        if campo["allineamento"] == "box":
+            x1, y1, x2, y2 = (in_punti(valore) for valore in campo["box"])
+            voce.update(x=x1, y=y1, y_massima=y2, larghezza_box=x2 - x1, linea_altezza=font_size * campo.get("interlinea", 1.2))
+        elif campo["allineamento"] in ("destra", "sinistra", "centro"):
+            voce.update(x=in_punti(campo["x"]), y=in_punti(campo["y"]))
+        else:
+            raise ValueError(f"Allineamento non valido per il campo {campo['nome']}: {campo['allineamento']}")
+
+        piano.append(voce)
+    return piano
+
+# Testo di un campo del piano con i dati della fattura, e sua larghezza (per i campi allineati).
+# Un campo formato da un solo dato usa il valore convertito in testo, come faceva il vecchio layout.
+def testo_campo(voce, data_dict):
+    parti = voce["parti"]
+    if len(parti) == 1 and parti[0][1] is not None:
+        testo = str(data_dict[parti[0][1]])
+        if voce["allineamento"] == "sinistra" or voce["allineamento"] == "box":
+            return testo, None
+        return testo, calcola_larghezza_testo(testo, voce["font"], voce["font_size"])
+
+    valori = [letterale if nome_dato is None else str(data_dict[nome_dato]) for letterale, nome_dato in parti]
+    testo = "".join(valori)
+    if voce["allineamento"] == "sinistra" or voce["allineamento"] == "box":
+        return testo, None
+    larghezza = voce["larghezza_fissa"]
+    for (letterale, nome_dato), valore in zip(parti, valori):
+        if nome_dato is not None:
+            larghezza += calcola_larghezza_testo(valore, voce["font"], voce["font_size"])
+    return testo, larghezza
+
+# Motore di rendering: legge il template e i font una sola volta, poi compila
+# ogni fattura su una copia in memoria della pagina base (vedi MODALITA_TEMPLATE)
+class MotorePDF:
+    def __init__(self, template_path, font_dir=None, font_files=font_files, layout_file=None):
+        import fitz
+
+        font_dir = font_dir or FONT_DIR
+        with open(template_path, "rb") as f:
+            self.template_bytes = f.read()
+
+        # Il layout viene compilato una sola volta in un piano con le coordinate in punti
+        self.piano = compila_layout(layout_file)
+
+        # I font usati dal layout vengono analizzati una sola volta e condivisi da tutte le fatture
+        font_usati = {voce["font"] for voce in self.piano}
+        self.font_buffers = {}
+        self.fonts = {}
+        for font_name, font_file in font_files.items():
+            if font_name not in font_usati:
+                continue
+            with open(os.path.join(font_dir, font_file), "rb") as f:
+                self.font_buffers[font_name] = f.read()
+            self.fonts[font_name] = fitz.Font(fontbuffer=self.font_buffers[font_name])
+
+        # Pagine base già preparate come XObject, una per profilo di compressione
+        self.basi_xobject = {}
+
+    # Pagina base con il template come Form XObject, preparata alla prima fattura di ogni
+    # profilo: immagini ricampionate e contenuto del template ripulito e compresso una volta
+    # sola. I font del template restano interi, così vengono ridotti insieme a quelli dei
+    # campi e in ogni PDF finisce una sola copia di ciascun font.
+    def base_xobject(self, profilo=None):
+        import fitz
+
+        if profilo not in self.basi_xobject:
+            template = fitz.open(stream=self.template_bytes, filetype="pdf")
+            documento = fitz.open()
+            pagina = documento.new_page(width=template[0].rect.width, height=template[0].rect.height)
+            pagina.show_pdf_page(pagina.rect, template, 0)
+            template.close()
+            if profilo:
+                comprimi_documento(documento, profilo, subset_font=False)
+            self.basi_xobject[profilo] = documento.tobytes(garbage=3, clean=True, deflate=True, deflate_images=True)
+            documento.close()
+        return self.basi_xobject[profilo]
+
+    # Byte da cui parte ogni fattura, secondo MODALITA_TEMPLATE
+    def sorgente(self, profilo=None):
+        return self.base_xobject(profilo) if MODALITA_TEMPLATE == "xobject" else self.template_bytes
+
+    # Comprime una fattura compilata con il profilo indicato e restituisce le opzioni per
+    # salvarla. Con il template come XObject immagini e contenuto del template sono già
+    # pronti: restano da comprimere il testo dei campi e i font.
+    def prepara_salvataggio(self, documento, profilo):
+        if MODALITA_TEMPLATE == "xobject":
+            return OPZIONI_SALVATAGGIO_XOBJECT
+        comprimi_documento(documento, profilo, subset_font=False)
+        return OPZIONI_SALVATAGGIO_COMPRESSO
+
+    # Restituisce un nuovo documento (in memoria) con i dati della fattura già inseriti.
+    # Vengono incorporati solo i font effettivamente usati dai campi della fattura,
+    # ridotti ai soli glifi presenti nel testo. Il profilo sceglie la pagina base già
+    # compressa con cui verrà salvata la fattura.
+    def compila(self, data_dict, profilo=None):
+        import fitz
+
+        documento = fitz.open(stream=self.sorgente(profilo), filetype="pdf")
+        pagina = documento[0]
+
+        scrittore = fitz.TextWriter(pagina.rect)
+        self._timbra(scrittore, data_dict)
+        scrittore.write_text(pagina, color=(0, 0, 0))
+
+        documento.subset_fonts()
+        return documento
+
+    # Compila la fattura e la salva nel percorso indicato; con un profilo di compressione
+    # il documento viene compresso in memoria prima dell'unico salvataggio su disco.
+    # Generazione e compressione (o salvataggio) vengono registrate in metriche.
+    def salva(self, output_pdf_path, data_dict, profilo=None, metriche=None):
+        metriche = metriche if metriche is not None else Metriche()
+        numero = data_dict["numero_fattura"]
+        with metriche.fase("generazione", numero):
+            documento = self.compila(data_dict, profilo)
+        with metriche.fase("compressione" if profilo else "salvataggio", numero) as voce:
+            if profilo:
+                documento.save(output_pdf_path, **self.prepara_salvataggio(documento, profilo))
+            else:
+                documento.save(output_pdf_path)
+            documento.close()
+            voce["byte"] = os.path.getsize(output_pdf_path)
+
+    # Compila la fattura e la restituisce come byte del PDF già compresso, senza passare dal disco
+    def in_memoria(self, data_dict, profilo=None, metriche=None):
+        profilo = profilo or PROFILO_COMPRESSIONE
+        metriche = metriche if metriche is not None else Metriche()
+        numero = data_dict["numero_fattura"]
+        with metriche.fase("generazione", numero):
+            documento = self.compila(data_dict, profilo)
+        with metriche.fase("compressione", numero) as voce:
+            contenuto = documento.tobytes(**self.prepara_salvataggio(documento, profilo))
+            documento.close()
+            voce["byte"] = len(contenuto)
+        return contenuto
+
+    # Compila più fatture in un unico documento, una per pagina. La pagina del template
+    # viene incorporata una sola volta come XObject e richiamata da ogni pagina, e ogni
+    # font viene incorporato una sola volta per tutto il documento (qualunque sia
+    # MODALITA_TEMPLATE: il documento viene compresso una volta sola, tutto insieme).
+    # Restituisce il documento e i messaggi di errore delle fatture non inserite.
+    def compila_raccolta(self, fatture):
+        import fitz
+
+        documento = fitz.open()
+        template = fitz.open(stream=self.template_bytes, filetype="pdf")
+        rect_template = template[0].rect
+
+        errori = []
+        for data_dict in fatture:
+            pagina = documento.new_page(width=rect_template.width, height=rect_template.height)
+            try:
+                pagina.show_pdf_page(pagina.rect, template, 0)
+                scrittore = fitz.TextWriter(pagina.rect)
+                self._timbra(scrittore, data_dict)
+                scrittore.write_text(pagina, color=(0, 0, 0))
+            except Exception as e:
+                documento.delete_page(-1)
+                errori.append(f"Errore nella generazione della fattura n. {data_dict['numero_fattura']}: {e}")
+
+        template.close()
+        documento.subset_fonts()
+        return documento, errori
+
+    # Come salva, ma per un documento con tutte le fatture: un solo salvataggio per l'intero lotto
+    def salva_raccolta(self, output_pdf_path, fatture, profilo=None):
+        documento, errori = self.compila_raccolta(fatture)
+        numero_pagine = documento.page_count
+        if numero_pagine > 0:
+            if profilo:
+                comprimi_documento(documento, profilo, subset_font=False)
+                documento.save(output_pdf_path, **OPZIONI_SALVATAGGIO_COMPRESSO)
+            else:
+                documento.save(output_pdf_path, garbage=3, deflate=True)
+        documento.close()
+        return numero_pagine, errori
+
+    # Aggiunge al TextWriter i testi della fattura seguendo il piano del layout; il font
+    # di ogni testo decide quali font finiscono nel PDF
+    def _timbra(self, scrittore, data_dict):
+        for voce in self.piano:
+            testo, larghezza_testo = testo_campo(voce, data_dict)
+            font = self.fonts[voce["font"]]
+            font_size = voce["font_size"]
+
+            if voce["allineamento"] == "destra":
+                scrittore.append((voce["x"] - larghezza_testo, voce["y"]), testo, font=font, fontsize=font_size)
+            elif voce["allineamento"] == "centro":
+                scrittore.append((voce["x"] - larghezza_testo / 2, voce["y"]), testo, font=font, fontsize=font_size)
+            elif voce["allineamento"] == "sinistra":
+                scrittore.append((voce["x"], voce["y"]), testo.strip(), font=font, fontsize=font_size)
+            else:
+                self._timbra_box(scrittore, voce, testo, font)
+
+    # Testo su più righe dentro un box (la descrizione)
+    def _timbra_box(self, scrittore, voce, testo, font):
+        font_size = voce["font_size"]
+        y_posizione = voce["y"]
+
+        righe = dividi_in_righe(testo, voce["font"], font_size, voce["larghezza_box"])
+
+        for riga in righe:
+            if y_posizione > voce["y_massima"]:
+                # Il testo esce dal box: come in origine, della riga successiva si scrive solo la prima parola
+                scrittore.append((voce["x"], y_posizione), riga.split()[0], font=font, fontsize=font_size)
+                break
+
+            scrittore.append((voce["x"], y_posizione), riga, font=font, fontsize=font_size)
+            y_posizione += voce["linea_altezza"]
+
+# Un motore per ogni template già usato, così le chiamate ripetute non rileggono template e font
+motori_pdf = {}
+
+def compila_pdf(input_pdf_path, output_pdf_path, data_dict):
+    if input_pdf_path not in motori_pdf:
+        motori_pdf[input_pdf_path] = MotorePDF(input_pdf_path)
+    motori_pdf[input_pdf_path].salva(output_pdf_path, data_dict)
+
+# Come compila_pdf, ma restituisce i byte del PDF compresso invece di salvarlo
+def compila_pdf_in_memoria(input_pdf_path, data_dict, profilo=None):
+    if input_pdf_path not in motori_pdf:
+        motori_pdf[input_pdf_path] = MotorePDF(input_pdf_path)
+    return motori_pdf[input_pdf_path].in_memoria(data_dict, profilo)
+
+# Scrive un PDF già pronto su un file temporaneo e poi lo sostituisce, così chi legge
+# la cartella Fatture non trova mai un file scritto a metà
+def scrivi_pdf(output_pdf_path, contenuto):
+    temp_output = output_pdf_path + ".tmp"
+    with open(temp_output, "wb") as f:
+        f.write(contenuto)
+    os.replace(temp_output, output_pdf_path)
+
+# Opzioni di salvataggio per i PDF compressi: rimozione degli oggetti inutilizzati
+# e compressione deflate di contenuti, immagini e font
+OPZIONI_SALVATAGGIO_COMPRESSO = {
+    "garbage": 3,
+    "clean": True,
+    "deflate": True,
+    "deflate_images": True,
+    "deflate_fonts": True,
+    "use_objstms": 1
+}
+
+# Opzioni di salvataggio delle fatture sulla pagina base XObject: le immagini sono già
+# ricampionate e il contenuto del template già ripulito, quindi non vengono rielaborati
+OPZIONI_SALVATAGGIO_XOBJECT = {
+    "garbage": 3,
+    "deflate": True,
+    "deflate_fonts": True,
+    "use_objstms": 1
+}
+
+# Comprime un documento PyMuPDF già aperto, senza passare dal disco
+def comprimi_documento(documento, profilo=None, subset_font=True):
+    impostazioni = PROFILI_COMPRESSIONE[profilo or PROFILO_COMPRESSIONE]
+
+    # Ricampiona le immagini troppo definite, come fa Ghostscript con il profilo scelto
+    documento.rewrite_images(dpi_threshold=impostazioni["soglia"], dpi_target=impostazioni["dpi"], quality=impostazioni["qualita_jpeg"])
+
+    # Incorpora solo i glifi effettivamente usati nei font (i PDF di MotorePDF lo sono già)
+    if subset_font:
+        documento.subset_fonts()
+
+# Comprime un PDF già salvato, con PyMuPDF (sovrascrivendo l'originale)
+def comprimi_pdf_interno(input_file, profilo=None):
+    import fitz
+
+    documento = fitz.open(input_file)
+    comprimi_documento(documento, profilo)
+    contenuto = documento.tobytes(**OPZIONI_SALVATAGGIO_COMPRESSO)
+    documento.close()
+
+    with open(input_file, "wb") as f:
+        f.write(contenuto)
+
+def ghostscript_eseguibile():
+    if GHOSTSCRIPT:
+        return GHOSTSCRIPT
+    if sys.platform.startswith('win'):
+        return 'gswin64c'  # o 'gswin32c' a seconda della propria installazione
+    else:
+        return 'gs'
+
+def esegui_ghostscript(gs_command, dati_input=None):
+    if sys.platform.startswith('win'):
+        creationflags = subprocess.CREATE_NO_WINDOW
+        return subprocess.run(gs_command, input=dati_input, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=creationflags)
+    else:
+        return subprocess.run(gs_command, input=dati_input, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+# Comprime un singolo file PDF (sovrascrivendo l'originale)
+def compress_pdf(input_file):
+    gs_command_base = ghostscript_eseguibile()
+
+    # Crea un file temporaneo per evitare conflitti durante la sovrascrittura
+    temp_output = input_file + ".tmp"
+
+    gs_command = [
+        gs_command_base,
+        '-sDEVICE=pdfwrite',
+        '-dCompatibilityLevel=1.4',
+        f'-dPDFSETTINGS={PDFSETTINGS_GHOSTSCRIPT[PROFILO_COMPRESSIONE]}',  # Qualità/compressione da PROFILO_COMPRESSIONE
+        '-dNOPAUSE',
+        '-dQUIET',
+        '-dBATCH',
+        '-dSAFER',
+        f'-sOutputFile={temp_output}',
+        input_file
+    ]
+
+    result = esegui_ghostscript(gs_command)
+
+    # Restituisce il messaggio di errore (None se la compressione è andata a buon fine)
+    if result.returncode != 0:
+        return f'Errore durante la compressione di {input_file}: {result.stderr.decode()}'
+    else:
+        os.replace(temp_output, input_file)
+        return None
+
+# Converte un percorso in una stringa PostScript (con i caratteri speciali protetti)
+def stringa_postscript(percorso):
+    percorso = percorso.replace("\\", "/")
+    for carattere in "\\()":
+        percorso = percorso.replace(carattere, "\\" + carattere)
+    return "(" + percorso + ")"
+
+# Comprime più file PDF con un unico processo Ghostscript (sovrascrivendo gli originali).
+# Per ogni file viene cambiato il file di output del dispositivo pdfwrite e poi eseguito
+# il PDF di ingresso; un file con errori non interrompe gli altri.
+# Restituisce un dizionario {file: messaggio di errore} per i file non compressi.
+def compress_pdf_batch(input_files):
+    if not input_files:
+        return {}
+
+    comandi = []
+    for i, input_file in enumerate(input_files):
+        # Un file temporaneo rimasto da un'esecuzione precedente verrebbe scambiato per un successo
+        if os.path.exists(input_file + ".tmp"):
+            os.remove(input_file + ".tmp")
+
+        temp_output = stringa_postscript(input_file + ".tmp")
+        comandi.append(f"<< /OutputFile {temp_output} >> setpagedevice")
+        comandi.append(f"{{ {stringa_postscript(input_file)} run }} stopped {{ (ERRORE {i}) = flush }} if")
+
+    cartelle = {os.path.dirname(os.path.abspath(f)) for f in input_files}
+    gs_command = [
+        ghostscript_eseguibile(),
+        '-sDEVICE=pdfwrite',
+        '-dCompatibilityLevel=1.4',
+        f'-dPDFSETTINGS={PDFSETTINGS_GHOSTSCRIPT[PROFILO_COMPRESSIONE]}',  # Qualità/compressione da PROFILO_COMPRESSIONE
+        '-dNOPAUSE',
+        '-dQUIET',
+        '-dBATCH',
+        f'-sOutputFile={input_files[0]}.tmp'
+    ]
+    # Con -dSAFER Ghostscript legge e scrive solo nelle cartelle autorizzate
+    gs_command.append('-dSAFER')
+    for cartella in cartelle:
+        gs_command.append(f'--permit-file-all={cartella}{os.sep}')
+    gs_command.append('-')  # I comandi vengono letti dallo standard input
+
+    result = esegui_ghostscript(gs_command, "\n".join(comandi).encode("utf-8"))
+
+    errori = {}
+    for riga in result.stdout.decode(errors="replace").splitlines():
+        if riga.startswith("ERRORE "):
+            input_file = input_files[int(riga.split()[1])]
+            errori[input_file] = f'Errore durante la compressione di {input_file}'
+
+    for input_file in input_files:
+        temp_output = input_file + ".tmp"
+        if input_file in errori or not os.path.exists(temp_output):
+            errori.setdefault(input_file, f'Errore durante la compressione di {input_file}: {result.stderr.decode()}')
+            if os.path.exists(temp_output):
+                os.remove(temp_output)
+        else:
+            os.replace(temp_output, input_file)
+    return errori
+
+# Formatta una colonna di numeri con due decimali e la virgola come separatore
+def formatta_decimali(valori):
+    import numpy as np
+    import pandas as pd
+
+    testi = np.char.mod("%.2f", valori.to_numpy(dtype=float))
+    return pd.Series(testi, index=valori.index).str.replace(".", ",", regex=False)
+
+def formatta_euro(valori):
+    return "€ " + formatta_decimali(valori)
+
+# Prepara in un solo passaggio, colonna per colonna, i dati di tutte le fatture da generare
+# (importi, date e nomi dei file già formattati) e li restituisce come lista di dizionari
+def prepara_fatture(df):
+    import pandas as pd
+
+    if df.empty:
+        return []
+
+    nomi = df.iloc[:, 0]
+    quantita = df.iloc[:, 3]
+    prezzi = pd.to_numeric(df.iloc[:, 4], errors="coerce")
+    iva = pd.to_numeric(df.iloc[:, 5], errors="coerce")
+    bolli = pd.to_numeric(df.iloc[:, 6], errors="coerce")
+    date = pd.to_datetime(df.iloc[:, 7], dayfirst=True, format="mixed", errors="coerce")
+    numeri = df.iloc[:, 8]
+
+    cartelle = deposito.sottocartelle(SUDDIVISIONE, numeri, date, FATTURE_PER_CARTELLA)
+    cartelle = os.path.join(OUTPUT_DIR, "") + cartelle.where(cartelle == "", cartelle + os.sep)
+
+    totali = pd.to_numeric(quantita, errors="coerce") * prezzi
+    netti = totali * (1 + iva * 0.01) + bolli
+    nomi_puliti = nomi.str.strip()
+
+    # Righe che non si possono generare: nome mancante, data non riconosciuta
+    # o importi non numerici (le celle vuote restano ammesse come prima)
+    valide = nomi_puliti.notna() & date.notna()
+    for originale, convertito in ((quantita, pd.to_numeric(quantita, errors="coerce")), (df.iloc[:, 4], prezzi), (df.iloc[:, 5], iva), (df.iloc[:, 6], bolli)):
+        valide &= originale.isna() | convertito.notna()
+
+    fatture = pd.DataFrame({
+        "nome_cognome": nomi,
+        "codice_fiscale": df.iloc[:, 1],
+        "descrizione": df.iloc[:, 2],
+        "quantità": quantita.astype(str),
+        "prezzo": formatta_euro(prezzi),
+        "iva": formatta_decimali(iva) + " %",
+        "marca_da_bollo": formatta_euro(bolli),
+        "totale1": formatta_euro(totali),
+        "netto": formatta_euro(netti),
+        "numero_fattura": numeri,
+        "data": date.dt.strftime("%d/%m/%Y"),
+        "output_pdf_path": cartelle + "Fatt. n. " + numeri.astype(str) + " - " + nomi_puliti + ".pdf",
+        "valida": valide
+    })
+    return fatture.to_dict("records")
+
+# Motore del processo corrente: ogni processo carica template e font una sola volta
+motore_processo = None
+
+# Con le impostazioni del processo principale (vedi impostazioni()) il processo usa gli
+# stessi percorsi anche quando è stato avviato da zero
+def inizializza_processo(impostazioni_processo=None):
+    global motore_processo
+    if impostazioni_processo:
+        configura(**impostazioni_processo)
+    motore_processo = MotorePDF(PDF_TEMPLATE)
+
+# Genera e comprime una fattura preparata da prepara_fatture. I messaggi vengono restituiti
+# invece che stampati, così il processo principale li mostra in ordine di numero fattura
+# Restituisce anche il percorso del PDF generato (None in caso di errore) e le voci delle
+# metriche, misurate nel processo che ha generato la fattura.
+def elabora_fattura(dati):
+    messaggi = []
+    metriche = Metriche()
+    output_pdf_path = None
+    try:
+        if not dati["valida"]:
+            raise ValueError("dati mancanti o non validi nella riga dell'Excel")
+        output_pdf_path = dati["output_pdf_path"]
+
+        if COMPRESSIONE == "interna":
+            # Il documento viene compresso in memoria e salvato una sola volta
+            motore_processo.salva(output_pdf_path, dati, profilo=PROFILO_COMPRESSIONE, metriche=metriche)
+            messaggi.append(f"Generato PDF: {output_pdf_path}")
+            messaggi.append(f"Compresso PDF: {output_pdf_path}")
+        else:
+            motore_processo.salva(output_pdf_path, dati, metriche=metriche)
+            messaggi.append(f"Generato PDF: {output_pdf_path}")
+
+            # Assicura che il file sia stato completamente scritto su disco
+            #time.sleep(0.5)  # Attendi mezzo secondo (puoi regolare o rimuovere questo se non necessario)
+
+            # Con "ghostscript_batch" la compressione avviene alla fine, per tutti i file insieme
+            if COMPRESSIONE == "ghostscript":
+                # Comprime il PDF generato (sovrascrivendo l'originale)
+                with metriche.fase("compressione", dati["numero_fattura"]) as voce:
+                    errore = compress_pdf(output_pdf_path)
+                    if not errore:
+                        voce["byte"] = os.path.getsize(output_pdf_path)
+                if errore:
+                    messaggi.append(errore)
+                    output_pdf_path = None
+                else:
+                    messaggi.append(f"Compresso PDF: {output_pdf_path}")
+    except Exception as e:
+        # Una riga con errori non interrompe il resto delle fatture
+        messaggi.append(f"Errore nella generazione della fattura n. {dati['numero_fattura']}: {e}")
+        output_pdf_path = None
+    return output_pdf_path, messaggi, metriche.voci
+
+# Come elabora_fattura, ma il PDF compresso (sempre con la compressione interna) viene
+# restituito in byte invece di essere salvato. Restituisce i byte (None in caso di errore),
+# i messaggi e le voci delle metriche.
+def elabora_fattura_in_memoria(dati):
+    messaggi = []
+    metriche = Metriche()
+    contenuto = None
+    try:
+        if not dati["valida"]:
+            raise ValueError("dati mancanti o non validi nella riga dell'Excel")
+        contenuto = motore_processo.in_memoria(dati, profilo=PROFILO_COMPRESSIONE, metriche=metriche)
+        messaggi.append(f"Generato PDF in memoria: fattura n. {dati['numero_fattura']}")
+    except Exception as e:
+        messaggi.append(f"Errore nella generazione della fattura n. {dati['numero_fattura']}: {e}")
+        contenuto = None
+    return contenuto, messaggi, metriche.voci
+
+# Comprime i PDF generati dividendoli in gruppi, uno per processo, ciascuno
+# gestito da un solo processo Ghostscript. I messaggi seguono l'ordine dei file.
+# Ogni gruppo è una misura della fase "compressione_batch".
+# Restituisce i PDF compressi correttamente.
+def comprimi_in_batch(pdf_generati, metriche):
+    num_gruppi = max(1, min(NUM_PROCESSI, len(pdf_generati)))
+    gruppi = [pdf_generati[i::num_gruppi] for i in range(num_gruppi)]
+
+    def comprimi_gruppo(gruppo):
+        with metriche.fase("compressione_batch") as voce:
+            try:
+                errori_gruppo = compress_pdf_batch(gruppo)
+            except OSError as e:
+                # Ghostscript non installato o non avviabile: i PDF restano non compressi
+                return {f: f'Errore durante la compressione di {f}: {e}' for f in gruppo}
+            voce["byte"] = sum(os.path.getsize(f) for f in gruppo if f not in errori_gruppo)
+        return errori_gruppo
+
+    errori = {}
+    with ThreadPoolExecutor(max_workers=num_gruppi) as executor:
+        for errori_gruppo in executor.map(comprimi_gruppo, gruppi):
+            errori.update(errori_gruppo)
+
+    compressi = []
+    for output_pdf_path in pdf_generati:
+        if output_pdf_path in errori:
+            print(errori[output_pdf_path])
+        else:
+            print(f"Compresso PDF: {output_pdf_path}")
+            compressi.append(output_pdf_path)
+    return compressi
+
+# Impronta di tutto ciò che, oltre ai dati della riga, determina il PDF finale: template,
+# layout, font, questo programma e impostazioni di compressione
+def impronta_ambiente():
+    h = hashlib.sha256()
+    for percorso in [PDF_TEMPLATE, LAYOUT_FILE, os.path.abspath(__file__)] + [os.path.join(FONT_DIR, f) for f in sorted(font_files.values())]:
+        with open(percorso, "rb") as f:
+            h.update(f.read())
+    h.update(f"{COMPRESSIONE}|{PROFILO_COMPRESSIONE}|{MODALITA_TEMPLATE}".encode("utf-8"))
+    return h.hexdigest()
+
+def impronta_fattura(dati, ambiente):
+    contenuto = json.dumps(dati, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256((ambiente + contenuto).encode("utf-8")).hexdigest()
+
+def carica_manifest():
+    try:
+        with open(MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+# Scrive il manifest su un file temporaneo e poi lo sostituisce, per non lasciarlo mai a metà
+def salva_manifest(manifest):
+    temp_output = MANIFEST_FILE + ".tmp"
+    with open(temp_output, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temp_output, MANIFEST_FILE)
+
+# Una fattura va rigenerata se non è nel manifest, se la sua impronta è cambiata
+# o se il PDF non esiste più (nella cartella o nell'archivio dove era stato salvato)
+def da_rigenerare(dati, impronta, manifest):
+    voce = manifest.get(str(dati["numero_fattura"]))
+    return voce is None or voce["impronta"] != impronta or not deposito.esiste(voce["file"])
+
+# Percorso del PDF di una fattura: quello registrato nel manifest se è ancora aggiornato
+# (può essere in un'altra sottocartella o in un archivio), altrimenti quello da generare
+def percorso_pdf(dati, impronta, manifest):
+    if da_rigenerare(dati, impronta, manifest):
+        return dati["output_pdf_path"]
+    return manifest[str(dati["numero_fattura"])]["file"]
+
+# Registra nel manifest e nell'indice della cartella di output le fatture generate; se il
+# nome del file è cambiato (ad esempio per una correzione del nome) il PDF precedente
+# viene eliminato
+def aggiorna_manifest(manifest, fatture, impronte, pdf_riusciti):
+    pdf_riusciti = set(pdf_riusciti)
+    salvati = {}
+    for dati in fatture:
+        if dati["output_pdf_path"] not in pdf_riusciti:
+            continue
+        salvati[dati["numero_fattura"]] = dati["output_pdf_path"]
+
+        numero = str(dati["numero_fattura"])
+        voce_precedente = manifest.get(numero)
+        if voce_precedente and voce_precedente["file"] != dati["output_pdf_path"] and os.path.exists(voce_precedente["file"]):
+            os.remove(voce_precedente["file"])
+            print(f"Rimosso PDF non più aggiornato: {voce_precedente['file']}")
+
+        manifest[numero] = {"impronta": impronte[numero], "file": dati["output_pdf_path"]}
+    salva_manifest(manifest)
+    deposito.aggiorna_indice(OUTPUT_DIR, salvati)
+
+# Come aggiorna_manifest. Con esclusiva (un context manager che blocca gli altri processi
+# che generano nella stessa cartella, vedi lavori.py) il manifest viene riletto e
+# aggiornato mentre il blocco è attivo, così restano le fatture registrate dagli altri.
+def registra_generate(manifest, fatture, impronte, pdf_riusciti, esclusiva=None):
+    if esclusiva is None:
+        aggiorna_manifest(manifest, fatture, impronte, pdf_riusciti)
+        return
+    with esclusiva():
+        aggiorna_manifest(carica_manifest(), fatture, impronte, pdf_riusciti)
+
+# Crea la cartella di output e le sottocartelle delle fatture da generare
+def crea_cartelle(fatture):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    for cartella in {os.path.dirname(dati["output_pdf_path"]) for dati in fatture}:
+        os.makedirs(cartella, exist_ok=True)
+
+# Scrive le fatture in un nuovo archivio (ARCHIVIO = "zip" o "tar") man mano che sono
+# pronte, nell'ordine delle righe. I PDF vengono generati e compressi in memoria (sempre
+# con la compressione interna) e non passano dalla cartella; dentro l'archivio mantengono
+# la sottocartella di SUDDIVISIONE. Restituisce i percorsi nell'archivio per numero fattura.
+def genera_archivio(fatture, metriche, profila=False):
+    fatture_valide = [dati for dati in fatture if dati["valida"]]
+    if not fatture_valide:
+        for dati in fatture:
+            print(f"Errore nella generazione della fattura n. {dati['numero_fattura']}: dati mancanti o non validi nella riga dell'Excel")
+        return {}
+
+    # Il nome comprende data e ora, così un archivio precedente non viene mai sostituito
+    primo = fatture_valide[0]["numero_fattura"]
+    ultimo = fatture_valide[-1]["numero_fattura"]
+    adesso = datetime.now().strftime("%Y-%m-%d %H.%M.%S")
+    percorso = os.path.join(OUTPUT_DIR, f"Archivio fatture n. {primo} - {ultimo} ({adesso}){deposito.ESTENSIONI_ARCHIVIO[ARCHIVIO]}")
+
+    def risultati():
+        if NUM_PROCESSI > 1 and not profila:
+            with ProcessPoolExecutor(max_workers=NUM_PROCESSI, initializer=inizializza_processo, initargs=(impostazioni(),)) as executor:
+                yield from zip(fatture, executor.map(elabora_fattura_in_memoria, fatture))
+        else:
+            inizializza_processo()
+            for dati in fatture:
+                yield dati, elabora_fattura_in_memoria(dati)
+
+    scrittore = deposito.ScrittoreArchivio(percorso, ARCHIVIO)
+    percorsi = {}
+    try:
+        for dati, (contenuto, messaggi, voci) in risultati():
+            for messaggio in messaggi:
+                print(messaggio)
+            metriche.aggiungi(voci)
+            if contenuto is None:
+                continue
+            with metriche.fase("archiviazione", dati["numero_fattura"]) as voce:
+                nome = os.path.relpath(dati["output_pdf_path"], OUTPUT_DIR)
+                percorsi[dati["numero_fattura"]] = scrittore.aggiungi(nome, contenuto)
+                voce["byte"] = len(contenuto)
+    except BaseException:
+        scrittore.annulla()
+        raise
+
+    if not percorsi:
+        scrittore.annulla()
+        return percorsi
+    scrittore.chiudi()
+    print(f"Archivio salvato: {percorso} ({len(percorsi)} fatture)")
+    return percorsi
+
+# Genera un unico PDF con una fattura per pagina, per la stampa e per l'archivio mensile.
+# Restituisce il numero di fatture rimaste fuori (tutte, se il PDF non è stato compresso).
+def genera_raccolta(fatture, metriche):
+    fatture_valide = []
+    for dati in fatture:
+        if dati["valida"]:
+            fatture_valide.append(dati)
+        else:
+            print(f"Errore nella generazione della fattura n. {dati['numero_fattura']}: dati mancanti o non validi nella riga dell'Excel")
+
+    if not fatture_valide:
+        print("Nessuna fattura da inserire nel PDF unico.")
+        return len(fatture)
+
+    primo = fatture_valide[0]["numero_fattura"]
+    ultimo = fatture_valide[-1]["numero_fattura"]
+    output_pdf_path = os.path.join(OUTPUT_DIR, f"Raccolta fatture n. {primo} - {ultimo}.pdf")
+
+    motore = MotorePDF(PDF_TEMPLATE)
+    profilo = PROFILO_COMPRESSIONE if COMPRESSIONE == "interna" else None
+    with metriche.fase("raccolta") as voce:
+        numero_pagine, errori = motore.salva_raccolta(output_pdf_path, fatture_valide, profilo=profilo)
+        if numero_pagine > 0:
+            voce["byte"] = os.path.getsize(output_pdf_path)
+    for errore in errori:
+        print(errore)
+
+    if numero_pagine == 0:
+        print("Nessuna fattura da inserire nel PDF unico.")
+        return len(fatture)
+    print(f"Generato PDF: {output_pdf_path} ({numero_pagine} fatture)")
+
+    if COMPRESSIONE == "interna":
+        print(f"Compresso PDF: {output_pdf_path}")
+    else:
+        with metriche.fase("compressione") as voce:
+            errore = compress_pdf(output_pdf_path)
+            if not errore:
+                voce["byte"] = os.path.getsize(output_pdf_path)
+        if errore:
+            print(errore)
+            return len(fatture)
+        print(f"Compresso PDF: {output_pdf_path}")
+    return len(fatture) - numero_pagine
+
+# Salva le metriche dell'esecuzione e ne stampa il riepilogo; con il profilo attivo lo
+# salva in PROFILO_FILE e mostra le funzioni che hanno richiesto più tempo
+def concludi_misure(metriche, profiler):
+    if profiler is not None:
+        import pstats
+
+        profiler.disable()
+        profiler.dump_stats(PROFILO_FILE)
+        print(f"\nProfilo della generazione salvato in {PROFILO_FILE} (si apre con python -m pstats). Funzioni più lente:")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+    metriche.salva(METRICHE_FILE)
+    metriche.stampa_riepilogo()
+    print(f"Metriche salvate in {METRICHE_FILE}")
+
+# Prepara le fatture lette dall'Excel e le impronte per il manifest; con solo_modificate
+# restano solo quelle nuove, con i dati cambiati o con il PDF mancante.
+# Restituisce le fatture, il manifest e le impronte.
+def seleziona_fatture(df, solo_modificate, metriche):
+    with metriche.fase("preparazione"):
+        fatture = prepara_fatture(df)
+
+    ambiente = impronta_ambiente()
+    manifest = carica_manifest()
+    impronte = {str(dati["numero_fattura"]): impronta_fattura(dati, ambiente) for dati in fatture}
+
+    if solo_modificate:
+        fatture = [dati for dati in fatture if da_rigenerare(dati, impronte[str(dati["numero_fattura"])], manifest)]
+        print(f"Fatture nuove o modificate da generare: {len(fatture)}")
+    return fatture, manifest, impronte
+
+# Genera i PDF delle fatture (con unico=True un solo PDF con tutte, con ARCHIVIO un archivio
+# con tutte), aggiorna manifest e indice della cartella, salva le metriche e ne stampa il
+# riepilogo. Con profila=True la generazione viene registrata da cProfile; avviene in un
+# solo processo, così il profilo comprende tutto il ciclo. esclusiva serve quando più
+# processi generano nella stessa cartella (vedi registra_generate).
+# Restituisce il numero di fatture non generate.
+def genera(fatture, manifest, impronte, metriche, unico=False, profila=False, esclusiva=None):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    profiler = None
+    if profila:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if unico:
+        non_generate = genera_raccolta(fatture, metriche)
+        concludi_misure(metriche, profiler)
+        return non_generate
+
+    if ARCHIVIO:
+        percorsi = genera_archivio(fatture, metriche, profila)
+        archiviate = [dict(dati, output_pdf_path=percorsi[dati["numero_fattura"]]) for dati in fatture if dati["numero_fattura"] in percorsi]
+        registra_generate(manifest, archiviate, impronte, percorsi.values(), esclusiva)
+        concludi_misure(metriche, profiler)
+        return len(fatture) - len(percorsi)
+
+    crea_cartelle(fatture)
+    pdf_generati = []
+
+    if NUM_PROCESSI > 1 and not profila:
+        # executor.map restituisce i risultati nello stesso ordine delle righe
+        with ProcessPoolExecutor(max_workers=NUM_PROCESSI, initializer=inizializza_processo, initargs=(impostazioni(),)) as executor:
+            for output_pdf_path, messaggi, voci in executor.map(elabora_fattura, fatture):
+                for messaggio in messaggi:
+                    print(messaggio)
+                metriche.aggiungi(voci)
+                if output_pdf_path:
+                    pdf_generati.append(output_pdf_path)
+    else:
+        # Template e font vengono caricati una sola volta per tutta l'elaborazione
+        inizializza_processo()
+        for dati in fatture:
+            output_pdf_path, messaggi, voci = elabora_fattura(dati)
+            for messaggio in messaggi:
+                print(messaggio)
+            metriche.aggiungi(voci)
+            if output_pdf_path:
+                pdf_generati.append(output_pdf_path)
+
+    if COMPRESSIONE == "ghostscript_batch":
+        pdf_generati = comprimi_in_batch(pdf_generati, metriche)
+
+    registra_generate(manifest, fatture, impronte, pdf_generati, esclusiva)
+
+    concludi_misure(metriche, profiler)
+    return len(fatture) - len(pdf_generati)
+
+def main():
+    # Con --profile la generazione viene registrata da cProfile (vedi genera)
+    profila = "--profile" in sys.argv[1:]
+    metriche = Metriche()
+
+    scelta = input("Generare i PDF di tutte le righe, di un intervallo o solo di quelle modificate? (T per tutte, I per intervallo, M per modificate): ").strip().upper()
+
+    if scelta == "T" or scelta == "M":
+        with metriche.fase("caricamento_excel"):
+            df = carica_dati_excel(EXCEL_FILE)
+        righe_da_generare = df.index
+        if not dati_corretti(df, "generata", metriche):
+            return
+    elif scelta == "I":
+        numero_iniziale = int(input("Da quale numero fattura? "))
+        numero_finale = int(input("A quale numero fattura? "))
+        # Vengono lette solo le righe dell'intervallo richiesto
+        with metriche.fase("caricamento_excel"):
+            df = carica_dati_excel(EXCEL_FILE, numero_iniziale, numero_finale)
+        righe_da_generare = df[(df.iloc[:, 8] >= numero_iniziale) & (df.iloc[:, 8] <= numero_finale)].index
+
+        if len(righe_da_generare) == 0:
+            print("Nessuna fattura trovata nell'intervallo specificato.")
+            exit()
+        if not dati_corretti(df.loc[righe_da_generare], "generata", metriche):
+            return
+
+        nome_iniziale = df.loc[righe_da_generare[0], df.columns[0]].strip()
+        nome_finale = df.loc[righe_da_generare[-1], df.columns[0]].strip()
+        conferma = input(f"Generare i PDF dal numero {numero_iniziale} ({nome_iniziale}) fino al numero {numero_finale} ({nome_finale})? (Y/N): ").strip().upper()
+        if conferma != "Y":
+            exit()
+    else:
+        print("Scelta non valida.")
+        exit()
+
+    formato = input("Un PDF per ogni fattura o un unico PDF con tutte le fatture (per stampa e archivio)? (S per singoli, U per unico): ").strip().upper()
+    if formato != "S" and formato != "U":
+        print("Scelta non valida.")
+        exit()
+
+    fatture, manifest, impronte = seleziona_fatture(df.loc[righe_da_generare], scelta == "M", metriche)
+    genera(fatture, manifest, impronte, metriche, unico=formato == "U", profila=profila)
+    print("Processo completato.")
@@ -0,0 +1,195 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Dove vengono salvati i PDF delle fatture. Oltre alla cartella unica di sempre, i PDF
+# possono essere divisi in sottocartelle (per anno, per mese o per blocchi di numeri)
+# oppure scritti uno dopo l'altro in un archivio ZIP o tar.
+# La cartella di output contiene indice_fatture.json (numero fattura -> percorso del PDF,
+# relativo alla cartella), così il Mail Sender trova gli allegati senza leggere le cartelle.
+# Un PDF in un archivio ha come percorso quello dell'archivio seguito dal nome interno,
+# es. "Archivio fatture n. 1 - 500.zip/2025-03/Fatt. n. 12 - Mario Rossi.pdf"; accanto a
+# ogni archivio c'è il suo indice (posizione e dimensione di ogni PDF), per leggerne uno
+# senza scorrere l'archivio.
+
+import io
+import json
+import os
+import re
+import struct
+import tarfile
+import time
+import zipfile
+
+INDICE_FILE = "indice_fatture.json"
+
+# Formati di archivio, senza compressione: i PDF sono già compressi, e solo così ogni
+# PDF resta leggibile direttamente dalla sua posizione nel file
+ESTENSIONI_ARCHIVIO = {"zip": ".zip", "tar": ".tar"}
+
+# Percorso di un PDF dentro un archivio: percorso dell'archivio + "/" + nome interno
+PERCORSO_IN_ARCHIVIO = re.compile(r"^(.*?\.(?:zip|tar))[\\/](.+)$", re.IGNORECASE)
+
+# Modi di dividere i PDF in sottocartelle (vedi SUDDIVISIONE nel compilatore)
+SUDDIVISIONI = ("anno", "mese", "numeri")
+
+# Sottocartella di ogni fattura, calcolata per tutte insieme: "2025" per anno, "2025-03"
+# per mese, "001000-001999" per blocchi di numeri. Stringa vuota senza suddivisione o
+# se la data o il numero mancano.
+def sottocartelle(suddivisione, numeri, date, fatture_per_cartella):
+    import pandas as pd
+
+    if suddivisione is None:
+        return pd.Series("", index=numeri.index)
+    if suddivisione == "anno":
+        return date.dt.strftime("%Y").fillna("")
+    if suddivisione == "mese":
+        return date.dt.strftime("%Y-%m").fillna("")
+    if suddivisione == "numeri":
+        inizio = pd.to_numeric(numeri, errors="coerce") // fatture_per_cartella * fatture_per_cartella
+        cartelle = inizio.astype("Int64").astype("string").str.zfill(6) + "-" + (inizio + fatture_per_cartella - 1).astype("Int64").astype("string").str.zfill(6)
+        return cartelle.fillna("").astype(object)
+    raise ValueError(f"Suddivisione sconosciuta: {suddivisione}")
+
+def carica_indice(cartella):
+    try:
+        with open(os.path.join(cartella, INDICE_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+# Registra nell'indice della cartella i PDF appena salvati ({numero fattura: percorso});
+# per ogni numero conta l'ultimo PDF salvato
+def aggiorna_indice(cartella, percorsi):
+    if not percorsi:
+        return
+    indice = carica_indice(cartella)
+    for numero, percorso in percorsi.items():
+        indice[str(numero)] = os.path.relpath(percorso, cartella)
+
+    indice_file = os.path.join(cartella, INDICE_FILE)
+    temp_output = indice_file + ".tmp"
+    with open(temp_output, "w", encoding="utf-8") as f:
+        json.dump(indice, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(temp_output, indice_file)
+
+# Numero fattura -> percorso del PDF, dall'indice della cartella
+def percorsi_indice(cartella):
+    return {int(numero): os.path.join(cartella, percorso) for numero, percorso in carica_indice(cartella).items()}
+
+def percorso_indice_archivio(archivio):
+    return archivio + ".indice.json"
+
+# Scrive i PDF in un archivio man mano che sono pronti, senza tenerli in memoria. L'archivio
+# viene scritto su un file temporaneo e prende il suo nome solo alla chiusura, insieme al
+# suo indice, così un'esecuzione interrotta non lascia un archivio a metà.
+class ScrittoreArchivio:
+    def __init__(self, percorso, formato):
+        self.percorso = percorso
+        self.formato = formato
+        self.posizioni = {}
+        self.file = open(percorso + ".tmp", "wb")
+        if formato == "zip":
+            self.archivio = zipfile.ZipFile(self.file, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        elif formato == "tar":
+            self.archivio = tarfile.open(fileobj=self.file, mode="w", format=tarfile.PAX_FORMAT)
+        else:
+            self.file.close()
+            os.remove(percorso + ".tmp")
+            raise ValueError(f"Formato di archivio sconosciuto: {formato}")
+
+    # Aggiunge un PDF e restituisce il suo percorso dentro l'archivio
+    def aggiungi(self, nome, contenuto):
+        nome = nome.replace(os.sep, "/")
+        if self.formato == "zip":
+            self.archivio.writestr(zipfile.ZipInfo(nome, date_time=time.localtime()[:6]), contenuto)
+            inizio = self.file.tell() - len(contenuto)
+        else:
+            voce = tarfile.TarInfo(nome)
+            voce.size = len(contenuto)
+            voce.mtime = time.time()
+            self.archivio.addfile(voce, io.BytesIO(contenuto))
+            # I dati di ogni voce tar sono completati con zeri fino a un multiplo di 512 byte
+            inizio = self.file.tell() - -(-len(contenuto) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        self.posizioni[nome] = [inizio, len(contenuto)]
+        return os.path.join(self.percorso, nome)
+
+    def chiudi(self):
+        self.archivio.close()
+        self.file.close()
+        indice_file = percorso_indice_archivio(self.percorso)
+        with open(indice_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.posizioni, f, ensure_ascii=False, indent=0)
+        os.replace(self.percorso + ".tmp", self.percorso)
+        os.replace(indice_file + ".tmp", indice_file)
+
+    # Elimina l'archivio non completato
+    def annulla(self):
+        self.archivio.close()
+        self.file.close()
+        os.remove(self.percorso + ".tmp")
+
+# Indici degli archivi già letti, con la data di modifica dell'archivio
+indici_archivi = {}
+
+# Posizione e dimensione dei PDF di un archivio: dal suo indice, oppure (se manca)
+# leggendo l'elenco dei file dell'archivio
+def posizioni_archivio(archivio):
+    modifica = os.stat(archivio).st_mtime_ns
+    memorizzato = indici_archivi.get(archivio)
+    if memorizzato is not None and memorizzato[0] == modifica:
+        return memorizzato[1]
+
+    try:
+        with open(percorso_indice_archivio(archivio), encoding="utf-8") as f:
+            posizioni = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        posizioni = {}
+        if archivio.lower().endswith(".zip"):
+            # I dati iniziano dopo l'intestazione locale: 30 byte, il nome e il campo extra
+            with open(archivio, "rb") as f, zipfile.ZipFile(f) as zf:
+                for voce in zf.infolist():
+                    f.seek(voce.header_offset + 26)
+                    lunghezza_nome, lunghezza_extra = struct.unpack("<HH", f.read(4))
+                    posizioni[voce.filename] = [voce.header_offset + 30 + lunghezza_nome + lunghezza_extra, voce.compress_size]
+        else:
+            with tarfile.open(archivio) as tf:
+                for voce in tf:
+                    posizioni[voce.name] = [voce.offset_data, voce.size]
+    indici_archivi[archivio] = (modifica, posizioni)
+    return posizioni
+
+# Archivio e nome interno di un percorso dentro un archivio (None se è un file normale)
+def dividi_percorso(percorso):
+    if os.path.isfile(percorso):
+        return None
+    corrispondenza = PERCORSO_IN_ARCHIVIO.match(percorso)
+    if corrispondenza is None or not os.path.isfile(corrispondenza.group(1)):
+        return None
+    return corrispondenza.group(1), corrispondenza.group(2).replace("\\", "/")
+
+# True se il PDF esiste, come file o dentro un archivio
+def esiste(percorso):
+    if os.path.isfile(percorso):
+        return True
+    parti = dividi_percorso(percorso)
+    return parti is not None and parti[1] in posizioni_archivio(parti[0])
+
+# Byte di un PDF dentro un archivio, letti direttamente dalla sua posizione
+def leggi_pdf(percorso):
+    parti = dividi_percorso(percorso)
+    if parti is None:
+        with open(percorso, "rb") as f:
+            return f.read()
+
+    archivio, nome = parti
+    posizione = posizioni_archivio(archivio).get(nome)
+    if posizione is None:
+        raise FileNotFoundError(f"{nome} non è nell'archivio {archivio}")
+    inizio, dimensione = posizione
+    with open(archivio, "rb") as f:
+        f.seek(inizio)
+        return f.read(dimensione)
+
+# Allegato di una mail: il percorso stesso per un file normale (letto a blocchi durante
+# la codifica), i byte del PDF per un PDF dentro un archivio
+def allegato(percorso):
+    return percorso if dividi_percorso(percorso) is None else leggi_pdf(percorso)
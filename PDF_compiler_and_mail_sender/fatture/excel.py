@@ -0,0 +1,130 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Lettura di dati_fattura, comune al PDF Compiler e al Mail Sender.
+# pandas e numpy vengono importati solo dalle funzioni che restituiscono un DataFrame:
+# le verifiche dell'intervallo e le simulazioni leggono le righe con il solo openpyxl.
+
+import os
+import hashlib
+import json
+
+# Colonna del numero fattura (la nona, "NUMERO FATTURA")
+COLONNA_NUMERO = 8
+
+# Converte il valore di una cella come fa pd.read_excel (i numeri interi restano interi)
+def converti_cella(valore):
+    if isinstance(valore, float) and valore.is_integer():
+        return int(valore)
+    return valore
+
+# Legge l'Excel in streaming e in sola lettura, con la stessa intestazione di
+# pd.read_excel(..., skiprows=2). Restituisce i nomi delle colonne e le righe come liste.
+def leggi_righe_excel(excel_file):
+    import openpyxl
+
+    wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        righe = wb.worksheets[0].iter_rows(min_row=3, values_only=True)
+        intestazione = next(righe, ())
+        colonne = [str(v) if v is not None else f"Unnamed: {i}" for i, v in enumerate(intestazione)]
+
+        dati = []
+        for riga in righe:
+            if all(v is None for v in riga):
+                continue
+            dati.append([converti_cella(v) for v in riga])
+    finally:
+        wb.close()
+
+    return colonne, dati
+
+# Come leggi_righe_excel, ma restituisce un DataFrame
+def leggi_excel_streaming(excel_file):
+    import pandas as pd
+
+    colonne, dati = leggi_righe_excel(excel_file)
+    return pd.DataFrame(dati, columns=colonne)
+
+# Copia colonnare (Feather) dell'Excel e relative informazioni, accanto al file originale
+def percorsi_cache_excel(excel_file):
+    return excel_file + ".cache.feather", excel_file + ".cache.json"
+
+def impronta_file(percorso):
+    h = hashlib.sha256()
+    with open(percorso, "rb") as f:
+        for blocco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(blocco)
+    return h.hexdigest()
+
+# Restituisce la copia in cache dell'Excel se il file non è cambiato (stessa data di
+# modifica e dimensione, oppure stesso contenuto), altrimenti None
+def leggi_cache_excel(excel_file):
+    import pandas as pd
+
+    cache_file, info_file = percorsi_cache_excel(excel_file)
+    try:
+        with open(info_file, encoding="utf-8") as f:
+            info = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    stato = os.stat(excel_file)
+    if info.get("mtime_ns") != stato.st_mtime_ns or info.get("dimensione") != stato.st_size:
+        if info.get("sha256") != impronta_file(excel_file):
+            return None
+        # Il file è stato solo toccato: il contenuto è lo stesso, la cache resta valida
+        info["mtime_ns"] = stato.st_mtime_ns
+        info["dimensione"] = stato.st_size
+        with open(info_file, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+
+    try:
+        return pd.read_feather(cache_file)
+    except Exception:
+        return None
+
+def scrivi_cache_excel(excel_file, df):
+    cache_file, info_file = percorsi_cache_excel(excel_file)
+    stato = os.stat(excel_file)
+    try:
+        df.to_feather(cache_file)
+    except Exception:
+        # pyarrow non installato o colonne non convertibili: si continua senza cache
+        return
+
+    info = {"mtime_ns": stato.st_mtime_ns, "dimensione": stato.st_size, "sha256": impronta_file(excel_file)}
+    with open(info_file, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+
+# Carica i dati delle fatture: dalla copia in cache se l'Excel non è cambiato, altrimenti
+# leggendo tutto l'Excel in streaming e aggiornando la cache. Con un intervallo vengono
+# restituite solo le sue righe, ovunque siano nel foglio.
+def carica_dati_excel(excel_file, numero_iniziale=None, numero_finale=None):
+    import pandas as pd
+
+    df = leggi_cache_excel(excel_file)
+    if df is None:
+        df = leggi_excel_streaming(excel_file)
+        scrivi_cache_excel(excel_file, df)
+
+    if numero_iniziale is None:
+        return df
+    numeri = pd.to_numeric(df.iloc[:, COLONNA_NUMERO], errors="coerce")
+    return df[(numeri >= numero_iniziale) & (numeri <= numero_finale)].reset_index(drop=True)
+
+# Indice ordinato dei numeri fattura: i numeri in ordine crescente e la posizione della
+# riga corrispondente nel DataFrame, per trovare un intervallo con una ricerca binaria
+def indice_numeri_fattura(df):
+    import numpy as np
+    import pandas as pd
+
+    numeri = pd.to_numeric(df.iloc[:, COLONNA_NUMERO], errors="coerce").to_numpy(dtype=float)
+    righe = np.flatnonzero(~np.isnan(numeri))
+    ordine = np.argsort(numeri[righe], kind="stable")
+    return numeri[righe][ordine], righe[ordine]
+
+# Posizioni nell'indice della prima e dopo l'ultima fattura dell'intervallo
+def intervallo_fatture(numeri, numero_iniziale, numero_finale):
+    import numpy as np
+
+    return np.searchsorted(numeri, numero_iniziale, side="left"), np.searchsorted(numeri, numero_finale, side="right")
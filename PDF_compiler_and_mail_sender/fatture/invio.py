@@ -0,0 +1,724 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Invio delle fatture per email. yagmail viene importato solo all'apertura delle sessioni
+# SMTP e pandas solo alla lettura dell'Excel, così la coda di invio si consulta subito.
+
+import os
+import json
+import queue
+import smtplib
+import time
+import asyncio
+import sqlite3
+import re
+import sys
+import base64
+import quopri
+import string
+import uuid
+from datetime import datetime
+from email.header import Header
+from email.utils import make_msgid, formatdate, quote as proteggi_virgolette
+from urllib.parse import quote
+
+from . import deposito
+from .excel import carica_dati_excel, indice_numeri_fattura, intervallo_fatture
+from .metriche import Metriche
+from .validazione import PATTERN_EMAIL, dati_corretti
+
+# Cartella del programma, con l'Excel, le fatture e i file della coda e dei limiti di invio;
+# ogni computer la imposta con configura() (vedi impostazioni.py nelle cartelle dei programmi)
+BASE_DIR = "."
+FATTURE_DIR = os.path.join(BASE_DIR, "Fatture")
+EXCEL_FILE = os.path.join(BASE_DIR, "dati_fattura.xlsm")
+
+# Indirizzo da cui partono le mail; la password è nella variabile d'ambiente GMAIL_PASSWORD
+MITTENTE = "email@gmail.com"  # Inserire la propria email.
+
+# Numero di sessioni SMTP aperte insieme, cioè di mail in invio contemporaneamente
+# (1 = una sola sessione riusata per tutte le mail).
+# Gmail limita le connessioni contemporanee per account: meglio non superare 3-4.
+NUM_SESSIONI_SMTP = 3
+
+# Limiti di invio del fornitore di posta (Gmail: circa 500 mail al giorno per un account normale,
+# 2000 per Google Workspace). Il limite giornaliero vale anche tra un'esecuzione e l'altra.
+MAIL_AL_MINUTO = 20
+MAIL_AL_GIORNO = 500
+STATO_LIMITI_FILE = os.path.join(BASE_DIR, "limiti_invio.json")
+
+# Coda di invio (SQLite): per ogni numero fattura lo stato della mail (in coda, in invio,
+# inviata, fallita) con le date, così un intervallo interrotto si riprende senza duplicati
+OUTBOX_FILE = os.path.join(BASE_DIR, "outbox_fatture.sqlite")
+
+# Metriche di ogni invio (tempo reale, tempo di CPU e byte per fase e per fattura),
+# aggiunte in fondo al file con una riga JSON per misura
+METRICHE_FILE = os.path.join(BASE_DIR, "metriche_invio.jsonl")
+
+# Tentativi per una mail in caso di errori temporanei (connessione, codici SMTP 4xx);
+# l'attesa tra un tentativo e l'altro raddoppia ogni volta
+TENTATIVI_MASSIMI = 5
+ATTESA_PRIMO_TENTATIVO = 2
+
+# Server SMTP di prova, es. "localhost:8025" con python -m aiosmtpd -n -l localhost:8025,
+# per misurare la velocità di invio senza spedire mail vere (niente TLS né login).
+# None = Gmail.
+SERVER_PROVA_SMTP = None
+
+# Secondi di inattività dopo i quali, prima di inviare, si controlla che il server non abbia chiuso la connessione
+INATTIVITA_MASSIMA_SMTP = 60
+
+# Oggetto e corpo delle mail; {nome_cliente} viene sostituito con il nome del cliente
+OGGETTO_MAIL = "Fattura"
+CORPO_HTML = """<!DOCTYPE html><html lang="it"><head><meta charset="UTF-8"><title>Anteprima Email</title></head><body style="margin:0;padding:0;font-family:Arial,sans-serif;font-size:12pt;color:#333;line-height:1.2;">Gentile {nome_cliente},<br><br>in allegato la sua fattura.<br>Cordiali saluti,<br><br>Il team XXX.<br><br>---<br><br><p style="font-size:10px;color:#666;line-height:1.5;margin:0;padding:0;">Le informazioni, i dati e le notizie contenute nella presente comunicazione e i relativi allegati sono di natura privata e come tali possono essere riservate e sono, comunque, destinate esclusivamente ai destinatari indicati in epigrafe.<br>La diffusione, distribuzione e/o la copiatura del documento trasmesso da parte di qualsiasi soggetto diverso dal destinatario è proibita, sia ai sensi dell’art. 616 c.p., sia ai sensi del Regolamento (UE) 2016/679 e del Decreto legislativo 10 agosto 2018, n. 101. Se avete ricevuto questo messaggio per errore, vi preghiamo di distruggerlo e di darcene immediata comunicazione anche inviando un messaggio di ritorno all’indirizzo e-mail del mittente.<br><br><em>Pensa all'ambiente, stampa questa mail solo se necessario.<br><br><br></em></p></body></html>"""
+
+# Byte del PDF codificati alla volta: multiplo di 57, così ogni blocco diventa righe base64 complete
+BLOCCO_ALLEGATO = 57 * 1024
+
+# Nome dei PDF prodotti dal compilatore: "Fatt. n. <numero> - <nome cliente>.pdf"
+NOME_PDF_FATTURA = re.compile(r"^Fatt\. n\. (\d+) - .*\.pdf$", re.IGNORECASE)
+
+# Impostazioni che si possono cambiare con configura()
+IMPOSTAZIONI = (
+    "BASE_DIR", "FATTURE_DIR", "EXCEL_FILE", "MITTENTE", "NUM_SESSIONI_SMTP", "MAIL_AL_MINUTO", "MAIL_AL_GIORNO",
+    "STATO_LIMITI_FILE", "OUTBOX_FILE", "METRICHE_FILE", "TENTATIVI_MASSIMI", "ATTESA_PRIMO_TENTATIVO",
+    "SERVER_PROVA_SMTP", "INATTIVITA_MASSIMA_SMTP", "OGGETTO_MAIL", "CORPO_HTML"
+)
+
+# Cambia le impostazioni del modulo, es. configura(BASE_DIR=..., NUM_SESSIONI_SMTP=1).
+# Fatture, Excel, coda, limiti e metriche seguono BASE_DIR, se non indicati a parte.
+def configura(**valori):
+    for nome in valori:
+        if nome not in IMPOSTAZIONI:
+            raise ValueError(f"Impostazione sconosciuta: {nome}")
+
+    if "BASE_DIR" in valori:
+        valori.setdefault("FATTURE_DIR", os.path.join(valori["BASE_DIR"], "Fatture"))
+        valori.setdefault("EXCEL_FILE", os.path.join(valori["BASE_DIR"], "dati_fattura.xlsm"))
+        valori.setdefault("STATO_LIMITI_FILE", os.path.join(valori["BASE_DIR"], "limiti_invio.json"))
+        valori.setdefault("OUTBOX_FILE", os.path.join(valori["BASE_DIR"], "outbox_fatture.sqlite"))
+        valori.setdefault("METRICHE_FILE", os.path.join(valori["BASE_DIR"], "metriche_invio.jsonl"))
+    globals().update(valori)
+
+def normalizza_stringa(stringa):
+    return ' '.join(stringa.split())
+
+def formatta_nome(nome):
+    return ' '.join(parola.capitalize() for parola in nome.split())
+
+# Numero fattura -> percorso del PDF. I PDF vengono cercati prima nell'indice della
+# cartella scritto dal PDF Compiler (anche in sottocartelle o archivi), senza leggere le
+# cartelle; con i numeri indicati, la cartella viene letta (una sola volta) solo se
+# qualcuno manca dall'indice.
+# Nella cartella conta solo il numero, quindi maiuscole o spazi diversi nel nome del cliente
+# non impediscono di trovare l'allegato; se per lo stesso numero ci sono più PDF si usa il
+# più recente.
+def indice_pdf_fatture(cartella, numeri=None):
+    indice = deposito.percorsi_indice(cartella)
+    if numeri is not None:
+        indice = {numero: indice[numero] for numero in numeri if numero in indice and deposito.esiste(indice[numero])}
+        if len(indice) == len(set(numeri)):
+            return indice
+    dall_indice = set(indice)
+
+    # PDF salvati prima dell'indice, direttamente nella cartella
+    try:
+        voci = os.scandir(cartella)
+    except FileNotFoundError:
+        return indice
+
+    with voci:
+        for voce in voci:
+            corrispondenza = NOME_PDF_FATTURA.match(voce.name)
+            if corrispondenza is None or not voce.is_file():
+                continue
+            numero = int(corrispondenza.group(1))
+            if numero in dall_indice or (numero in indice and os.path.getmtime(indice[numero]) >= voce.stat().st_mtime):
+                continue
+            indice[numero] = voce.path
+    return indice
+
+# Sessione SMTP autenticata che resta aperta per tutto l'invio: connessione, TLS e login
+# si fanno una volta sola e si rifanno solo se il server chiude la connessione.
+# yagmail gestisce connessione e login, il messaggio arriva già pronto dalla FabbricaMessaggi.
+class SessioneSMTP:
+    def __init__(self, utente, password):
+        import yagmail
+
+        if SERVER_PROVA_SMTP:
+            host, porta = SERVER_PROVA_SMTP.rsplit(":", 1)
+            self.yag = yagmail.SMTP(utente, password, host=host, port=int(porta), smtp_ssl=False, smtp_starttls=False, smtp_skip_login=True)
+        else:
+            self.yag = yagmail.SMTP(utente, password)
+        self.yag.login()
+        self.ultimo_uso = time.monotonic()
+
+    def riconnetti(self):
+        self.yag.close()
+        self.yag.login()
+
+    def connessione_attiva(self):
+        try:
+            return self.yag.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def invia(self, destinatario, messaggio):
+        # Dopo una lunga pausa il server potrebbe aver chiuso la connessione senza avvisare
+        if time.monotonic() - self.ultimo_uso > INATTIVITA_MASSIMA_SMTP and not self.connessione_attiva():
+            self.riconnetti()
+
+        destinatari = [destinatario]
+        try:
+            self.yag.smtp.sendmail(self.yag.user, destinatari, messaggio)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, smtplib.SMTPResponseException) as e:
+            # 421: il server sta chiudendo la connessione; gli altri codici sono errori veri
+            if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code != 421:
+                raise
+            self.riconnetti()
+            self.yag.smtp.sendmail(self.yag.user, destinatari, messaggio)
+        self.ultimo_uso = time.monotonic()
+
+    def chiudi(self):
+        self.yag.close()
+
+# Piccolo insieme di sessioni SMTP già autenticate: ogni invio prende una sessione
+# libera e la restituisce al termine, così più mail possono partire insieme
+class PoolSessioniSMTP:
+    def __init__(self, utente, password, numero_sessioni=None):
+        self.utente = utente
+        self.numero_sessioni = max(1, numero_sessioni or NUM_SESSIONI_SMTP)
+        self.sessioni = queue.Queue()
+        try:
+            for _ in range(self.numero_sessioni):
+                self.sessioni.put(SessioneSMTP(utente, password))
+        except Exception:
+            self.chiudi()
+            raise
+
+    def invia(self, destinatario, messaggio):
+        sessione = self.sessioni.get()
+        try:
+            sessione.invia(destinatario, messaggio)
+        finally:
+            self.sessioni.put(sessione)
+
+    def chiudi(self):
+        while not self.sessioni.empty():
+            self.sessioni.get().chiudi()
+
+# Quoted-printable con fine riga CRLF, come richiesto da SMTP
+def codifica_qp(testo):
+    return quopri.encodestring(testo.encode("utf-8")).replace(b"\n", b"\r\n")
+
+# Codifica base64 del PDF un blocco alla volta, da file o da byte già in memoria
+def codifica_allegato(allegato):
+    if isinstance(allegato, (bytes, bytearray, memoryview)):
+        dati = memoryview(allegato)
+        for inizio in range(0, len(dati), BLOCCO_ALLEGATO):
+            yield base64.encodebytes(dati[inizio:inizio + BLOCCO_ALLEGATO]).replace(b"\n", b"\r\n")
+    else:
+        with open(allegato, "rb") as f:
+            for blocco in iter(lambda: f.read(BLOCCO_ALLEGATO), b""):
+                yield base64.encodebytes(blocco).replace(b"\n", b"\r\n")
+
+# Compone le mail delle fatture direttamente in byte MIME. Intestazioni fisse, parti del
+# corpo che non cambiano e confini MIME vengono codificati una volta sola; per ogni mail
+# si codificano solo destinatario, nome del cliente e allegato. Il corpo è in
+# quoted-printable: una riga spezzata con "=" alla fine non cambia il testo, quindi le
+# parti fisse già codificate si possono unire a quella variabile senza ricodificarle.
+class FabbricaMessaggi:
+    def __init__(self, mittente, oggetto=None, corpo_html=None):
+        oggetto = oggetto or OGGETTO_MAIL
+        corpo_html = corpo_html or CORPO_HTML
+        self.confine = f"==fattura_{uuid.uuid4().hex}"
+        oggetto = oggetto if oggetto.isascii() else Header(oggetto, "utf-8").encode()
+
+        self.intestazione = (
+            f"From: {mittente}\r\n"
+            f"Subject: {oggetto}\r\n"
+            "MIME-Version: 1.0\r\n"
+            f"Content-Type: multipart/mixed; boundary=\"{self.confine}\"\r\n"
+        ).encode("ascii")
+        self.inizio_corpo = (
+            f"\r\n--{self.confine}\r\n"
+            "Content-Type: text/html; charset=\"utf-8\"\r\n"
+            "Content-Transfer-Encoding: quoted-printable\r\n\r\n"
+        ).encode("ascii")
+        self.fine = f"--{self.confine}--\r\n".encode("ascii")
+
+        # Il corpo diviso in parti fisse già codificate e nomi dei valori da inserire
+        self.parti_corpo = []
+        for letterale, nome_valore, _, _ in string.Formatter().parse(corpo_html):
+            if letterale:
+                self.parti_corpo.append(codifica_qp(letterale))
+            if nome_valore is not None:
+                self.parti_corpo.append(nome_valore)
+
+    def corpo(self, valori):
+        parti = [parte if isinstance(parte, bytes) else codifica_qp(str(valori[parte])) for parte in self.parti_corpo]
+        return b"=\r\n".join(parti)
+
+    # Mail completa in byte. L'allegato può essere il percorso del PDF oppure il PDF già in
+    # memoria (in quel caso serve nome_file); corpo_html sostituisce il modello se indicato.
+    # Il destinatario finisce nell'intestazione To: spazi, a capo o caratteri di controllo
+    # (anche da una coda modificata a mano) aggiungerebbero intestazioni alla mail.
+    def messaggio(self, destinatario, allegato, nome_file=None, message_id=None, corpo_html=None, **valori):
+        destinatario = str(destinatario or "")
+        if not destinatario.isascii() or not destinatario.isprintable() or not PATTERN_EMAIL.fullmatch(destinatario):
+            raise ValueError(f"Indirizzo email non valido: {destinatario}")
+        if nome_file is None:
+            nome_file = os.path.basename(allegato)
+        # Virgolette e barre rovesciate nel nome vengono protette; un nome non ASCII o con
+        # caratteri di controllo viene codificato come da RFC 2231
+        if nome_file.isascii() and nome_file.isprintable():
+            disposizione = f"attachment; filename=\"{proteggi_virgolette(nome_file)}\""
+        else:
+            disposizione = f"attachment; filename*=utf-8''{quote(nome_file)}"
+
+        intestazione_mail = (
+            f"To: {destinatario}\r\n"
+            f"Date: {formatdate(localtime=True)}\r\n"
+            f"Message-ID: {message_id or make_msgid()}\r\n"
+        ).encode("ascii")
+        intestazione_allegato = (
+            f"\r\n--{self.confine}\r\n"
+            "Content-Type: application/pdf\r\n"
+            "Content-Transfer-Encoding: base64\r\n"
+            f"Content-Disposition: {disposizione}\r\n\r\n"
+        ).encode("ascii")
+
+        corpo = codifica_qp(corpo_html) if corpo_html is not None else self.corpo(valori)
+        return b"".join([self.intestazione, intestazione_mail, self.inizio_corpo, corpo, intestazione_allegato, *codifica_allegato(allegato), self.fine])
+
+# Apre le sessioni SMTP usate per tutto l'invio; restituisce None se non è possibile
+def apri_sessioni_smtp():
+    gmail_password = os.getenv("GMAIL_PASSWORD") #GMAIL_PASSWORD sarebbe la variabile d'ambiente impostata sul proprio computer come password del proprio account Gmail con il quale si vuole inviare la mail (questo è stato fatto per rendere più sicuro il processo).
+
+    if not gmail_password and not SERVER_PROVA_SMTP:
+        print("Errore: la variabile d'ambiente GMAIL_PASSWORD non è impostata correttamente.")
+        return None
+
+    try:
+        return PoolSessioniSMTP(MITTENTE, gmail_password)
+    except Exception as e:
+        print(f"Errore nella connessione al server di posta: {e}")
+        return None
+
+# Errori che possono sparire riprovando: connessione persa o codici SMTP 4xx (non un PDF mancante)
+def errore_temporaneo(e):
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(400 <= codice < 500 for codice, _ in e.recipients.values())
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 400 <= e.smtp_code < 500
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(e, (smtplib.SMTPException, FileNotFoundError)):
+        return False
+    return isinstance(e, OSError)
+
+# Compone e invia una mail con le sessioni già aperte. Restituisce lo stato ("inviata",
+# "temporaneo" se conviene riprovare, "fallita") e il messaggio da stampare.
+# Con pdf (byte già in memoria) l'allegato non viene letto da allegato_path, che dà solo il nome del file.
+# Composizione e invio vengono registrati in metriche, se indicate.
+def invia_email(sessioni, fabbrica, destinatario, nome_cliente, allegato_path, message_id=None, corpo_html=None, pdf=None, metriche=None, numero_fattura=None):
+    metriche = metriche if metriche is not None else Metriche("mail_sender")
+    try:
+        # Un PDF dentro un archivio viene letto dalla sua posizione; un file resta un percorso
+        allegato = deposito.allegato(allegato_path) if pdf is None else pdf
+        with metriche.fase("composizione", numero_fattura) as voce:
+            messaggio = fabbrica.messaggio(destinatario, allegato, nome_file=os.path.basename(allegato_path), message_id=message_id, corpo_html=corpo_html, nome_cliente=nome_cliente)
+            voce["byte"] = len(messaggio)
+        with metriche.fase("invio", numero_fattura) as voce:
+            sessioni.invia(destinatario, messaggio)
+            voce["byte"] = len(messaggio)
+        return "inviata", f"Email inviata con successo a {destinatario}"
+    except ValueError as e:
+        return "fallita", f"Errore nell'indirizzo email: {e}"
+    except smtplib.SMTPAuthenticationError as e:
+        return "fallita", f"Errore di autenticazione: {e}"
+    except Exception as e:
+        return ("temporaneo" if errore_temporaneo(e) else "fallita"), f"Errore nell'invio dell'email: {e}"
+
+# Coda di invio persistente su SQLite, una riga per numero fattura. Una fattura già
+# inviata non viene più rimessa in coda; le altre conservano il proprio Message-ID, così
+# anche una mail ripetuta dopo un'interruzione viene riconosciuta come la stessa dal server.
+class CodaInvii:
+    def __init__(self, percorso=None):
+        self.connessione = sqlite3.connect(percorso or OUTBOX_FILE)
+        self.connessione.row_factory = sqlite3.Row
+        self.connessione.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                numero_fattura INTEGER PRIMARY KEY,
+                destinatario TEXT,
+                nome_cliente TEXT,
+                allegato_path TEXT,
+                message_id TEXT,
+                stato TEXT NOT NULL,
+                tentativi INTEGER NOT NULL DEFAULT 0,
+                ultimo_errore TEXT,
+                accodata TEXT,
+                aggiornata TEXT,
+                inviata TEXT
+            )""")
+        # Le code create prima della FabbricaMessaggi salvavano il corpo già composto (corpo_html)
+        colonne = {riga["name"] for riga in self.connessione.execute("PRAGMA table_info(outbox)")}
+        if "nome_cliente" not in colonne:
+            self.connessione.execute("ALTER TABLE outbox ADD COLUMN nome_cliente TEXT")
+        self.connessione.commit()
+
+    # Mette in coda le mail; restituisce le mail da inviare e i numeri di quelle già inviate in passato
+    def accoda(self, invii):
+        adesso = datetime.now().isoformat(timespec="seconds")
+        gia_inviate = []
+        with self.connessione:
+            for invio in invii:
+                riga = self.connessione.execute("SELECT stato FROM outbox WHERE numero_fattura = ?", (invio["numero_fattura"],)).fetchone()
+                if riga is not None and riga["stato"] == "inviata":
+                    gia_inviate.append(invio["numero_fattura"])
+                    continue
+                if riga is None:
+                    self.connessione.execute(
+                        "INSERT INTO outbox (numero_fattura, destinatario, nome_cliente, allegato_path, message_id, stato, accodata, aggiornata) "
+                        "VALUES (?, ?, ?, ?, ?, 'in_coda', ?, ?)",
+                        (invio["numero_fattura"], invio["destinatario"], invio["nome_cliente"], invio["allegato_path"],
+                         make_msgid(f"fattura{invio['numero_fattura']}"), adesso, adesso))
+                else:
+                    self.connessione.execute(
+                        "UPDATE outbox SET destinatario = ?, nome_cliente = ?, allegato_path = ?, stato = 'in_coda', aggiornata = ? WHERE numero_fattura = ?",
+                        (invio["destinatario"], invio["nome_cliente"], invio["allegato_path"], adesso, invio["numero_fattura"]))
+
+        numeri = [invio["numero_fattura"] for invio in invii if invio["numero_fattura"] not in set(gia_inviate)]
+        return self.invii(numeri), gia_inviate
+
+    # Le mail indicate (o tutte quelle non ancora inviate), in ordine di numero fattura
+    def invii(self, numeri=None):
+        if numeri is None:
+            righe = self.connessione.execute("SELECT * FROM outbox WHERE stato != 'inviata' ORDER BY numero_fattura").fetchall()
+        else:
+            righe = [self.connessione.execute("SELECT * FROM outbox WHERE numero_fattura = ?", (numero,)).fetchone() for numero in sorted(numeri)]
+        return [dict(riga) for riga in righe]
+
+    def segna(self, numero_fattura, stato, errore=None):
+        adesso = datetime.now().isoformat(timespec="seconds")
+        with self.connessione:
+            if stato == "in_invio":
+                self.connessione.execute("UPDATE outbox SET stato = ?, tentativi = tentativi + 1, aggiornata = ? WHERE numero_fattura = ?", (stato, adesso, numero_fattura))
+            elif stato == "inviata":
+                self.connessione.execute("UPDATE outbox SET stato = ?, ultimo_errore = NULL, aggiornata = ?, inviata = ? WHERE numero_fattura = ?", (stato, adesso, adesso, numero_fattura))
+            else:
+                self.connessione.execute("UPDATE outbox SET stato = ?, ultimo_errore = ?, aggiornata = ? WHERE numero_fattura = ?", (stato, errore, adesso, numero_fattura))
+
+    def chiudi(self):
+        self.connessione.close()
+
+# Stato di ogni fattura nella coda di invio, letto senza modificare né creare il file
+# (per le simulazioni): numero fattura -> stato
+def stati_coda_invii(percorso=None):
+    percorso = percorso or OUTBOX_FILE
+    if not os.path.exists(percorso):
+        return {}
+    connessione = sqlite3.connect(f"file:{quote(os.path.abspath(percorso))}?mode=ro", uri=True)
+    try:
+        return dict(connessione.execute("SELECT numero_fattura, stato FROM outbox"))
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        connessione.close()
+
+# Secchio di gettoni: contiene al massimo "capacita" gettoni e ne recupera uno ogni
+# periodo/capacita secondi; ogni mail inviata consuma un gettone
+class SecchioGettoni:
+    def __init__(self, capacita, periodo, gettoni=None, aggiornato=None):
+        self.capacita = capacita
+        self.ricarica_al_secondo = capacita / periodo
+        self.gettoni = capacita if gettoni is None else min(gettoni, capacita)
+        self.aggiornato = time.time() if aggiornato is None else aggiornato
+
+    def ricarica(self, adesso):
+        trascorso = max(0, adesso - self.aggiornato)
+        self.gettoni = min(self.capacita, self.gettoni + trascorso * self.ricarica_al_secondo)
+        self.aggiornato = adesso
+
+    # Secondi da aspettare prima di avere un gettone (0 se ce n'è già uno)
+    def attesa(self, adesso):
+        self.ricarica(adesso)
+        if self.gettoni >= 1:
+            return 0
+        return (1 - self.gettoni) / self.ricarica_al_secondo
+
+    def preleva(self):
+        self.gettoni -= 1
+
+# Limiti al minuto e al giorno. Se manca solo il gettone del minuto si aspetta; se è
+# finito il limite giornaliero la mail va rimandata. Il secchio giornaliero viene salvato
+# su file, così il limite vale anche tra esecuzioni diverse.
+class LimitatoreInvii:
+    def __init__(self, mail_al_minuto=None, mail_al_giorno=None, stato_file=None):
+        mail_al_minuto = mail_al_minuto or MAIL_AL_MINUTO
+        mail_al_giorno = mail_al_giorno or MAIL_AL_GIORNO
+        stato_file = stato_file or STATO_LIMITI_FILE
+        self.stato_file = stato_file
+        try:
+            with open(stato_file, encoding="utf-8") as f:
+                stato = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            stato = {}
+
+        self.minuto = SecchioGettoni(mail_al_minuto, 60)
+        self.giorno = SecchioGettoni(mail_al_giorno, 24 * 60 * 60, stato.get("gettoni"), stato.get("aggiornato"))
+        # Il lock viene creato dentro il ciclo di eventi che lo usa: su Python 3.9 un
+        # asyncio.Lock creato prima (o in un altro asyncio.run) resta legato a un altro ciclo
+        self.lock = None
+        self.loop_lock = None
+        # Diventa True alla prima mail rimandata per il limite giornaliero
+        self.limite_raggiunto = False
+
+    # True quando la mail può partire, False se va rimandata per il limite giornaliero
+    async def acquisisci(self):
+        loop = asyncio.get_running_loop()
+        if self.loop_lock is not loop:
+            self.lock = asyncio.Lock()
+            self.loop_lock = loop
+        async with self.lock:
+            while True:
+                adesso = time.time()
+                if self.giorno.attesa(adesso) > 0:
+                    self.limite_raggiunto = True
+                    return False
+                attesa = self.minuto.attesa(adesso)
+                if attesa == 0:
+                    self.minuto.preleva()
+                    self.giorno.preleva()
+                    return True
+                await asyncio.sleep(attesa)
+
+    # Momento in cui il limite giornaliero permetterà di inviare di nuovo
+    def prossimo_invio(self):
+        adesso = time.time()
+        return datetime.fromtimestamp(adesso + self.giorno.attesa(adesso))
+
+    def salva(self):
+        with open(self.stato_file, "w", encoding="utf-8") as f:
+            json.dump({"gettoni": self.giorno.gettoni, "aggiornato": self.giorno.aggiornato}, f)
+
+# Invia le mail con più invii in corso contemporaneamente (uno per sessione SMTP),
+# rispettando i limiti e registrando ogni passaggio nella coda di invio. Gli errori
+# temporanei vengono ritentati con attese crescenti. Restituisce le mail rimandate per
+# il limite giornaliero, che restano in coda (senza i byte del PDF, così la memoria non
+# cresce con le mail rimandate); rimandata, se indicata, viene chiamata per ognuna
+# prima che i byte vengano scartati.
+async def invia_con_limiti(sessioni, fabbrica, invii, limitatore, coda_invii, metriche=None):
+    coda = asyncio.Queue()
+    for invio in invii:
+        coda.put_nowait(invio)
+    for _ in range(sessioni.numero_sessioni):
+        coda.put_nowait(None)
+    return await invia_dalla_coda(sessioni, fabbrica, coda, limitatore, coda_invii, metriche)
+
+# Come invia_con_limiti, ma le mail arrivano in una coda asyncio che può essere riempita
+# mentre l'invio è già in corso (ad esempio man mano che i PDF vengono generati).
+# Una mail può portare con sé il PDF in byte ("pdf"). Ogni invio in parallelo termina
+# quando riceve None. L'attesa dovuta ai limiti di invio viene registrata in metriche.
+async def invia_dalla_coda(sessioni, fabbrica, coda, limitatore, coda_invii, metriche=None, rimandata=None):
+    metriche = metriche if metriche is not None else Metriche("mail_sender")
+    rimandati = []
+
+    async def lavoratore():
+        while True:
+            invio = await coda.get()
+            if invio is None:
+                return
+            numero_fattura = invio["numero_fattura"]
+            for tentativo in range(1, TENTATIVI_MASSIMI + 1):
+                with metriche.fase("attesa_limiti", numero_fattura, cpu=False):
+                    disponibile = await limitatore.acquisisci()
+                if not disponibile:
+                    coda_invii.segna(numero_fattura, "in_coda", "Limite giornaliero raggiunto")
+                    if rimandata is not None:
+                        rimandata(invio)
+                    rimandati.append({chiave: valore for chiave, valore in invio.items() if chiave != "pdf"})
+                    break
+
+                coda_invii.segna(numero_fattura, "in_invio")
+                # Le mail messe in coda da versioni precedenti hanno il corpo già composto
+                corpo_html = invio.get("corpo_html") if invio["nome_cliente"] is None else None
+                # Composizione e invio sono bloccanti: girano in un thread mentre gli altri invii proseguono
+                stato, messaggio = await asyncio.to_thread(invia_email, sessioni, fabbrica, invio["destinatario"], invio["nome_cliente"], invio["allegato_path"], invio["message_id"], corpo_html, invio.get("pdf"), metriche, numero_fattura)
+
+                if stato == "temporaneo" and tentativo < TENTATIVI_MASSIMI:
+                    attesa = ATTESA_PRIMO_TENTATIVO * 2 ** (tentativo - 1)
+                    coda_invii.segna(numero_fattura, "in_coda", messaggio)
+                    print(f"{messaggio} (fattura n. {numero_fattura}): nuovo tentativo tra {attesa} secondi.")
+                    await asyncio.sleep(attesa)
+                    continue
+
+                coda_invii.segna(numero_fattura, "inviata" if stato == "inviata" else "fallita", messaggio)
+                print(messaggio)
+                break
+
+    await asyncio.gather(*(lavoratore() for _ in range(sessioni.numero_sessioni)))
+    return sorted(rimandati, key=lambda invio: invio["numero_fattura"])
+
+# Apre le sessioni e invia le mail della coda rispettando i limiti.
+# Restituisce False se non è stato possibile collegarsi al server di posta.
+def spedisci_invii(coda_invii, invii):
+    sessioni = apri_sessioni_smtp()
+    if sessioni is None:
+        return False
+
+    limitatore = LimitatoreInvii()
+    metriche = Metriche("mail_sender")
+    try:
+        # Modello della mail compilato una volta per tutto l'invio
+        fabbrica = FabbricaMessaggi(sessioni.utente)
+        rimandati = asyncio.run(invia_con_limiti(sessioni, fabbrica, invii, limitatore, coda_invii, metriche))
+    finally:
+        sessioni.chiudi()
+        limitatore.salva()
+        metriche.salva(METRICHE_FILE)
+
+    stampa_riepilogo_invii(coda_invii, invii, rimandati, limitatore)
+    metriche.stampa_riepilogo()
+    print(f"Metriche salvate in {METRICHE_FILE}")
+    return True
+
+# Segnala le mail rimandate per il limite giornaliero e quelle non riuscite
+def stampa_riepilogo_invii(coda_invii, invii, rimandati, limitatore):
+    if rimandati:
+        numeri = ", ".join(str(invio["numero_fattura"]) for invio in rimandati)
+        print(f"Limite di {MAIL_AL_GIORNO} mail al giorno raggiunto: {len(rimandati)} mail rimandate (fatture n. {numeri}).")
+        print(f"Restano in coda e verranno riproposte al prossimo avvio; il primo invio sarà possibile dal {limitatore.prossimo_invio():%d/%m/%Y alle %H:%M}.")
+
+    fallite = [invio for invio in coda_invii.invii([invio["numero_fattura"] for invio in invii]) if invio["stato"] == "fallita"]
+    if fallite:
+        numeri = ", ".join(str(invio["numero_fattura"]) for invio in fallite)
+        print(f"Invio non riuscito per le fatture n. {numeri}: restano in coda per un nuovo tentativo.")
+
+# Riprende l'invio delle mail rimaste in coda (rimandate, fallite o interrotte), senza
+# rileggere l'Excel. Con conferma=True chiede prima all'utente.
+def riprendi_invii(coda_invii, conferma=True):
+    invii = coda_invii.invii()
+    if not invii:
+        if not conferma:
+            print("Nessuna mail in coda.")
+        return False
+
+    numeri = ", ".join(str(invio["numero_fattura"]) for invio in invii)
+    print(f"Ci sono {len(invii)} mail non ancora inviate nella coda (fatture n. {numeri}).")
+    interrotte = [invio["numero_fattura"] for invio in invii if invio["stato"] == "in_invio"]
+    if interrotte:
+        print(f"L'invio delle fatture n. {', '.join(map(str, interrotte))} era stato interrotto: verranno inviate con lo stesso Message-ID, così un'eventuale copia già consegnata non viene duplicata nella casella del cliente.")
+
+    if conferma and input("Vuoi riprendere l'invio adesso? (Y/N): ").strip().upper() != 'Y':
+        return False
+
+    # Le mail rimandate dalla pipeline prima che il PDF fosse generato non hanno ancora l'allegato
+    senza_pdf = [invio["numero_fattura"] for invio in invii if not deposito.esiste(invio["allegato_path"])]
+    if senza_pdf:
+        print(f"PDF non ancora generato per le fatture n. {', '.join(map(str, senza_pdf))}: restano in coda. "
+              "Generarle con la pipeline o con il PDF Compiler per inviarle.")
+        invii = [invio for invio in invii if invio["numero_fattura"] not in set(senza_pdf)]
+        if not invii:
+            return True
+
+    if spedisci_invii(coda_invii, invii):
+        print("Invio completato.")
+    return True
+
+# Righe di dati_fattura dell'intervallo, in ordine di numero fattura (vengono lette solo
+# quelle dell'intervallo). Restituisce None se il primo o l'ultimo numero dell'intervallo
+# non sono nell'Excel.
+def dati_intervallo(numero_iniziale, numero_finale):
+    df = carica_dati_excel(EXCEL_FILE, numero_iniziale, numero_finale)
+    numeri, indici = indice_numeri_fattura(df)
+    inizio, fine = intervallo_fatture(numeri, numero_iniziale, numero_finale)
+    if inizio == fine or numeri[inizio] != numero_iniziale or numeri[fine - 1] != numero_finale:
+        return None
+    return df.iloc[indici[inizio:fine]]
+
+# Righe da inviare come (numero fattura, nome, email), da dati già verificati
+def righe_invio(df):
+    return [(int(numero), nome, email) for numero, nome, email in zip(df.iloc[:, 8], df.iloc[:, 0], df.iloc[:, 9])]
+
+# Mail delle righe indicate, con l'allegato cercato per numero fattura tra i PDF della
+# cartella; le fatture senza PDF vengono segnalate e saltate
+def componi_invii(righe, pdf_fatture):
+    invii = []
+    for numero_fattura, nome_cognome, email_cliente in righe:
+        nome_cognome_formattato = formatta_nome(normalizza_stringa(nome_cognome))
+        nome_file_pdf = pdf_fatture.get(numero_fattura)
+
+        if nome_file_pdf is not None:
+            invii.append(dict(
+                numero_fattura=numero_fattura,
+                destinatario=email_cliente,
+                nome_cliente=nome_cognome_formattato,
+                allegato_path=nome_file_pdf
+            ))
+        else:
+            print(f"Il file PDF della fattura n. {numero_fattura} non esiste in {FATTURE_DIR}. Email non inviata.")
+    return invii
+
+# Mette in coda le mail e le invia, tranne quelle già inviate in passato.
+# Restituisce False se non è stato possibile collegarsi al server di posta.
+def accoda_e_spedisci(coda_invii, invii):
+    invii, gia_inviate = coda_invii.accoda(invii)
+    if gia_inviate:
+        print(f"{len(gia_inviate)} fatture dell'intervallo erano già state inviate (dalla n. {gia_inviate[0]} alla n. {gia_inviate[-1]}): mail non ripetute.")
+    if invii:
+        return spedisci_invii(coda_invii, invii)
+    return True
+
+def invia_fatture_intervallo(coda_invii):
+    # Mail rimaste in coda in un'esecuzione precedente
+    if riprendi_invii(coda_invii):
+        return
+
+    try:
+        numero_iniziale = int(input("Da quale numero di fattura vuoi inviare la mail? "))
+        numero_finale = int(input("Fino a quale numero di fattura vuoi che invii le mail? "))
+    except ValueError:
+        print("Errore: inserisci solo numeri interi.")
+        return
+
+    df = dati_intervallo(numero_iniziale, numero_finale)
+    if df is None:
+        print("Errore: intervallo di fatture non valido. Controlla i numeri inseriti e riprova.")
+        return
+    if not dati_corretti(df, "inviata"):
+        return
+    righe = righe_invio(df)
+
+    # Gli allegati vengono cercati per numero fattura nell'indice delle fatture
+    # (la cartella viene letta, una sola volta, solo per quelli che mancano)
+    pdf_fatture = indice_pdf_fatture(FATTURE_DIR, [numero for numero, _, _ in righe])
+
+    nome_inizio = formatta_nome(normalizza_stringa(righe[0][1]))
+    path_inizio = pdf_fatture.get(numero_iniziale, "PDF non trovato")
+
+    nome_fine = formatta_nome(normalizza_stringa(righe[-1][1]))
+    path_fine = pdf_fatture.get(numero_finale, "PDF non trovato")
+
+    print(f"Confermi l'invio delle mail dalla numero {numero_iniziale} - {nome_inizio}, con allegato \"{path_inizio}\" - "
+          f"alla numero {numero_finale} - {nome_fine}, con allegato \"{path_fine}\"?")
+
+    conferma = input("Confermi? (Y/N): ").strip().upper()
+
+    if conferma == 'Y':
+        invii = componi_invii(righe, pdf_fatture)
+        if invii and not accoda_e_spedisci(coda_invii, invii):
+            return
+        print("Invio completato.")
+    else:
+        print("Invio annullato.")
+
+def main():
+    coda_invii = CodaInvii()
+    try:
+        # "riprendi" invia solo le mail rimaste in coda, senza domande
+        if len(sys.argv) > 1 and sys.argv[1] == "riprendi":
+            riprendi_invii(coda_invii, conferma=False)
+        else:
+            invia_fatture_intervallo(coda_invii)
+    finally:
+        coda_invii.chiudi()
@@ -0,0 +1,263 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Generazione di un grande intervallo di fatture divisa tra più processi e più computer
+# che vedono la stessa cartella di output. L'intervallo viene diviso in blocchi di numeri
+# fattura, registrati in lavori_fatture.sqlite nella cartella di output; ogni lavoratore
+# (lo stesso comando avviato su ogni computer) prende un blocco libero alla volta e lo
+# tiene "in concessione" rinnovandola finché lo genera. Il blocco di un lavoratore che si
+# è fermato torna disponibile quando la sua concessione scade.
+# La cartella condivisa deve supportare i lock sui file (SQLite li usa per assegnare un
+# blocco a un solo lavoratore) e gli orologi dei computer devono essere sincronizzati.
+
+import contextlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from . import compilatore
+from .metriche import Metriche
+
+# Numeri fattura per blocco
+DIMENSIONE_BLOCCO = 500
+
+# Secondi di validità della concessione di un blocco; il lavoratore la rinnova ogni terzo
+# di questo tempo, quindi un blocco torna libero al massimo così dopo l'arresto del lavoratore
+DURATA_CONCESSIONE = 120
+
+# Un blocco ripreso più volte da lavoratori che si sono fermati (ad esempio per una riga
+# che fa chiudere il programma) viene abbandonato invece di fermare tutti gli altri
+TENTATIVI_MASSIMI = 3
+
+# Nome del lavoratore: computer e processo, per riconoscerlo nell'avanzamento
+def nome_lavoratore():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# Blocchi di un lavoro, su SQLite: una riga per blocco di numeri fattura.
+# Stati: "libero", "assegnato" (con lavoratore e scadenza della concessione),
+# "completato" (con le fatture generate e non generate) e "abbandonato".
+class LavoroCondiviso:
+    def __init__(self, numero_iniziale, numero_finale, percorso=None):
+        self.percorso = percorso or compilatore.LAVORI_FILE
+        self.lavoro = f"{numero_iniziale}-{numero_finale}"
+        self.numero_iniziale = numero_iniziale
+        self.numero_finale = numero_finale
+        # Le transazioni vengono aperte a mano (BEGIN IMMEDIATE), così la scelta di un blocco
+        # e la sua assegnazione avvengono con il file bloccato per gli altri lavoratori
+        self.connessione = sqlite3.connect(self.percorso, timeout=60, isolation_level=None)
+        self.connessione.row_factory = sqlite3.Row
+        self.connessione.execute("""
+            CREATE TABLE IF NOT EXISTS blocchi (
+                lavoro TEXT NOT NULL,
+                inizio INTEGER NOT NULL,
+                fine INTEGER NOT NULL,
+                stato TEXT NOT NULL,
+                lavoratore TEXT,
+                scadenza REAL,
+                tentativi INTEGER NOT NULL DEFAULT 0,
+                generate INTEGER,
+                non_generate INTEGER,
+                aggiornato TEXT,
+                PRIMARY KEY (lavoro, inizio)
+            )""")
+
+    # Transazione con il file bloccato in scrittura per tutti gli altri lavoratori
+    @contextlib.contextmanager
+    def esclusiva(self):
+        self.connessione.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.connessione.execute("ROLLBACK")
+            raise
+        self.connessione.execute("COMMIT")
+
+    # Divide l'intervallo in blocchi, se nessun lavoratore l'ha già fatto (in quel caso
+    # restano i blocchi esistenti, anche se di un'altra dimensione). Restituisce il numero di blocchi.
+    def crea_blocchi(self, dimensione=None):
+        dimensione = dimensione or DIMENSIONE_BLOCCO
+        with self.esclusiva():
+            esistenti = self.connessione.execute("SELECT COUNT(*) FROM blocchi WHERE lavoro = ?", (self.lavoro,)).fetchone()[0]
+            if esistenti:
+                return esistenti
+            blocchi = [(self.lavoro, inizio, min(inizio + dimensione - 1, self.numero_finale))
+                       for inizio in range(self.numero_iniziale, self.numero_finale + 1, dimensione)]
+            self.connessione.executemany("INSERT INTO blocchi (lavoro, inizio, fine, stato) VALUES (?, ?, ?, 'libero')", blocchi)
+            return len(blocchi)
+
+    # Assegna al lavoratore il primo blocco libero o con la concessione scaduta.
+    # Restituisce (inizio, fine) oppure None se non ci sono blocchi da prendere.
+    def prendi_blocco(self, lavoratore, durata=None):
+        durata = durata or DURATA_CONCESSIONE
+        with self.esclusiva():
+            while True:
+                adesso = time.time()
+                riga = self.connessione.execute(
+                    "SELECT inizio, fine, stato, lavoratore, tentativi FROM blocchi WHERE lavoro = ? "
+                    "AND (stato = 'libero' OR (stato = 'assegnato' AND scadenza < ?)) ORDER BY inizio LIMIT 1",
+                    (self.lavoro, adesso)).fetchone()
+                if riga is None:
+                    return None
+                if riga["stato"] == "assegnato":
+                    print(f"Blocco {riga['inizio']}-{riga['fine']}: la concessione di {riga['lavoratore']} è scaduta, il blocco viene ripreso.")
+                if riga["tentativi"] >= TENTATIVI_MASSIMI:
+                    print(f"Blocco {riga['inizio']}-{riga['fine']} abbandonato dopo {riga['tentativi']} tentativi non riusciti.")
+                    self.connessione.execute("UPDATE blocchi SET stato = 'abbandonato', lavoratore = NULL, aggiornato = ? WHERE lavoro = ? AND inizio = ?",
+                                             (datetime.now().isoformat(timespec="seconds"), self.lavoro, riga["inizio"]))
+                    continue
+                self.connessione.execute(
+                    "UPDATE blocchi SET stato = 'assegnato', lavoratore = ?, scadenza = ?, tentativi = tentativi + 1, aggiornato = ? WHERE lavoro = ? AND inizio = ?",
+                    (lavoratore, adesso + durata, datetime.now().isoformat(timespec="seconds"), self.lavoro, riga["inizio"]))
+                return riga["inizio"], riga["fine"]
+
+    # Prolunga la concessione; False se il blocco non è più del lavoratore (concessione
+    # scaduta e blocco ripreso da un altro)
+    def rinnova(self, inizio, lavoratore, durata=None):
+        durata = durata or DURATA_CONCESSIONE
+        cursore = self.connessione.execute(
+            "UPDATE blocchi SET scadenza = ? WHERE lavoro = ? AND inizio = ? AND lavoratore = ? AND stato = 'assegnato'",
+            (time.time() + durata, self.lavoro, inizio, lavoratore))
+        return cursore.rowcount == 1
+
+    # Segna il blocco come completato; False se nel frattempo era passato a un altro lavoratore
+    def completa(self, inizio, lavoratore, generate, non_generate):
+        cursore = self.connessione.execute(
+            "UPDATE blocchi SET stato = 'completato', scadenza = NULL, generate = ?, non_generate = ?, aggiornato = ? "
+            "WHERE lavoro = ? AND inizio = ? AND lavoratore = ? AND stato = 'assegnato'",
+            (generate, non_generate, datetime.now().isoformat(timespec="seconds"), self.lavoro, inizio, lavoratore))
+        return cursore.rowcount == 1
+
+    # Rimette libero un blocco non finito. Un lavoratore interrotto con Ctrl+C non conta
+    # tra i tentativi; un errore sì (tentativo_usato=True), così un blocco che fallisce
+    # ogni volta viene abbandonato dopo TENTATIVI_MASSIMI
+    def rilascia(self, inizio, lavoratore, tentativo_usato=False):
+        self.connessione.execute(
+            "UPDATE blocchi SET stato = 'libero', lavoratore = NULL, scadenza = NULL, tentativi = tentativi - ? "
+            "WHERE lavoro = ? AND inizio = ? AND lavoratore = ? AND stato = 'assegnato'",
+            (0 if tentativo_usato else 1, self.lavoro, inizio, lavoratore))
+
+    # Avanzamento complessivo di tutti i lavoratori: blocchi per stato, fatture generate e
+    # non generate, lavoratori con una concessione valida
+    def avanzamento(self):
+        adesso = time.time()
+        stati = {"libero": 0, "assegnato": 0, "scaduto": 0, "completato": 0, "abbandonato": 0}
+        generate = non_generate = 0
+        lavoratori = set()
+        for riga in self.connessione.execute("SELECT * FROM blocchi WHERE lavoro = ?", (self.lavoro,)):
+            stato = riga["stato"]
+            if stato == "assegnato":
+                if riga["scadenza"] < adesso:
+                    stato = "scaduto"
+                else:
+                    lavoratori.add(riga["lavoratore"])
+            stati[stato] += 1
+            generate += riga["generate"] or 0
+            non_generate += riga["non_generate"] or 0
+        return {"blocchi": stati, "totale_blocchi": sum(stati.values()), "generate": generate,
+                "non_generate": non_generate, "lavoratori": sorted(lavoratori)}
+
+    def chiudi(self):
+        self.connessione.close()
+
+# Intervalli di tutti i lavori registrati nel file, in ordine
+def lavori_registrati(percorso=None):
+    percorso = percorso or compilatore.LAVORI_FILE
+    if not os.path.exists(percorso):
+        return []
+    connessione = sqlite3.connect(percorso, timeout=60)
+    try:
+        lavori = [riga[0] for riga in connessione.execute("SELECT DISTINCT lavoro FROM blocchi")]
+    except sqlite3.OperationalError:
+        lavori = []
+    finally:
+        connessione.close()
+    return sorted(tuple(map(int, lavoro.split("-"))) for lavoro in lavori)
+
+def stampa_avanzamento(lavoro):
+    stato = lavoro.avanzamento()
+    blocchi = stato["blocchi"]
+    print(f"Lavoro {lavoro.numero_iniziale}-{lavoro.numero_finale}: {blocchi['completato']}/{stato['totale_blocchi']} blocchi completati, "
+          f"{blocchi['assegnato']} in corso, {blocchi['libero']} liberi, {blocchi['scaduto']} con la concessione scaduta, {blocchi['abbandonato']} abbandonati; "
+          f"{stato['generate']} fatture generate, {stato['non_generate']} non generate; lavoratori attivi: {len(stato['lavoratori'])}.")
+
+# Rinnova in un thread a parte la concessione del blocco mentre il lavoratore lo genera
+# (con una propria connessione, perché una connessione SQLite resta nel suo thread)
+class Concessione(threading.Thread):
+    def __init__(self, lavoro, inizio, lavoratore, durata):
+        super().__init__(daemon=True)
+        self.lavoro = lavoro
+        self.inizio = inizio
+        self.lavoratore = lavoratore
+        self.durata = durata
+        self.fermata = threading.Event()
+        self.persa = False
+
+    def run(self):
+        connessione = LavoroCondiviso(self.lavoro.numero_iniziale, self.lavoro.numero_finale, self.lavoro.percorso)
+        try:
+            while not self.fermata.wait(self.durata / 3):
+                if not connessione.rinnova(self.inizio, self.lavoratore, self.durata):
+                    self.persa = True
+                    print(f"Attenzione: la concessione del blocco che inizia dal n. {self.inizio} è scaduta ed è passato a un altro lavoratore.")
+                    return
+        finally:
+            connessione.chiudi()
+
+    def ferma(self):
+        self.fermata.set()
+        self.join()
+
+# Esegue un lavoratore: crea i blocchi dell'intervallo (se è il primo), poi genera un blocco
+# alla volta finché ce ne sono. df contiene le righe dell'intervallo, già controllate.
+# Manifest e indice della cartella vengono aggiornati con il file dei lavori bloccato,
+# così i lavoratori non cancellano le fatture registrate dagli altri.
+# Restituisce il numero di fatture non generate da questo lavoratore.
+def esegui_lavoratore(df, numero_iniziale, numero_finale, solo_modificate, metriche, dimensione_blocco=None, durata=None):
+    import pandas as pd
+
+    durata = durata or DURATA_CONCESSIONE
+    os.makedirs(compilatore.OUTPUT_DIR, exist_ok=True)
+    lavoratore = nome_lavoratore()
+    lavoro = LavoroCondiviso(numero_iniziale, numero_finale)
+    numeri = pd.to_numeric(df.iloc[:, 8], errors="coerce")
+    non_generate = 0
+    try:
+        numero_blocchi = lavoro.crea_blocchi(dimensione_blocco)
+        print(f"Lavoratore {lavoratore}: lavoro {lavoro.lavoro} diviso in {numero_blocchi} blocchi.")
+
+        while True:
+            blocco = lavoro.prendi_blocco(lavoratore, durata)
+            if blocco is None:
+                break
+            inizio, fine = blocco
+            print(f"Blocco {inizio}-{fine} assegnato a {lavoratore}.")
+
+            concessione = Concessione(lavoro, inizio, lavoratore, durata)
+            concessione.start()
+            try:
+                fatture, manifest, impronte = compilatore.seleziona_fatture(df[(numeri >= inizio) & (numeri <= fine)], solo_modificate, metriche)
+                non_generate_blocco = compilatore.genera(fatture, manifest, impronte, metriche, esclusiva=lavoro.esclusiva) if fatture else 0
+            except (KeyboardInterrupt, SystemExit):
+                concessione.ferma()
+                lavoro.rilascia(inizio, lavoratore)
+                raise
+            except Exception:
+                concessione.ferma()
+                lavoro.rilascia(inizio, lavoratore, tentativo_usato=True)
+                raise
+            concessione.ferma()
+
+            non_generate += non_generate_blocco
+            if not lavoro.completa(inizio, lavoratore, len(fatture) - non_generate_blocco, non_generate_blocco):
+                print(f"Il blocco {inizio}-{fine} era già passato a un altro lavoratore: le sue fatture sono state generate due volte.")
+            stampa_avanzamento(lavoro)
+            # Le metriche di ogni blocco vengono salvate da genera: si riparte con un elenco vuoto
+            metriche = Metriche()
+
+        print(f"Nessun altro blocco da generare per il lavoro {lavoro.lavoro}.")
+        stampa_avanzamento(lavoro)
+    finally:
+        lavoro.chiudi()
+    return non_generate
@@ -0,0 +1,61 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import contextlib
+import json
+import time
+from datetime import datetime
+
+# Metriche di un'esecuzione: per ogni fase (e, dove ha senso, per ogni fattura) tempo reale,
+# tempo di CPU del thread e byte scritti. Un tempo reale molto più alto di quello di CPU
+# indica un'attesa: Ghostscript, il disco o il server di posta.
+class Metriche:
+    def __init__(self, programma="pdf_compiler"):
+        self.programma = programma
+        self.voci = []
+
+    # Misura il blocco di codice; la voce restituita può ricevere i byte scritti ("byte").
+    # Con cpu=False il tempo di CPU non viene registrato (attese in asyncio, dove il
+    # thread nel frattempo lavora per altre fatture).
+    @contextlib.contextmanager
+    def fase(self, nome, fattura=None, cpu=True):
+        voce = {"fase": nome, "fattura": fattura, "byte": 0}
+        inizio = time.perf_counter()
+        inizio_cpu = time.thread_time()
+        try:
+            yield voce
+        finally:
+            voce["secondi"] = time.perf_counter() - inizio
+            voce["secondi_cpu"] = time.thread_time() - inizio_cpu if cpu else None
+            self.voci.append(voce)
+
+    # Aggiunge le voci misurate in un altro processo o thread
+    def aggiungi(self, voci):
+        self.voci.extend(voci)
+
+    # Aggiunge le voci al file JSON-lines, ciascuna con la data dell'esecuzione e il programma
+    def salva(self, percorso):
+        esecuzione = datetime.now().isoformat(timespec="seconds")
+        righe = "".join(json.dumps({"esecuzione": esecuzione, "programma": self.programma, **voce}, ensure_ascii=False, default=str) + "\n" for voce in self.voci)
+        # Tutte le righe con una sola scrittura, così quelle di più processi che salvano
+        # nello stesso file (vedi lavori.py) non si mescolano
+        with open(percorso, "a", encoding="utf-8") as f:
+            f.write(righe)
+
+    # Per ogni fase: numero di misure, tempo totale, tempi p50/p95/massimo, CPU e dati scritti
+    def stampa_riepilogo(self):
+        import numpy as np
+
+        fasi = {}
+        for voce in self.voci:
+            fasi.setdefault(voce["fase"], []).append(voce)
+        if not fasi:
+            return
+
+        print(f"\n{'Fase':<20}{'misure':>8}{'totale s':>10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'CPU s':>8}{'MB scritti':>12}")
+        for fase, voci in fasi.items():
+            secondi = np.array([voce["secondi"] for voce in voci])
+            p50, p95 = np.percentile(secondi, [50, 95]) * 1000
+            cpu = [voce["secondi_cpu"] for voce in voci if voce["secondi_cpu"] is not None]
+            cpu = f"{sum(cpu):.2f}" if cpu else "-"
+            mb_scritti = sum(voce["byte"] for voce in voci) / (1024 * 1024)
+            print(f"{fase:<20}{len(voci):>8}{secondi.sum():>10.2f}{p50:>9.1f}{p95:>9.1f}{secondi.max() * 1000:>9.1f}{cpu:>8}{mb_scritti:>12.2f}")
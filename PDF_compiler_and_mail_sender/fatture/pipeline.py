@@ -0,0 +1,215 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from . import compilatore, invio
+from .metriche import Metriche
+from .validazione import dati_corretti
+
+# Fatture con il PDF pronto che possono aspettare l'invio. Quando la coda è piena la
+# generazione si ferma finché una mail non parte, così la memoria resta costante
+# qualunque sia il numero di fatture. Raggiunto il limite giornaliero di mail la
+# generazione si ferma del tutto: le fatture rimaste restano in coda di invio, da
+# generare e inviare con una nuova esecuzione.
+CODA_MASSIMA = 20
+
+# Con la compressione interna i PDF vengono generati in memoria e allegati direttamente;
+# la copia nella cartella Fatture viene scritta in parallelo, fuori dal percorso dell'invio.
+# False = nessuna copia su disco (le mail che non partono vanno rigenerate con la pipeline).
+# La copia è sempre un file per fattura, nelle sottocartelle di SUDDIVISIONE: gli archivi
+# ZIP e tar (ARCHIVIO) sono solo del PDF Compiler.
+ARCHIVIA_PDF = True
+
+# Impostazioni dei processi di generazione. La compressione Ghostscript "a lotti" aspetta
+# la fine di tutte le fatture, quindi nella pipeline ogni PDF viene compresso subito.
+def impostazioni_processo_pipeline():
+    impostazioni = compilatore.impostazioni()
+    if impostazioni["COMPRESSIONE"] == "ghostscript_batch":
+        impostazioni["COMPRESSIONE"] = "ghostscript"
+    return impostazioni
+
+# Generazione, compressione e invio in un'unica catena: i processi generano e comprimono
+# i PDF, e ogni fattura passa all'invio appena il suo PDF è pronto, senza aspettare le
+# altre. Con la compressione interna il PDF arriva all'invio in byte, senza passare dal
+# disco. Tutte le fasi vengono registrate in metriche, compresa l'attesa di un posto nella
+# coda di invio (alta quando è l'invio a rallentare la catena).
+# Restituisce i PDF salvati in Fatture e le mail rimandate per il limite giornaliero.
+async def esegui_pipeline(fatture, da_inviare, manifest, impronte, sessioni, limitatore, coda_invii, metriche):
+    loop = asyncio.get_running_loop()
+    coda = asyncio.Queue(maxsize=CODA_MASSIMA)
+    fabbrica = invio.FabbricaMessaggi(sessioni.utente)
+
+    pdf_generati = []
+    in_memoria = compilatore.COMPRESSIONE == "interna"
+
+    # Una mail rimandata viene ripresa più tardi dal PDF su disco: senza la copia in Fatture
+    # (ARCHIVIA_PDF = False) il PDF che era solo in memoria viene salvato adesso
+    def salva_rimandata(mail):
+        if mail.get("pdf") is None or ARCHIVIA_PDF:
+            return
+        try:
+            scrivi(mail["allegato_path"], mail["pdf"], mail["numero_fattura"])
+            pdf_generati.append(mail["allegato_path"])
+        except OSError as e:
+            print(f"Errore nel salvataggio di {mail['allegato_path']}: {e}")
+
+    spedizione = asyncio.create_task(invio.invia_dalla_coda(sessioni, fabbrica, coda, limitatore, coda_invii, metriche, salva_rimandata))
+    # Fatture in generazione o in attesa di un posto nella coda di invio
+    in_lavorazione = asyncio.Semaphore(compilatore.NUM_PROCESSI * 2)
+    # Scritture dei PDF nella cartella Fatture ancora in corso
+    scritture = set()
+
+    def scrivi(output_pdf_path, contenuto, numero):
+        with metriche.fase("archiviazione", numero) as voce:
+            compilatore.scrivi_pdf(output_pdf_path, contenuto)
+            voce["byte"] = len(contenuto)
+
+    async def archivia(archivio, output_pdf_path, contenuto, numero):
+        try:
+            await loop.run_in_executor(archivio, scrivi, output_pdf_path, contenuto, numero)
+            pdf_generati.append(output_pdf_path)
+        except OSError as e:
+            print(f"Errore nel salvataggio di {output_pdf_path}: {e}")
+
+    async def prepara(executor, archivio, dati):
+        try:
+            numero = dati["numero_fattura"]
+            mail = da_inviare.get(int(numero)) if dati["valida"] else None
+            contenuto = None
+
+            if not compilatore.da_rigenerare(dati, impronte[str(numero)], manifest):
+                output_pdf_path = manifest[str(numero)]["file"]
+                print(f"PDF già aggiornato: {output_pdf_path}")
+            elif in_memoria:
+                contenuto, messaggi, voci = await loop.run_in_executor(executor, compilatore.elabora_fattura_in_memoria, dati)
+                for messaggio in messaggi:
+                    print(messaggio)
+                metriche.aggiungi(voci)
+                output_pdf_path = dati["output_pdf_path"] if contenuto is not None else None
+                if contenuto is not None and ARCHIVIA_PDF:
+                    scrittura = asyncio.create_task(archivia(archivio, output_pdf_path, contenuto, numero))
+                    scritture.add(scrittura)
+                    scrittura.add_done_callback(scritture.discard)
+            else:
+                output_pdf_path, messaggi, voci = await loop.run_in_executor(executor, compilatore.elabora_fattura, dati)
+                for messaggio in messaggi:
+                    print(messaggio)
+                metriche.aggiungi(voci)
+                if output_pdf_path:
+                    pdf_generati.append(output_pdf_path)
+
+            if mail is None:
+                return
+            if output_pdf_path:
+                if contenuto is not None:
+                    mail = dict(mail, pdf=contenuto)
+                # Se la coda di invio è piena si aspetta qui: è questo a frenare la generazione
+                with metriche.fase("attesa_coda_invio", numero, cpu=False):
+                    await coda.put(mail)
+            else:
+                coda_invii.segna(mail["numero_fattura"], "fallita", "PDF non generato")
+        finally:
+            in_lavorazione.release()
+
+    attive = set()
+    non_generate = []
+    with ProcessPoolExecutor(max_workers=compilatore.NUM_PROCESSI, initializer=compilatore.inizializza_processo, initargs=(impostazioni_processo_pipeline(),)) as executor, \
+         ThreadPoolExecutor(max_workers=1) as archivio:
+        for posizione, dati in enumerate(fatture):
+            await in_lavorazione.acquire()
+            if limitatore.limite_raggiunto:
+                in_lavorazione.release()
+                non_generate = fatture[posizione:]
+                break
+            attiva = asyncio.create_task(prepara(executor, archivio, dati))
+            attive.add(attiva)
+            attiva.add_done_callback(attive.discard)
+        await asyncio.gather(*attive)
+        await asyncio.gather(*scritture)
+
+    for _ in range(sessioni.numero_sessioni):
+        await coda.put(None)
+    rimandati = await spedizione
+
+    # Fatture non generate per il limite giornaliero: la mail resta in coda senza PDF
+    for dati in non_generate:
+        mail = da_inviare.get(int(dati["numero_fattura"])) if dati["valida"] else None
+        if mail is not None:
+            coda_invii.segna(mail["numero_fattura"], "in_coda", "Limite giornaliero raggiunto: PDF non ancora generato")
+            rimandati.append(mail)
+    if non_generate:
+        print(f"Limite giornaliero raggiunto: {len(non_generate)} fatture non sono state generate (dalla n. {non_generate[0]['numero_fattura']} alla n. {non_generate[-1]['numero_fattura']}).")
+    return pdf_generati, sorted(rimandati, key=lambda mail: mail["numero_fattura"])
+
+def main():
+    try:
+        numero_iniziale = int(input("Da quale numero di fattura vuoi generare e inviare le fatture? "))
+        numero_finale = int(input("Fino a quale numero di fattura? "))
+    except ValueError:
+        print("Errore: inserisci solo numeri interi.")
+        return
+
+    # Metriche della generazione e dell'invio, salvate insieme a quelle del PDF Compiler
+    metriche = Metriche("pipeline")
+
+    # Vengono lette solo le righe dell'intervallo richiesto
+    with metriche.fase("caricamento_excel"):
+        df = compilatore.carica_dati_excel(compilatore.EXCEL_FILE, numero_iniziale, numero_finale)
+    if not dati_corretti(df, "generata né inviata", metriche):
+        return
+    with metriche.fase("preparazione"):
+        fatture = compilatore.prepara_fatture(df)
+    if not fatture:
+        print("Nessuna fattura trovata nell'intervallo specificato.")
+        return
+
+    conferma = input(f"Generare e inviare le fatture dal numero {fatture[0]['numero_fattura']} ({fatture[0]['nome_cognome'].strip()}) "
+                     f"fino al numero {fatture[-1]['numero_fattura']} ({fatture[-1]['nome_cognome'].strip()})? (Y/N): ").strip().upper()
+    if conferma != "Y":
+        print("Operazione annullata.")
+        return
+
+    ambiente = compilatore.impronta_ambiente()
+    manifest = compilatore.carica_manifest()
+    impronte = {str(dati["numero_fattura"]): compilatore.impronta_fattura(dati, ambiente) for dati in fatture}
+
+    # Le fatture già aggiornate vengono allegate dal PDF registrato nel manifest, ovunque sia
+    email_clienti = dict(zip(df.iloc[:, 8], df.iloc[:, 9]))
+    invii = [dict(
+        numero_fattura=int(dati["numero_fattura"]),
+        destinatario=email_clienti[dati["numero_fattura"]],
+        nome_cliente=invio.formatta_nome(invio.normalizza_stringa(dati["nome_cognome"])),
+        allegato_path=compilatore.percorso_pdf(dati, impronte[str(dati["numero_fattura"])], manifest)
+    ) for dati in fatture if dati["valida"]]
+
+    coda_invii = invio.CodaInvii()
+    try:
+        da_inviare, gia_inviate = coda_invii.accoda(invii)
+        if gia_inviate:
+            print(f"{len(gia_inviate)} fatture dell'intervallo erano già state inviate (dalla n. {gia_inviate[0]} alla n. {gia_inviate[-1]}): non vengono né rigenerate né inviate di nuovo.")
+            fatture = [dati for dati in fatture if not dati["valida"] or int(dati["numero_fattura"]) not in set(gia_inviate)]
+
+        compilatore.crea_cartelle(fatture)
+
+        sessioni = invio.apri_sessioni_smtp()
+        if sessioni is None:
+            return
+
+        limitatore = invio.LimitatoreInvii()
+        try:
+            pdf_generati, rimandati = asyncio.run(esegui_pipeline(
+                fatture, {mail["numero_fattura"]: mail for mail in da_inviare}, manifest, impronte, sessioni, limitatore, coda_invii, metriche))
+        finally:
+            sessioni.chiudi()
+            limitatore.salva()
+            metriche.salva(compilatore.METRICHE_FILE)
+
+        compilatore.aggiorna_manifest(manifest, fatture, impronte, pdf_generati)
+        invio.stampa_riepilogo_invii(coda_invii, da_inviare, rimandati, limitatore)
+        metriche.stampa_riepilogo()
+        print(f"Metriche salvate in {compilatore.METRICHE_FILE}")
+    finally:
+        coda_invii.chiudi()
+
+    print("Processo completato.")
@@ -0,0 +1,237 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Servizio di generazione sempre attivo, per le fatture singole emesse durante la giornata.
+# Template, font, layout e dati di dati_fattura restano in memoria: ogni richiesta riceve
+# il PDF già compresso senza ricaricare pandas, PyMuPDF e reportlab né rileggere l'Excel.
+# Risponde solo dal computer stesso (INDIRIZZO), via HTTP:
+#   GET /fatture/<numero>.pdf          -> PDF della fattura
+#   GET /fatture/<numero>.pdf?salva=1  -> come sopra, e salvato anche in Fatture (con manifest e indice)
+#   GET /stato                         -> righe caricate, righe da correggere, ultimo aggiornamento
+# L'Excel viene controllato ogni INTERVALLO_CONTROLLO secondi; quando cambia viene riletto in
+# un thread a parte e vengono preparate e controllate di nuovo solo le righe cambiate. Nel
+# frattempo le richieste continuano a usare i dati precedenti.
+# Se cambiano template, font o layout il servizio va riavviato.
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+from . import compilatore
+from .excel import carica_dati_excel
+from .validazione import verifica_fatture
+
+INDIRIZZO = "127.0.0.1"
+PORTA = 8765
+
+# Secondi tra un controllo e l'altro della data di modifica dell'Excel
+INTERVALLO_CONTROLLO = 1.0
+
+PERCORSO_FATTURA = re.compile(r"^/fatture/(\d+)\.pdf$")
+
+# Impostazioni che si possono cambiare con configura()
+IMPOSTAZIONI = ("INDIRIZZO", "PORTA", "INTERVALLO_CONTROLLO")
+
+def configura(**valori):
+    for nome in valori:
+        if nome not in IMPOSTAZIONI:
+            raise ValueError(f"Impostazione sconosciuta: {nome}")
+    globals().update(valori)
+
+# Dati delle fatture tenuti in memoria, per numero fattura: i dati preparati per il PDF,
+# i problemi delle righe da correggere e un'impronta di ogni riga, per riconoscere quelle
+# cambiate quando l'Excel viene salvato di nuovo
+class DatiFatture:
+    def __init__(self, excel_file):
+        self.excel_file = excel_file
+        self.fatture = {}
+        self.errori = {}
+        self.impronte_righe = {}
+        self.stato_file = None
+        self.aggiornato = None
+        self.blocco = threading.Lock()
+
+    def stato_excel(self):
+        stato = os.stat(self.excel_file)
+        return stato.st_mtime_ns, stato.st_size
+
+    def cambiato(self):
+        return self.stato_excel() != self.stato_file
+
+    # Rilegge l'Excel e prepara solo le righe nuove o cambiate; le righe senza un numero
+    # fattura non si possono richiedere e vengono ignorate.
+    # Restituisce il numero di righe cambiate e di righe eliminate.
+    def aggiorna(self):
+        import numpy as np
+        import pandas as pd
+
+        stato_file = self.stato_excel()
+        df = carica_dati_excel(self.excel_file)
+        numeri = pd.to_numeric(df.iloc[:, 8], errors="coerce")
+        con_numero = numeri.notna() & (numeri % 1 == 0)
+        df = df[con_numero].reset_index(drop=True)
+        numeri = numeri[con_numero].astype("int64").to_numpy()
+
+        impronte_righe = pd.util.hash_pandas_object(df, index=False).tolist()
+        cambiate = np.array([self.impronte_righe.get(numero) != impronta for numero, impronta in zip(numeri.tolist(), impronte_righe)], dtype=bool)
+        impronte = dict(zip(numeri.tolist(), impronte_righe))
+        righe_cambiate = df[cambiate]
+
+        fatture = {numero: dati for numero, dati in self.fatture.items() if numero in impronte}
+        errori = {numero: problemi for numero, problemi in self.errori.items() if numero in impronte}
+        for dati in compilatore.prepara_fatture(righe_cambiate):
+            fatture[int(dati["numero_fattura"])] = dati
+        for numero in numeri[cambiate].tolist():
+            errori.pop(numero, None)
+        for numero, _, problemi in verifica_fatture(righe_cambiate):
+            if numero is not None:
+                errori[numero] = problemi
+        # Un numero ripetuto (o non più ripetuto) può riguardare anche righe non cambiate:
+        # questo controllo viene rifatto ogni volta su tutte le righe
+        ripetuti = set(numeri[pd.Series(numeri).duplicated(keep=False).to_numpy()].tolist())
+        for numero in set(errori) | ripetuti:
+            problemi = [problema for problema in errori.get(numero, []) if problema != "numero fattura ripetuto"]
+            if numero in ripetuti:
+                problemi.append("numero fattura ripetuto")
+            if problemi:
+                errori[numero] = problemi
+            else:
+                errori.pop(numero, None)
+
+        eliminate = len(set(self.impronte_righe) - set(impronte))
+        with self.blocco:
+            self.fatture, self.errori, self.impronte_righe = fatture, errori, impronte
+            self.stato_file = stato_file
+            self.aggiornato = datetime.now().isoformat(timespec="seconds")
+        return len(righe_cambiate), eliminate
+
+    # Dati della fattura e problemi da correggere (None se il numero non c'è)
+    def fattura(self, numero):
+        with self.blocco:
+            return self.fatture.get(numero), self.errori.get(numero, [])
+
+    def stato(self):
+        with self.blocco:
+            return {"excel": self.excel_file, "righe": len(self.fatture), "righe_da_correggere": len(self.errori), "aggiornato": self.aggiornato}
+
+# Template, font e dati pronti in memoria, con il thread che tiene d'occhio l'Excel
+class Servizio:
+    def __init__(self):
+        self.dati = DatiFatture(compilatore.EXCEL_FILE)
+        righe, _ = self.dati.aggiorna()
+        print(f"Caricate {righe} righe da {compilatore.EXCEL_FILE} ({len(self.dati.errori)} da correggere).")
+
+        self.motore = compilatore.MotorePDF(compilatore.PDF_TEMPLATE)
+        # PyMuPDF non si usa da più thread insieme: le fatture vengono generate una alla volta
+        self.blocco_pdf = threading.Lock()
+        self.blocco_manifest = threading.Lock()
+        self.ambiente = compilatore.impronta_ambiente()
+
+        # Una prima fattura di prova registra i font in reportlab e prepara la pagina base
+        # del template, così anche la prima richiesta è veloce
+        for dati in self.dati.fatture.values():
+            if dati["valida"]:
+                self.motore.in_memoria(dati)
+                break
+
+        self.fermata = threading.Event()
+        self.controllo = threading.Thread(target=self.controlla_excel, daemon=True)
+        self.controllo.start()
+
+    # Rilegge l'Excel quando cambia; un file ancora in scrittura o illeggibile viene
+    # riprovato al controllo successivo, mantenendo i dati precedenti
+    def controlla_excel(self):
+        while not self.fermata.wait(INTERVALLO_CONTROLLO):
+            try:
+                if not self.dati.cambiato():
+                    continue
+                inizio = time.perf_counter()
+                cambiate, eliminate = self.dati.aggiorna()
+                print(f"{compilatore.EXCEL_FILE} aggiornato: {cambiate} righe nuove o cambiate, {eliminate} eliminate "
+                      f"({time.perf_counter() - inizio:.2f} s, {len(self.dati.errori)} righe da correggere).")
+            except Exception as e:
+                print(f"Errore nella lettura di {compilatore.EXCEL_FILE}, nuovo tentativo tra poco: {e}")
+
+    # Genera la fattura in memoria; con salva=True la scrive anche nella cartella di output
+    # e la registra nel manifest e nell'indice, come il PDF Compiler
+    def genera(self, dati, salva=False):
+        with self.blocco_pdf:
+            contenuto = self.motore.in_memoria(dati)
+        if salva:
+            numero = str(dati["numero_fattura"])
+            with self.blocco_manifest:
+                os.makedirs(os.path.dirname(dati["output_pdf_path"]), exist_ok=True)
+                compilatore.scrivi_pdf(dati["output_pdf_path"], contenuto)
+                compilatore.aggiorna_manifest(compilatore.carica_manifest(), [dati], {numero: compilatore.impronta_fattura(dati, self.ambiente)}, [dati["output_pdf_path"]])
+        return contenuto
+
+    def ferma(self):
+        self.fermata.set()
+        self.controllo.join()
+
+class GestoreRichieste(BaseHTTPRequestHandler):
+    def do_GET(self):
+        indirizzo = urlsplit(self.path)
+        if indirizzo.path == "/stato":
+            self.rispondi_json(200, self.server.servizio.dati.stato())
+            return
+
+        corrispondenza = PERCORSO_FATTURA.match(indirizzo.path)
+        if corrispondenza is None:
+            self.rispondi_json(404, {"errore": "indirizzo sconosciuto: usare /fatture/<numero>.pdf o /stato"})
+            return
+
+        numero = int(corrispondenza.group(1))
+        dati, problemi = self.server.servizio.dati.fattura(numero)
+        if dati is None:
+            self.rispondi_json(404, {"errore": f"fattura n. {numero} non trovata in dati_fattura"})
+            return
+        if problemi or not dati["valida"]:
+            self.rispondi_json(422, {"errore": f"la riga della fattura n. {numero} è da correggere", "problemi": problemi})
+            return
+
+        salva = parse_qs(indirizzo.query).get("salva", ["0"])[0] not in ("0", "")
+        inizio = time.perf_counter()
+        try:
+            contenuto = self.server.servizio.genera(dati, salva)
+        except Exception as e:
+            self.rispondi_json(500, {"errore": f"errore nella generazione della fattura n. {numero}: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(contenuto)))
+        self.send_header("Content-Disposition", f"inline; filename*=UTF-8''{quote(os.path.basename(dati['output_pdf_path']))}")
+        self.send_header("X-Millisecondi-Generazione", f"{(time.perf_counter() - inizio) * 1000:.1f}")
+        self.end_headers()
+        self.wfile.write(contenuto)
+
+    def rispondi_json(self, codice, contenuto):
+        corpo = json.dumps(contenuto, ensure_ascii=False).encode("utf-8")
+        self.send_response(codice)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+def main():
+    if not os.path.exists(compilatore.EXCEL_FILE):
+        print(f"Errore: il file {compilatore.EXCEL_FILE} non esiste.")
+        return 2
+
+    servizio = Servizio()
+    server = ThreadingHTTPServer((INDIRIZZO, PORTA), GestoreRichieste)
+    server.servizio = servizio
+    print(f"Servizio fatture attivo su http://{INDIRIZZO}:{PORTA}/fatture/<numero>.pdf (Ctrl+C per fermarlo).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Servizio fermato.")
+    finally:
+        server.server_close()
+        servizio.ferma()
+    return 0
@@ -0,0 +1,117 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Controllo preliminare dei dati delle fatture: tutte le righe vengono verificate insieme,
+# colonna per colonna, prima di generare o inviare qualunque cosa. Gli errori vengono
+# elencati tutti in una volta, così si correggono nell'Excel con un solo passaggio.
+
+import re
+
+# Codice fiscale: come la formula di "Verifica codice fiscale (casella J4).txt", con la
+# lettera del mese tra quelle ammesse e le cifre sostituite da lettere nei codici omocodici
+PATTERN_CODICE_FISCALE = re.compile(r"[A-Z]{6}[0-9LMNPQRSTUV]{2}[ABCDEHLMPRST][0-9LMNPQRSTUV]{2}[A-Z][0-9LMNPQRSTUV]{3}[A-Z]")
+PATTERN_EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s.]+")
+
+# Valori dei caratteri in posizione dispari per il carattere di controllo del codice fiscale
+# (le cifre valgono come le lettere nella stessa posizione dell'alfabeto)
+VALORI_DISPARI_CF = [1, 0, 5, 7, 9, 13, 15, 17, 19, 21, 2, 4, 18, 20, 11, 3, 6, 8, 12, 14, 16, 10, 22, 25, 24, 23]
+
+# Colonne con un importo, da non lasciare vuote
+COLONNE_IMPORTI = {3: "quantità", 4: "prezzo", 5: "IVA", 6: "marca da bollo"}
+COLONNA_EMAIL = 9
+
+def valore_carattere_cf(carattere):
+    return int(carattere) if carattere.isdigit() else ord(carattere) - ord("A")
+
+# Carattere di controllo dei primi 15 caratteri di un codice fiscale
+def carattere_controllo_cf(codice):
+    somma = 0
+    for posizione, carattere in enumerate(codice):
+        valore = valore_carattere_cf(carattere)
+        somma += VALORI_DISPARI_CF[valore] if posizione % 2 == 0 else valore
+    return chr(ord("A") + somma % 26)
+
+# Come carattere_controllo_cf, per tutti i codici insieme: i codici (già controllati con
+# PATTERN_CODICE_FISCALE, quindi di 16 caratteri ASCII) diventano una matrice di byte e
+# i valori vengono presi da due tabelle indicizzate per byte
+def caratteri_controllo_cf(codici):
+    import numpy as np
+
+    valori = np.zeros(256, dtype=np.int64)
+    valori[ord("0"):ord("9") + 1] = np.arange(10)
+    valori[ord("A"):ord("Z") + 1] = np.arange(26)
+    valori_dispari = np.array(VALORI_DISPARI_CF)[valori]
+
+    byte = np.frombuffer("".join(codici).encode("ascii"), dtype=np.uint8).reshape(-1, 16)
+    somma = valori_dispari[byte[:, 0:15:2]].sum(axis=1) + valori[byte[:, 1:15:2]].sum(axis=1)
+    return (ord("A") + somma % 26).astype(np.uint8), byte[:, 15]
+
+# Verifica tutte le righe del DataFrame (stesse colonne di dati_fattura) e restituisce un
+# errore per ogni riga da correggere, in ordine di riga: (numero fattura o None, nome, problemi)
+def verifica_fatture(df):
+    import numpy as np
+    import pandas as pd
+
+    if df.empty:
+        return []
+
+    nomi = df.iloc[:, 0].astype("string").str.strip()
+    codici = df.iloc[:, 1].astype("string").str.strip()
+    numeri = pd.to_numeric(df.iloc[:, 8], errors="coerce")
+    if df.shape[1] > COLONNA_EMAIL:
+        email = df.iloc[:, COLONNA_EMAIL].astype("string").str.strip()
+    else:
+        email = pd.Series(pd.NA, index=df.index, dtype="string")
+
+    controlli = [(nomi.isna() | (nomi == ""), "nome mancante")]
+
+    formato_cf = codici.str.fullmatch(PATTERN_CODICE_FISCALE).fillna(False).to_numpy(dtype=bool)
+    controlli.append((~formato_cf, "codice fiscale mancante o nel formato sbagliato"))
+    controllo_cf = np.zeros(len(df), dtype=bool)
+    attesi = np.zeros(len(df), dtype=np.uint8)
+    if formato_cf.any():
+        attesi[formato_cf], presenti = caratteri_controllo_cf(codici[formato_cf].tolist())
+        controllo_cf[formato_cf] = attesi[formato_cf] != presenti
+    controlli.append((controllo_cf, "carattere di controllo del codice fiscale errato"))
+
+    for colonna, nome in COLONNE_IMPORTI.items():
+        controlli.append((pd.to_numeric(df.iloc[:, colonna], errors="coerce").isna(), f"{nome} mancante o non numerico"))
+
+    date = pd.to_datetime(df.iloc[:, 7], dayfirst=True, format="mixed", errors="coerce")
+    controlli.append((date.isna(), "data mancante o non riconosciuta"))
+
+    numeri_interi = numeri.notna() & (numeri % 1 == 0)
+    controlli.append((~numeri_interi, "numero fattura mancante o non intero"))
+    controlli.append((numeri_interi & numeri.duplicated(keep=False), "numero fattura ripetuto"))
+
+    controlli.append((~email.str.fullmatch(PATTERN_EMAIL).fillna(False), "email mancante o non valida"))
+
+    maschere = np.column_stack([np.asarray(maschera, dtype=bool) for maschera, _ in controlli])
+    errori = []
+    for riga in np.flatnonzero(maschere.any(axis=1)):
+        problemi = []
+        for (_, messaggio), errato in zip(controlli, maschere[riga]):
+            if not errato:
+                continue
+            if messaggio.startswith("carattere di controllo"):
+                messaggio += f" (atteso {chr(attesi[riga])})"
+            problemi.append(messaggio)
+        numero = int(numeri.iat[riga]) if numeri_interi.iat[riga] else None
+        errori.append((numero, nomi.iat[riga] if not pd.isna(nomi.iat[riga]) else "", problemi))
+    return errori
+
+# Stampa l'elenco completo degli errori e restituisce True se i dati sono corretti.
+# operazione descrive quello che non viene fatto ("generata", "inviata").
+def dati_corretti(df, operazione, metriche=None):
+    if metriche is not None:
+        with metriche.fase("validazione"):
+            errori = verifica_fatture(df)
+    else:
+        errori = verifica_fatture(df)
+    if not errori:
+        return True
+
+    print(f"Errore: {len(errori)} righe di dati_fattura da correggere. Nessuna fattura {operazione} finché non sono tutte corrette:")
+    for numero, nome, problemi in errori:
+        riga = f"Fattura n. {numero}" if numero is not None else "Riga senza numero fattura"
+        print(f"  {riga} ({nome or 'senza nome'}): {', '.join(problemi)}")
+    return False
@@ -0,0 +1,72 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+# Dati di prova comuni ai test: un dati_fattura piccolo scritto con openpyxl, un template
+# di una pagina creato con PyMuPDF e i font della cartella dei programmi per macOS.
+
+import os
+from datetime import datetime
+
+import pytest
+
+from fatture import compilatore
+
+CARTELLA_FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Programma - MacOS", "fonts")
+
+INTESTAZIONE = ["NOME COGNOME", "CODICE FISCALE", "DESCRIZIONE", "QNT", "PREZZO", "IVA", "MARCA DA BOLLO", "DATA", "NUMERO FATTURA", "MAIL", "VERIFICA CODICE FISCALE"]
+
+# Riga di dati_fattura con valori corretti; quelli indicati sostituiscono i predefiniti
+def riga_fattura(numero, **valori):
+    riga = {
+        "nome": f"Mario Rossi{numero} ",
+        "codice_fiscale": "RSSMRA80A01H501U",
+        "descrizione": "Consulenza",
+        "quantita": 2,
+        "prezzo": 49.9,
+        "iva": 22,
+        "bollo": 2,
+        "data": datetime(2025, 3, 5),
+        "email": f"cliente{numero}@example.com",
+    }
+    riga.update(valori)
+    return [riga["nome"], riga["codice_fiscale"], riga["descrizione"], riga["quantita"], riga["prezzo"],
+            riga["iva"], riga["bollo"], riga["data"], numero, riga["email"], "Valido"]
+
+# Scrive un dati_fattura con titolo, riga vuota e intestazione alla riga 3, come l'originale
+def scrivi_dati_fattura(percorso, righe):
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+    foglio = wb.active
+    foglio.append(["FATTURE"])
+    foglio.append([None])
+    foglio.append(INTESTAZIONE)
+    for riga in righe:
+        foglio.append(riga)
+    wb.save(percorso)
+    return percorso
+
+@pytest.fixture
+def template_pdf(tmp_path):
+    import fitz
+
+    percorso = str(tmp_path / "fattura_base.pdf")
+    documento = fitz.open()
+    pagina = documento.new_page(width=595, height=842)
+    pagina.draw_rect(fitz.Rect(40, 40, 555, 120), color=(0, 0, 0), fill=(0.9, 0.9, 0.9))
+    pagina.insert_text((60, 90), "FATTURA", fontsize=24)
+    documento.save(percorso)
+    documento.close()
+    return percorso
+
+# Compilatore con template, font e cartella di output di prova; le impostazioni tornano
+# quelle di prima alla fine del test
+@pytest.fixture
+def compilatore_prova(monkeypatch, tmp_path, template_pdf):
+    output_dir = str(tmp_path / "Fatture")
+    monkeypatch.setattr(compilatore, "PDF_TEMPLATE", template_pdf)
+    monkeypatch.setattr(compilatore, "FONT_DIR", CARTELLA_FONT)
+    monkeypatch.setattr(compilatore, "OUTPUT_DIR", output_dir)
+    monkeypatch.setattr(compilatore, "MANIFEST_FILE", os.path.join(output_dir, "manifest_fatture.json"))
+    monkeypatch.setattr(compilatore, "METRICHE_FILE", os.path.join(output_dir, "metriche_fatture.jsonl"))
+    monkeypatch.setattr(compilatore, "LAVORI_FILE", os.path.join(output_dir, "lavori_fatture.sqlite"))
+    return compilatore
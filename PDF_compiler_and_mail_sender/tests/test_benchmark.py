@@ -0,0 +1,59 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import os
+import random
+
+import pytest
+
+from fatture import benchmark, excel, invio, validazione
+
+@pytest.fixture
+def benchmark_prova(tmp_path, monkeypatch):
+    # configura cambia anche i file dei risultati: vengono rimessi com'erano alla fine del test
+    for nome in benchmark.IMPOSTAZIONI:
+        monkeypatch.setattr(benchmark, nome, getattr(benchmark, nome))
+    benchmark.configura(BENCHMARK_DIR=str(tmp_path / "Benchmark"), MAX_FATTURE_PDF=5, MISURA_MEMORIA=False)
+    os.makedirs(benchmark.BENCHMARK_DIR)
+    return benchmark
+
+def test_configura(benchmark_prova, tmp_path):
+    assert benchmark_prova.BENCHMARK_DIR == str(tmp_path / "Benchmark")
+    assert benchmark_prova.RISULTATI_FILE == str(tmp_path / "Benchmark" / "benchmark_ultimo.json")
+    assert benchmark_prova.RIFERIMENTO_FILE == str(tmp_path / "Benchmark" / "benchmark_riferimento.json")
+    assert benchmark_prova.MAX_FATTURE_PDF == 5
+    with pytest.raises(ValueError):
+        benchmark_prova.configura(CARTELLA="altrove")
+
+def test_codici_fiscali_casuali_corretti():
+    casuale = random.Random(1)
+    codici = [benchmark.codice_fiscale_casuale(casuale) for _ in range(200)]
+
+    assert all(validazione.PATTERN_CODICE_FISCALE.fullmatch(codice) for codice in codici)
+    attesi, presenti = validazione.caratteri_controllo_cf(codici)
+    assert (attesi == presenti).all()
+
+def test_excel_sintetico_valido_e_riusato(benchmark_prova):
+    percorso = benchmark_prova.genera_excel_sintetico(50)
+    modifica = os.stat(percorso).st_mtime_ns
+
+    df = excel.carica_dati_excel(percorso)
+    assert len(df) == 50
+    assert df.iloc[:, 8].tolist() == list(range(1, 51))
+    assert validazione.verifica_fatture(df) == []
+    assert benchmark_prova.genera_excel_sintetico(50) == percorso
+    assert os.stat(percorso).st_mtime_ns == modifica
+
+def test_esegui_benchmark(benchmark_prova, compilatore_prova, monkeypatch, capsys):
+    monkeypatch.setattr(compilatore_prova, "PROFILO_FILE", compilatore_prova.PROFILO_FILE)
+    monkeypatch.setattr(invio, "SERVER_PROVA_SMTP", invio.SERVER_PROVA_SMTP)
+
+    risultati = benchmark_prova.esegui_benchmark(20)
+
+    assert risultati["caricamento_excel"]["fatture"] == 20
+    assert risultati["preparazione"]["fatture"] == 20
+    assert risultati["generazione"]["fatture"] == 5
+    assert risultati["invio"]["fatture"] == 5
+    assert risultati["dimensione_media_pdf_kb"] > 0
+    assert len(os.listdir(os.path.join(benchmark_prova.BENCHMARK_DIR, "Fatture"))) == 5
+    # Tutte le mail sono arrivate al server SMTP di prova
+    assert "Attenzione" not in capsys.readouterr().out
@@ -0,0 +1,82 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from fatture import excel
+from conftest import riga_fattura, scrivi_dati_fattura
+
+# Dati di una riga formattati come nel ciclo del PDF compiler originale, una riga alla volta
+def dati_originali(df, idx, output_dir):
+    totale_valore = df.iloc[idx, 3] * df.iloc[idx, 4]
+    dati = {
+        "nome_cognome": df.iloc[idx, 0],
+        "codice_fiscale": df.iloc[idx, 1],
+        "descrizione": df.iloc[idx, 2],
+        "quantità": str(df.iloc[idx, 3]),
+        "prezzo": f"€ {df.iloc[idx, 4]:.2f}".replace('.', ','),
+        "iva": f"{df.iloc[idx, 5]:.2f}".replace('.', ',') + " %",
+        "marca_da_bollo": f"€ {df.iloc[idx, 6]:.2f}".replace('.', ','),
+        "totale1": f"€ {totale_valore:.2f}".replace('.', ','),
+        "netto": f"€ {(totale_valore * (1 + df.iloc[idx, 5] * 0.01) + df.iloc[idx, 6]):.2f}".replace('.', ','),
+        "numero_fattura": df.iloc[idx, 8],
+        "data": pd.to_datetime(df.iloc[idx, 7], dayfirst=True).strftime("%d/%m/%Y"),
+    }
+    dati["output_pdf_path"] = os.path.join(output_dir, f"Fatt. n. {dati['numero_fattura']} - {dati['nome_cognome'].strip()}.pdf")
+    return dati
+
+def test_prepara_fatture_come_il_ciclo_originale(tmp_path, compilatore_prova):
+    percorso = scrivi_dati_fattura(str(tmp_path / "dati_fattura.xlsx"), [
+        riga_fattura(1),
+        riga_fattura(2, nome="Niccolò D'Angelo", quantita=3, prezzo=19.995, iva=10, bollo=0),
+        riga_fattura(3, prezzo=1234.5, iva=4, data="05/03/2025"),
+        riga_fattura(4, quantita=1, prezzo=0.125, iva=0, bollo=2, data=datetime(2024, 12, 31)),
+    ])
+    df_originale = pd.read_excel(percorso, skiprows=2)
+    df = excel.carica_dati_excel(percorso)
+
+    fatture = compilatore_prova.prepara_fatture(df)
+
+    assert len(fatture) == 4
+    for idx, dati in enumerate(fatture):
+        assert dati.pop("valida")
+        assert dati == dati_originali(df_originale, idx, compilatore_prova.OUTPUT_DIR)
+
+def test_prepara_fatture_segnala_le_righe_non_generabili(tmp_path, compilatore_prova):
+    percorso = scrivi_dati_fattura(str(tmp_path / "dati_fattura.xlsx"), [
+        riga_fattura(1),
+        riga_fattura(2, prezzo="quaranta"),
+        riga_fattura(3, data="non è una data"),
+        riga_fattura(4, nome=None),
+    ])
+
+    fatture = compilatore_prova.prepara_fatture(excel.carica_dati_excel(percorso))
+
+    assert [dati["valida"] for dati in fatture] == [True, False, False, False]
+
+def pagina_compilata(motore, dati):
+    import fitz
+
+    with fitz.open(stream=motore.in_memoria(dati, profilo="ebook"), filetype="pdf") as documento:
+        pagina = documento[0]
+        return pagina.get_text(), pagina.get_pixmap(dpi=50).samples
+
+def test_template_xobject_come_la_copia(tmp_path, compilatore_prova, monkeypatch):
+    percorso = scrivi_dati_fattura(str(tmp_path / "dati_fattura.xlsx"), [riga_fattura(7, nome="Niccolò D'Angelo", descrizione="Lezioni private " * 20)])
+    dati = compilatore_prova.prepara_fatture(excel.carica_dati_excel(percorso))[0]
+    motore = compilatore_prova.MotorePDF(compilatore_prova.PDF_TEMPLATE)
+
+    monkeypatch.setattr(compilatore_prova, "MODALITA_TEMPLATE", "copia")
+    testo_copia, pixel_copia = pagina_compilata(motore, dati)
+    monkeypatch.setattr(compilatore_prova, "MODALITA_TEMPLATE", "xobject")
+    testo_xobject, pixel_xobject = pagina_compilata(motore, dati)
+
+    assert "FATTURA" in testo_xobject and "Niccolò D'Angelo" in testo_xobject
+    assert testo_xobject == testo_copia
+    assert pixel_xobject == pixel_copia
+    # La pagina base viene preparata una sola volta per profilo
+    base = motore.base_xobject("ebook")
+    pagina_compilata(motore, dati)
+    assert motore.base_xobject("ebook") is base
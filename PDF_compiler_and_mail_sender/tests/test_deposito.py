@@ -0,0 +1,93 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from fatture import deposito
+
+# PDF di prova di lunghezze diverse, anche non multiple dei 512 byte dei blocchi tar
+PDF = {
+    "2025-03/Fatt. n. 1 - Mario Rossi.pdf": b"%PDF-1.4\n" + b"a" * 1000,
+    "2025-03/Fatt. n. 2 - Niccolò D'Angelo.pdf": b"%PDF-1.4\n" + b"b" * 512,
+    "2025-04/Fatt. n. 3 - Anna Bianchi.pdf": b"%PDF-1.4\n" + os.urandom(70000),
+}
+
+def scrivi_archivio(percorso, formato):
+    scrittore = deposito.ScrittoreArchivio(percorso, formato)
+    percorsi = {nome: scrittore.aggiungi(nome.replace("/", os.sep), contenuto) for nome, contenuto in PDF.items()}
+    scrittore.chiudi()
+    return percorsi
+
+@pytest.mark.parametrize("formato", ["zip", "tar"])
+def test_posizioni_archivio_puntano_ai_pdf(tmp_path, formato):
+    archivio = str(tmp_path / f"Archivio fatture n. 1 - 3.{formato}")
+    percorsi = scrivi_archivio(archivio, formato)
+
+    assert not os.path.exists(archivio + ".tmp")
+    posizioni = deposito.posizioni_archivio(archivio)
+    assert set(posizioni) == set(PDF)
+    with open(archivio, "rb") as f:
+        for nome, (inizio, dimensione) in posizioni.items():
+            f.seek(inizio)
+            assert f.read(dimensione) == PDF[nome]
+    for nome, percorso in percorsi.items():
+        assert deposito.esiste(percorso)
+        assert deposito.leggi_pdf(percorso) == PDF[nome]
+        assert deposito.allegato(percorso) == PDF[nome]
+    assert not deposito.esiste(os.path.join(archivio, "2025-03", "Fatt. n. 9 - Nessuno.pdf"))
+
+    # L'archivio resta leggibile anche con le librerie standard
+    if formato == "zip":
+        with zipfile.ZipFile(archivio) as zf:
+            assert {nome: zf.read(nome) for nome in zf.namelist()} == PDF
+    else:
+        with tarfile.open(archivio) as tf:
+            assert {voce.name: tf.extractfile(voce).read() for voce in tf} == PDF
+
+@pytest.mark.parametrize("formato", ["zip", "tar"])
+def test_posizioni_archivio_senza_indice(tmp_path, formato):
+    archivio = str(tmp_path / f"Archivio fatture n. 1 - 3.{formato}")
+    scrivi_archivio(archivio, formato)
+    con_indice = deposito.posizioni_archivio(archivio)
+
+    os.remove(deposito.percorso_indice_archivio(archivio))
+    deposito.indici_archivi.clear()
+
+    assert deposito.posizioni_archivio(archivio) == con_indice
+
+def test_annulla_non_lascia_archivi(tmp_path):
+    archivio = str(tmp_path / "Archivio.zip")
+    scrittore = deposito.ScrittoreArchivio(archivio, "zip")
+    scrittore.aggiungi("Fatt. n. 1 - Mario Rossi.pdf", PDF["2025-03/Fatt. n. 1 - Mario Rossi.pdf"])
+    scrittore.annulla()
+
+    assert os.listdir(tmp_path) == []
+
+def test_formato_sconosciuto(tmp_path):
+    with pytest.raises(ValueError):
+        deposito.ScrittoreArchivio(str(tmp_path / "Archivio.7z"), "7z")
+    assert os.listdir(tmp_path) == []
+
+def test_indice_della_cartella(tmp_path):
+    cartella = str(tmp_path)
+    deposito.aggiorna_indice(cartella, {1: os.path.join(cartella, "2025", "Fatt. n. 1 - Mario Rossi.pdf")})
+    deposito.aggiorna_indice(cartella, {2: os.path.join(cartella, "Archivio.zip", "Fatt. n. 2 - Anna.pdf")})
+
+    assert deposito.percorsi_indice(cartella) == {
+        1: os.path.join(cartella, "2025", "Fatt. n. 1 - Mario Rossi.pdf"),
+        2: os.path.join(cartella, "Archivio.zip", "Fatt. n. 2 - Anna.pdf"),
+    }
+
+def test_sottocartelle():
+    import pandas as pd
+
+    numeri = pd.Series([5, 1999, 2000, None])
+    date = pd.to_datetime(pd.Series(["2025-03-05", "2024-12-31", None, "2025-01-01"]))
+
+    assert deposito.sottocartelle(None, numeri, date, 1000).tolist() == ["", "", "", ""]
+    assert deposito.sottocartelle("anno", numeri, date, 1000).tolist() == ["2025", "2024", "", "2025"]
+    assert deposito.sottocartelle("mese", numeri, date, 1000).tolist() == ["2025-03", "2024-12", "", "2025-01"]
+    assert deposito.sottocartelle("numeri", numeri, date, 1000).tolist() == ["000000-000999", "001000-001999", "002000-002999", ""]
@@ -0,0 +1,151 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import email
+import email.policy
+
+import pytest
+
+from fatture import invio
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 300 + b"\n%%EOF\n"
+
+# Sessioni SMTP finte: registrano le mail invece di spedirle
+class SessioniProva:
+    numero_sessioni = 1
+    utente = "fatture@esempio.it"
+
+    def __init__(self):
+        self.inviate = []
+
+    def invia(self, destinatario, messaggio):
+        self.inviate.append((destinatario, messaggio))
+
+    def chiudi(self):
+        pass
+
+def leggi_mail(messaggio):
+    return email.message_from_bytes(messaggio, policy=email.policy.default)
+
+def test_messaggio_si_rilegge_con_corpo_e_allegato():
+    fabbrica = invio.FabbricaMessaggi("fatture@esempio.it", oggetto="Fattura n° 12")
+    messaggio = fabbrica.messaggio("cliente@example.com", PDF, nome_file="Fatt. n. 12 - Niccolò D'Angelo.pdf",
+                                   message_id="<fattura12@esempio.it>", nome_cliente="Niccolò D'Angelo")
+
+    mail = leggi_mail(messaggio)
+    assert mail["From"] == "fatture@esempio.it"
+    assert mail["To"] == "cliente@example.com"
+    assert mail["Subject"] == "Fattura n° 12"
+    assert mail["Message-ID"] == "<fattura12@esempio.it>"
+    assert mail.get_body(("html",)).get_content() == invio.CORPO_HTML.format(nome_cliente="Niccolò D'Angelo")
+    allegati = list(mail.iter_attachments())
+    assert len(allegati) == 1
+    assert allegati[0].get_content_type() == "application/pdf"
+    assert allegati[0].get_filename() == "Fatt. n. 12 - Niccolò D'Angelo.pdf"
+    assert allegati[0].get_content() == PDF
+
+def test_messaggio_legge_l_allegato_dal_file(tmp_path):
+    percorso = tmp_path / 'Fatt. n. 3 - a "b" \\ c.pdf'
+    percorso.write_bytes(PDF)
+    fabbrica = invio.FabbricaMessaggi("fatture@esempio.it")
+
+    mail = leggi_mail(fabbrica.messaggio("cliente@example.com", str(percorso), nome_cliente="Anna"))
+
+    allegato = next(mail.iter_attachments())
+    assert allegato.get_filename() == percorso.name
+    assert allegato.get_content() == PDF
+
+def test_corpo_html_sostituisce_il_modello():
+    fabbrica = invio.FabbricaMessaggi("fatture@esempio.it")
+
+    mail = leggi_mail(fabbrica.messaggio("cliente@example.com", PDF, nome_file="f.pdf", corpo_html="<p>Già composto</p>"))
+
+    assert mail.get_body(("html",)).get_content() == "<p>Già composto</p>"
+
+@pytest.mark.parametrize("destinatario", [
+    None, "", "senza-chiocciola.it", "due@@example.com", "spazio @example.com", "àccento@example.com",
+    "cliente@example.com\r\nBcc: altro@example.com", "cliente@example.com\n", "cliente@exa\x00mple.com",
+])
+def test_messaggio_rifiuta_gli_indirizzi_non_validi(destinatario):
+    fabbrica = invio.FabbricaMessaggi("fatture@esempio.it")
+    with pytest.raises(ValueError):
+        fabbrica.messaggio(destinatario, PDF, nome_file="f.pdf", nome_cliente="Anna")
+
+def test_secchio_gettoni_si_svuota_e_si_ricarica():
+    secchio = invio.SecchioGettoni(2, 60, aggiornato=1000)
+
+    assert secchio.attesa(1000) == 0
+    secchio.preleva()
+    secchio.preleva()
+    assert secchio.attesa(1000) == pytest.approx(30)
+    assert secchio.attesa(1015) == pytest.approx(15)
+    assert secchio.attesa(1030) == 0
+    # Dopo una lunga pausa i gettoni non superano la capacità
+    assert secchio.attesa(100000) == 0
+    assert secchio.gettoni == 2
+
+def test_secchio_gettoni_riprende_dallo_stato_salvato():
+    secchio = invio.SecchioGettoni(500, 24 * 60 * 60, gettoni=900, aggiornato=1000)
+    assert secchio.gettoni == 500
+
+    secchio = invio.SecchioGettoni(500, 24 * 60 * 60, gettoni=0, aggiornato=1000)
+    assert secchio.attesa(1000) == pytest.approx(24 * 60 * 60 / 500)
+
+def invio_prova(numero, allegato_path):
+    return {"numero_fattura": numero, "destinatario": f"cliente{numero}@example.com", "nome_cliente": f"Cliente {numero}", "allegato_path": allegato_path}
+
+def test_coda_invii_stati(tmp_path):
+    coda = invio.CodaInvii(str(tmp_path / "outbox.sqlite"))
+    try:
+        invii, gia_inviate = coda.accoda([invio_prova(2, "b.pdf"), invio_prova(1, "a.pdf")])
+        assert gia_inviate == []
+        assert [(riga["numero_fattura"], riga["stato"], riga["tentativi"]) for riga in invii] == [(1, "in_coda", 0), (2, "in_coda", 0)]
+        message_id = invii[0]["message_id"]
+
+        coda.segna(1, "in_invio")
+        coda.segna(1, "in_coda", "Connessione persa")
+        coda.segna(1, "in_invio")
+        coda.segna(1, "inviata")
+        coda.segna(2, "in_invio")
+        coda.segna(2, "fallita", "Indirizzo rifiutato")
+
+        riga_1, riga_2 = coda.invii([1, 2])
+        assert (riga_1["stato"], riga_1["tentativi"], riga_1["ultimo_errore"]) == ("inviata", 2, None)
+        assert riga_1["inviata"] is not None
+        assert (riga_2["stato"], riga_2["ultimo_errore"]) == ("fallita", "Indirizzo rifiutato")
+        assert [riga["numero_fattura"] for riga in coda.invii()] == [2]
+
+        # Una fattura già inviata non torna in coda; una fallita sì, con lo stesso Message-ID
+        invii, gia_inviate = coda.accoda([invio_prova(1, "a.pdf"), invio_prova(2, "b2.pdf")])
+        assert gia_inviate == [1]
+        assert [(riga["numero_fattura"], riga["stato"], riga["allegato_path"]) for riga in invii] == [(2, "in_coda", "b2.pdf")]
+        assert coda.invii([1])[0]["message_id"] == message_id
+        assert invio.stati_coda_invii(str(tmp_path / "outbox.sqlite")) == {1: "inviata", 2: "in_coda"}
+    finally:
+        coda.chiudi()
+
+def test_riprendi_invia_le_mail_rimaste_in_coda(tmp_path, monkeypatch):
+    sessioni = SessioniProva()
+    monkeypatch.setattr(invio, "apri_sessioni_smtp", lambda: sessioni)
+    monkeypatch.setattr(invio, "STATO_LIMITI_FILE", str(tmp_path / "limiti_invio.json"))
+    monkeypatch.setattr(invio, "METRICHE_FILE", str(tmp_path / "metriche_invio.jsonl"))
+    for numero in (1, 2):
+        (tmp_path / f"{numero}.pdf").write_bytes(PDF)
+
+    coda = invio.CodaInvii(str(tmp_path / "outbox.sqlite"))
+    try:
+        coda.accoda([invio_prova(1, str(tmp_path / "1.pdf")), invio_prova(2, str(tmp_path / "2.pdf")), invio_prova(3, str(tmp_path / "3.pdf"))])
+        # La 1 era in invio quando il programma si è fermato, la 2 era fallita,
+        # la 3 era stata rimandata prima che il suo PDF venisse generato
+        coda.segna(1, "in_invio")
+        coda.segna(2, "in_invio")
+        coda.segna(2, "fallita", "Connessione persa")
+        message_id = coda.invii([1])[0]["message_id"]
+
+        assert invio.riprendi_invii(coda, conferma=False)
+
+        assert [destinatario for destinatario, _ in sessioni.inviate] == ["cliente1@example.com", "cliente2@example.com"]
+        assert leggi_mail(sessioni.inviate[0][1])["Message-ID"] == message_id
+        assert [(riga["numero_fattura"], riga["stato"]) for riga in coda.invii([1, 2, 3])] == [(1, "inviata"), (2, "inviata"), (3, "in_coda")]
+        assert coda.invii([1])[0]["tentativi"] == 2
+    finally:
+        coda.chiudi()
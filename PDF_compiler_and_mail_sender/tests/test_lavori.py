@@ -0,0 +1,131 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from fatture import lavori
+from fatture.metriche import Metriche
+from conftest import INTESTAZIONE, riga_fattura
+
+@pytest.fixture
+def lavoro(tmp_path):
+    lavoro = lavori.LavoroCondiviso(1, 10, str(tmp_path / "lavori.sqlite"))
+    yield lavoro
+    lavoro.chiudi()
+
+def stati(lavoro):
+    return lavoro.avanzamento()["blocchi"]
+
+def test_blocchi_creati_una_volta(lavoro, tmp_path):
+    assert lavoro.crea_blocchi(4) == 3
+    # Un secondo lavoratore trova i blocchi già creati, anche con un'altra dimensione
+    altro = lavori.LavoroCondiviso(1, 10, str(tmp_path / "lavori.sqlite"))
+    try:
+        assert altro.crea_blocchi(2) == 3
+    finally:
+        altro.chiudi()
+
+    assert lavoro.prendi_blocco("a") == (1, 4)
+    assert lavoro.prendi_blocco("b") == (5, 8)
+    assert lavoro.prendi_blocco("a") == (9, 10)
+    assert lavoro.prendi_blocco("c") is None
+
+def test_completa(lavoro):
+    lavoro.crea_blocchi(5)
+    inizio, _ = lavoro.prendi_blocco("a")
+
+    assert not lavoro.completa(inizio, "b", 5, 0)
+    assert lavoro.completa(inizio, "a", 4, 1)
+
+    avanzamento = lavoro.avanzamento()
+    assert avanzamento["blocchi"]["completato"] == 1
+    assert (avanzamento["generate"], avanzamento["non_generate"]) == (4, 1)
+    assert lavoro.prendi_blocco("a") == (6, 10)
+
+def test_concessione_scaduta_passa_a_un_altro_lavoratore(lavoro):
+    lavoro.crea_blocchi(10)
+    assert lavoro.prendi_blocco("a", durata=0.05) == (1, 10)
+    assert lavoro.prendi_blocco("b") is None
+    assert lavoro.rinnova(1, "a", durata=0.05)
+
+    time.sleep(0.1)
+    assert stati(lavoro)["scaduto"] == 1
+    assert lavoro.prendi_blocco("b") == (1, 10)
+
+    # Il primo lavoratore non può più rinnovare né completare il blocco
+    assert not lavoro.rinnova(1, "a")
+    assert not lavoro.completa(1, "a", 10, 0)
+    assert lavoro.completa(1, "b", 10, 0)
+
+def test_blocco_abbandonato_dopo_i_tentativi_massimi(lavoro, monkeypatch):
+    monkeypatch.setattr(lavori, "TENTATIVI_MASSIMI", 3)
+    lavoro.crea_blocchi(5)
+
+    # Un'interruzione con Ctrl+C non conta come tentativo
+    for _ in range(5):
+        assert lavoro.prendi_blocco("a") == (1, 5)
+        lavoro.rilascia(1, "a")
+    for _ in range(3):
+        assert lavoro.prendi_blocco("a") == (1, 5)
+        lavoro.rilascia(1, "a", tentativo_usato=True)
+
+    assert lavoro.prendi_blocco("a") == (6, 10)
+    assert stati(lavoro)["abbandonato"] == 1
+
+def righe_lavoro():
+    return pd.DataFrame([riga_fattura(numero) for numero in range(1, 11)], columns=INTESTAZIONE)
+
+def test_errore_nel_blocco_consuma_un_tentativo(compilatore_prova, monkeypatch):
+    def seleziona_fatture(*argomenti):
+        raise OSError("disco pieno")
+
+    monkeypatch.setattr(lavori, "TENTATIVI_MASSIMI", 2)
+    monkeypatch.setattr(compilatore_prova, "seleziona_fatture", seleziona_fatture)
+    df = righe_lavoro()
+
+    for _ in range(2):
+        with pytest.raises(OSError):
+            lavori.esegui_lavoratore(df, 1, 10, False, Metriche(), dimensione_blocco=10)
+    assert lavori.esegui_lavoratore(df, 1, 10, False, Metriche(), dimensione_blocco=10) == 0
+
+    lavoro = lavori.LavoroCondiviso(1, 10)
+    try:
+        assert stati(lavoro)["abbandonato"] == 1
+    finally:
+        lavoro.chiudi()
+
+def test_interruzione_non_consuma_tentativi(compilatore_prova, monkeypatch):
+    def seleziona_fatture(*argomenti):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(lavori, "TENTATIVI_MASSIMI", 2)
+    monkeypatch.setattr(compilatore_prova, "seleziona_fatture", seleziona_fatture)
+    df = righe_lavoro()
+
+    for _ in range(3):
+        with pytest.raises(KeyboardInterrupt):
+            lavori.esegui_lavoratore(df, 1, 10, False, Metriche(), dimensione_blocco=10)
+
+    lavoro = lavori.LavoroCondiviso(1, 10)
+    try:
+        assert stati(lavoro)["libero"] == 1
+    finally:
+        lavoro.chiudi()
+
+def test_lavoratore_genera_tutti_i_blocchi(compilatore_prova, monkeypatch):
+    monkeypatch.setattr(compilatore_prova, "NUM_PROCESSI", 1)
+
+    assert lavori.esegui_lavoratore(righe_lavoro(), 1, 10, False, Metriche(), dimensione_blocco=4) == 0
+
+    lavoro = lavori.LavoroCondiviso(1, 10)
+    try:
+        avanzamento = lavoro.avanzamento()
+    finally:
+        lavoro.chiudi()
+    assert avanzamento["blocchi"]["completato"] == 3
+    assert (avanzamento["generate"], avanzamento["non_generate"]) == (10, 0)
+    assert set(compilatore_prova.carica_manifest()) == {str(numero) for numero in range(1, 11)}
+    assert len([nome for nome in os.listdir(compilatore_prova.OUTPUT_DIR) if nome.endswith(".pdf")]) == 10
@@ -0,0 +1,53 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import json
+
+import pytest
+
+from fatture.metriche import Metriche
+
+def test_fase_registra_tempi_e_byte():
+    metriche = Metriche()
+    with metriche.fase("generazione", 12) as voce:
+        voce["byte"] = 2048
+    with metriche.fase("attesa_limiti", 12, cpu=False):
+        pass
+
+    generazione, attesa = metriche.voci
+    assert (generazione["fase"], generazione["fattura"], generazione["byte"]) == ("generazione", 12, 2048)
+    assert generazione["secondi"] >= 0 and generazione["secondi_cpu"] >= 0
+    assert attesa["secondi_cpu"] is None
+
+def test_fase_registrata_anche_con_un_errore():
+    metriche = Metriche()
+    with pytest.raises(OSError):
+        with metriche.fase("compressione", 3):
+            raise OSError("Ghostscript non trovato")
+
+    assert [voce["fase"] for voce in metriche.voci] == ["compressione"]
+
+def test_salva_aggiunge_righe_json(tmp_path):
+    percorso = str(tmp_path / "metriche.jsonl")
+    for programma in ("pdf_compiler", "mail_sender"):
+        metriche = Metriche(programma)
+        with metriche.fase("caricamento_excel"):
+            pass
+        metriche.aggiungi([{"fase": "generazione", "fattura": 1, "byte": 10, "secondi": 0.5, "secondi_cpu": 0.4}])
+        metriche.salva(percorso)
+
+    with open(percorso, encoding="utf-8") as f:
+        righe = [json.loads(riga) for riga in f]
+    assert [(riga["programma"], riga["fase"]) for riga in righe] == [
+        ("pdf_compiler", "caricamento_excel"), ("pdf_compiler", "generazione"),
+        ("mail_sender", "caricamento_excel"), ("mail_sender", "generazione"),
+    ]
+    assert all("esecuzione" in riga for riga in righe)
+
+def test_stampa_riepilogo(capsys):
+    metriche = Metriche()
+    metriche.aggiungi([{"fase": "generazione", "fattura": numero, "byte": 1024 * 1024, "secondi": 0.01 * numero, "secondi_cpu": 0.01} for numero in range(1, 11)])
+
+    metriche.stampa_riepilogo()
+
+    riga = next(riga for riga in capsys.readouterr().out.splitlines() if riga.startswith("generazione"))
+    assert riga.split() == ["generazione", "10", "0.55", "55.0", "95.5", "100.0", "0.10", "10.00"]
@@ -0,0 +1,122 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from fatture import servizio
+from conftest import riga_fattura, scrivi_dati_fattura
+
+# Dati del servizio con il conteggio delle righe passate a prepara_fatture ad ogni aggiornamento
+@pytest.fixture
+def dati_servizio(tmp_path, compilatore_prova, monkeypatch):
+    preparate = []
+    prepara_fatture = compilatore_prova.prepara_fatture
+
+    def prepara_e_conta(df):
+        preparate.append(sorted(int(numero) for numero in df.iloc[:, 8]))
+        return prepara_fatture(df)
+
+    monkeypatch.setattr(compilatore_prova, "prepara_fatture", prepara_e_conta)
+    percorso = str(tmp_path / "dati_fattura.xlsx")
+    return percorso, servizio.DatiFatture(percorso), preparate
+
+def riscrivi(percorso, righe):
+    scrivi_dati_fattura(percorso, righe)
+    # Una data di modifica diversa anche su file system con date poco precise
+    stato = os.stat(percorso)
+    os.utime(percorso, ns=(stato.st_atime_ns, stato.st_mtime_ns + 2_000_000_000))
+
+def test_aggiorna_prepara_solo_le_righe_cambiate(dati_servizio):
+    percorso, dati, preparate = dati_servizio
+    scrivi_dati_fattura(percorso, [riga_fattura(numero) for numero in range(1, 6)])
+
+    assert dati.aggiorna() == (5, 0)
+    assert preparate == [[1, 2, 3, 4, 5]]
+    assert not dati.cambiato()
+
+    riscrivi(percorso, [riga_fattura(1), riga_fattura(2, nome="Anna Bianchi"), riga_fattura(4), riga_fattura(5), riga_fattura(6)])
+    assert dati.cambiato()
+
+    assert dati.aggiorna() == (2, 1)
+    assert preparate[-1] == [2, 6]
+    assert dati.fattura(2)[0]["nome_cognome"] == "Anna Bianchi"
+    assert dati.fattura(3) == (None, [])
+    assert dati.fattura(6)[0]["numero_fattura"] == 6
+    assert dati.stato()["righe"] == 5
+
+    # Senza modifiche non viene preparato niente
+    riscrivi(percorso, [riga_fattura(1), riga_fattura(2, nome="Anna Bianchi"), riga_fattura(4), riga_fattura(5), riga_fattura(6)])
+    assert dati.aggiorna() == (0, 0)
+    assert preparate[-1] == []
+
+def test_aggiorna_ricontrolla_le_righe(dati_servizio):
+    percorso, dati, _ = dati_servizio
+    scrivi_dati_fattura(percorso, [riga_fattura(1), riga_fattura(2, email="senza-chiocciola"), riga_fattura(3)])
+
+    dati.aggiorna()
+    assert dati.fattura(1)[1] == []
+    assert dati.fattura(2)[1] == ["email mancante o non valida"]
+
+    # Correggere la riga 2 toglie il suo errore; la riga 3 con un numero già usato rende
+    # da correggere anche la riga 1, che non è cambiata
+    riscrivi(percorso, [riga_fattura(1), riga_fattura(2), riga_fattura(1, nome="Anna Bianchi")])
+    dati.aggiorna()
+    assert dati.fattura(2)[1] == []
+    assert dati.fattura(1)[1] == ["numero fattura ripetuto"]
+    assert dati.stato()["righe_da_correggere"] == 1
+
+    # Tolto il numero ripetuto, l'errore sparisce anche dalla riga non cambiata
+    riscrivi(percorso, [riga_fattura(1), riga_fattura(2)])
+    dati.aggiorna()
+    assert dati.fattura(1)[1] == []
+    assert dati.stato()["righe_da_correggere"] == 0
+
+def test_richieste_http(tmp_path, compilatore_prova, monkeypatch):
+    percorso = scrivi_dati_fattura(str(tmp_path / "dati_fattura.xlsx"), [riga_fattura(1), riga_fattura(2, email=None)])
+    monkeypatch.setattr(compilatore_prova, "EXCEL_FILE", percorso)
+
+    servizio_prova = servizio.Servizio()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), servizio.GestoreRichieste)
+    server.servizio = servizio_prova
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    indirizzo = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def richiesta(percorso):
+        try:
+            with urllib.request.urlopen(indirizzo + percorso) as risposta:
+                return risposta.status, risposta.headers, risposta.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    try:
+        codice, intestazioni, contenuto = richiesta("/fatture/1.pdf")
+        assert codice == 200
+        assert intestazioni["Content-Type"] == "application/pdf"
+        assert contenuto.startswith(b"%PDF")
+        assert not os.path.exists(os.path.join(compilatore_prova.OUTPUT_DIR, "Fatt. n. 1 - Mario Rossi1.pdf"))
+
+        codice, _, _ = richiesta("/fatture/1.pdf?salva=1")
+        assert codice == 200
+        assert os.path.exists(os.path.join(compilatore_prova.OUTPUT_DIR, "Fatt. n. 1 - Mario Rossi1.pdf"))
+        assert "1" in compilatore_prova.carica_manifest()
+
+        codice, _, contenuto = richiesta("/fatture/2.pdf")
+        assert codice == 422
+        assert json.loads(contenuto)["problemi"] == ["email mancante o non valida"]
+
+        assert richiesta("/fatture/9.pdf")[0] == 404
+        assert richiesta("/altro")[0] == 404
+
+        codice, _, contenuto = richiesta("/stato")
+        assert codice == 200
+        assert json.loads(contenuto)["righe"] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+        servizio_prova.ferma()
@@ -0,0 +1,61 @@
+# Copyright (c) 2025 AstroTeo99 - Licenza MIT
+
+import pandas as pd
+import pytest
+
+from fatture import validazione
+from conftest import INTESTAZIONE, riga_fattura
+
+# Codici fiscali noti e loro versioni omocodiche (cifre sostituite da lettere,
+# partendo da destra: 0-9 -> L M N P Q R S T U V)
+CODICI_NOTI = [
+    "RSSMRA80A01H501U",
+    "MRTMTT25D09F205Z",
+    "RSSMRA85T10A562S",
+    "RSSMRA85T10A56NH",
+    "RSSMRA85T10ARSNO",
+    "MRTMTT25D09F20RU",
+]
+
+@pytest.mark.parametrize("codice", CODICI_NOTI)
+def test_carattere_controllo_dei_codici_noti(codice):
+    assert validazione.PATTERN_CODICE_FISCALE.fullmatch(codice)
+    assert validazione.carattere_controllo_cf(codice[:15]) == codice[15]
+
+def test_caratteri_controllo_come_uno_alla_volta():
+    codici = CODICI_NOTI + ["RSSMRA80A01H501A", "MRTMTT25D09F20RZ"]
+
+    attesi, presenti = validazione.caratteri_controllo_cf(codici)
+
+    assert [chr(carattere) for carattere in attesi] == [validazione.carattere_controllo_cf(codice[:15]) for codice in codici]
+    assert [chr(carattere) for carattere in presenti] == [codice[15] for codice in codici]
+
+def dati(righe):
+    return pd.DataFrame(righe, columns=INTESTAZIONE)
+
+def test_verifica_fatture_accetta_righe_corrette_e_omocodiche():
+    righe = [riga_fattura(numero, codice_fiscale=codice) for numero, codice in enumerate(CODICI_NOTI, start=1)]
+    assert validazione.verifica_fatture(dati(righe)) == []
+
+def test_verifica_fatture_elenca_tutti_i_problemi():
+    righe = [
+        riga_fattura(1),
+        riga_fattura(2, codice_fiscale="RSSMRA80A01H501A"),
+        riga_fattura(3, codice_fiscale="RSSMRA80Z01H501U", email="senza-chiocciola"),
+        riga_fattura(3, nome=" ", prezzo="quaranta"),
+        riga_fattura(4.5, data="31/02/2025"),
+    ]
+
+    errori = validazione.verifica_fatture(dati(righe))
+
+    assert errori == [
+        (2, "Mario Rossi2", ["carattere di controllo del codice fiscale errato (atteso U)"]),
+        (3, "Mario Rossi3", ["codice fiscale mancante o nel formato sbagliato", "numero fattura ripetuto", "email mancante o non valida"]),
+        (3, "", ["nome mancante", "prezzo mancante o non numerico", "numero fattura ripetuto"]),
+        (None, "Mario Rossi4.5", ["data mancante o non riconosciuta", "numero fattura mancante o non intero"]),
+    ]
+
+def test_dati_corretti_stampa_l_elenco(capsys):
+    assert validazione.dati_corretti(dati([riga_fattura(1)]), "generata")
+    assert not validazione.dati_corretti(dati([riga_fattura(1, email=None)]), "generata")
+    assert "Fattura n. 1 (Mario Rossi1): email mancante o non valida" in capsys.readouterr().out